@@ -65,8 +65,9 @@ def generate_calibration_data_from_image(image):
         print(f"Chessboard corners not found in image {image}")
     return objpoints, imgpoints
 
-def load_calibration_data():
-    ports = list_camera_ports()
+def load_calibration_data(ports=None):
+    if ports is None:
+        ports = list_camera_ports()
     calibration_data = {}
     try:
         for port in ports:
@@ -84,6 +85,42 @@ def load_calibration_data():
         print(e)
         return
 
+# Undistortion maps (cv.initUndistortRectifyMap, fixed-point CV_16SC2) for one
+# camera at one image size, so whole frames are undistorted with a cheap
+# cv.remap instead of cv.undistort rebuilding the same map every call. The
+# maps are saved next to the intrinsics and reused while the camera matrix,
+# distortion and image size still match. Returns None when the lens has no
+# distortion (e.g. the simulator): there is nothing to undo.
+def load_undistort_maps(port, camera_matrix, dist_coeffs, shape):
+    if dist_coeffs is None or not np.any(dist_coeffs):
+        return None
+    camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+    dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64).ravel()
+    size = np.array([shape[1], shape[0]])
+    path = f"{settings.CALIBRATION_DATA_PATH}undistort_maps_{port}.npz"
+    try:
+        with np.load(path) as saved:
+            if (np.array_equal(saved["size"], size)
+                    and np.array_equal(saved["camera_matrix"], camera_matrix)
+                    and np.array_equal(saved["dist_coeffs"], dist_coeffs)):
+                return saved["map1"], saved["map2"]
+    except (OSError, KeyError, ValueError):
+        pass
+    map1, map2 = cv.initUndistortRectifyMap(camera_matrix, dist_coeffs, None, camera_matrix,
+                                            (int(size[0]), int(size[1])), cv.CV_16SC2)
+    try:
+        np.savez(path, map1=map1, map2=map2, size=size,
+                 camera_matrix=camera_matrix, dist_coeffs=dist_coeffs)
+    except OSError:
+        pass   # no calibration directory (yet): keep the maps in memory only
+    return map1, map2
+
+# Undistort a whole frame through maps from load_undistort_maps() (None: as is)
+def undistort_frame(frame, maps):
+    if maps is None:
+        return frame
+    return cv.remap(frame, maps[0], maps[1], cv.INTER_LINEAR)
+
 def main():
     
     # Find existing images
@@ -29,7 +29,6 @@ later without re-flying anything::
 
 import argparse
 import sys
-import time
 
 import cv2 as cv
 import numpy as np
@@ -465,24 +464,73 @@ def report_diagnostics(diagnostics):
 # Interactive calibration session
 # ---------------------------------------------------------------------------
 
-def mask_centroids(mask, max_count=None):
-    """Centroids (u, v) of every plausible blob in a binary mask, largest first."""
+def mask_centroids(mask, max_count=None, detector=None):
+    """Centroids (u, v) of every plausible blob in a binary mask, largest
+    first (mask_blobs() without the areas)."""
+    return [(u, v) for _, u, v in mask_blobs(mask, max_count, detector)]
+
+
+def mask_blobs(mask, max_count=None, detector=None):
+    """(area, u, v) of every plausible blob in a binary mask, largest first.
+
+    ``detector`` (default settings.BLOB_DETECTOR): "components" labels the
+    mask in one cv.connectedComponentsWithStats pass, areas and centroids
+    coming back as arrays; "contours" is the original findContours +
+    per-contour moments detector. Components measure blob area in pixels,
+    contours by outline polygon, so blobs right at
+    settings.EXTRINSICS_MIN_CONTOUR_AREA can differ between the two.
+    """
     if max_count is None:
         max_count = settings.MAX_DETECTIONS_PER_CAMERA
+    if detector is None:
+        detector = settings.BLOB_DETECTOR
+    if detector == "components":
+        return _component_centroids(mask, max_count)
+    if detector == "contours":
+        return _contour_centroids(mask, max_count)
+    raise ValueError(f"Unknown blob detector {detector!r}; expected 'components' or 'contours'.")
+
+
+def _contour_centroids(mask, max_count):
+    """Blobs (contour area, u, v) from external contours, largest first."""
     contours, _ = cv.findContours(mask, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
-    contours = sorted(contours, key=cv.contourArea, reverse=True)[:max_count]
+    areas = [cv.contourArea(contour) for contour in contours]
+    order = sorted(range(len(contours)), key=areas.__getitem__, reverse=True)[:max_count]
     centroids = []
-    for contour in contours:
-        if cv.contourArea(contour) < settings.EXTRINSICS_MIN_CONTOUR_AREA:
+    for index in order:
+        if areas[index] < settings.EXTRINSICS_MIN_CONTOUR_AREA:
             break                      # sorted by area; the rest are smaller
-        moments = cv.moments(contour)
+        moments = cv.moments(contours[index])
         if moments["m00"] == 0:
             continue
-        centroids.append((moments["m10"] / moments["m00"],
+        centroids.append((areas[index], moments["m10"] / moments["m00"],
                           moments["m01"] / moments["m00"]))
     return centroids
 
 
+def _component_centroids(mask, max_count):
+    """Blobs (area, u, v) from connected components (8-connected), largest
+    first."""
+    count, _, stats, centers = cv.connectedComponentsWithStats(
+        mask, connectivity=8, ltype=cv.CV_32S)
+    areas = stats[1:, cv.CC_STAT_AREA]
+    keep = np.flatnonzero(areas >= settings.EXTRINSICS_MIN_CONTOUR_AREA)
+    keep = keep[np.argsort(-areas[keep], kind="stable")][:max_count]
+    return [(float(area), float(u), float(v))
+            for area, (u, v) in zip(areas[keep], centers[1:][keep])]
+
+
+def undistort_centroids(centroids, K, dist_coeffs):
+    """Raw-image centroids [(u, v)] -> ideal pinhole pixels under the same K,
+    so masks can be taken from frames that were never undistorted."""
+    if not len(centroids) or dist_coeffs is None or not np.any(dist_coeffs):
+        return list(centroids)
+    pts = np.asarray(centroids, dtype=np.float64).reshape(-1, 1, 2)
+    K = np.asarray(K, dtype=np.float64)
+    ideal = cv.undistortPoints(pts, K, np.asarray(dist_coeffs, dtype=np.float64), P=K)
+    return [(float(u), float(v)) for u, v in ideal.reshape(-1, 2)]
+
+
 def mask_centroid(mask):
     """Centroid of the single largest plausible blob, or None.
 
@@ -533,6 +581,7 @@ def run_capture_session(ports, calibration_data):
     gray_old = {port: None for port in ports}
     tracks = {port: [] for port in ports}
     trails = {port: [] for port in ports}
+    maps = {}   # per-port undistortion maps, built on each camera's first frame
     recording = False
     pass_id = -1
 
@@ -540,20 +589,27 @@ def run_capture_session(ports, calibration_data):
           "(do several, along different paths), 'q' ends the session.")
     try:
         while True:
-            now = time.perf_counter()
             for port in ports:
-                frame = streams[port].read()
-                if frame is None:
+                # Samples carry the frame's capture time, not the loop's
+                newest = streams[port].read_newest()
+                if newest is None:
                     continue
-                frame = cv.undistort(frame, calibration_data[port]["camera_matrix"],
-                                     calibration_data[port]["dist_coeffs"])
+                _, captured, raw = newest
+                if port not in maps:
+                    maps[port] = camera_calibration.load_undistort_maps(
+                        port, calibration_data[port]["camera_matrix"],
+                        calibration_data[port]["dist_coeffs"], raw.shape)
+                frame = camera_calibration.undistort_frame(raw, maps[port])
+                if frame is raw:
+                    # Drawn on below; the raw frame is the stream's ring slot
+                    frame = raw.copy()
                 gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
                 if gray_old[port] is not None:
                     centroid = detect_centroid(gray, gray_old[port])
                     if centroid is not None:
                         trails[port] = (trails[port] + [centroid])[-30:]
                         if recording:
-                            tracks[port].append([pass_id, now, centroid[0], centroid[1]])
+                            tracks[port].append([pass_id, captured, centroid[0], centroid[1]])
                 gray_old[port] = gray
 
                 for u, v in trails[port]:
@@ -0,0 +1,321 @@
+"""Camera nodes: detect on the camera's own machine, ship detections, not frames.
+
+A rig can outgrow one machine's USB bus, but the tracker only needs each
+camera's blob centroids (and carving its motion masks). A camera node runs
+capture, differencing and detection next to its camera and streams the
+results over TCP to the central ``main`` process, which pairs the nodes'
+messages by capture time and feeds them to MultiTargetTracker.step():
+
+    python -m pixel_to_voxel.camera_node --camera 0 --central 10.0.0.5:8400
+    python -m pixel_to_voxel.main --nodes 0,1,2          # central, on 10.0.0.5
+
+Wire format: one TCP connection per node, node -> central, carrying messages
+
+    uint32 big-endian header length | UTF-8 JSON header | payload bytes
+
+The first message is ``{"type": "hello", "port", "shape": [H, W]}``; every
+later one is ``{"type": "frame", "port", "seq", "timestamp", "detections":
+[[u, v], ...], "mask": [H, W] or null, "payload": nbytes}``. Detections are
+undistorted pixels, as the tracker expects. A mask travels as its run-length
+encoding (rle_encode()): uint32 little-endian run lengths of alternating
+background / foreground pixels in row-major order, starting with background
+— a few hundred bytes for a sky with a handful of blobs.
+
+Timestamps are wall-clock capture times (time.time()), so the machines'
+clocks must be synchronised (NTP, or better PTP) to pair frames across nodes.
+"""
+
+import argparse
+import collections
+import json
+import socket
+import struct
+import sys
+import threading
+import time
+
+import cv2 as cv
+import numpy as np
+
+from . import settings
+from . import camera_calibration
+
+_HEADER = struct.Struct(">I")
+
+
+def rle_encode(mask):
+    """Run lengths (uint32 bytes) of a binary mask, background run first."""
+    flat = np.asarray(mask).ravel() > 0
+    if not flat.size:
+        return b""
+    edges = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    runs = np.diff(np.concatenate(([0], edges, [flat.size])))
+    if flat[0]:
+        runs = np.concatenate(([0], runs))
+    return runs.astype("<u4").tobytes()
+
+
+def rle_decode(payload, shape):
+    """uint8 mask (0 / 255) of ``shape`` from rle_encode() bytes."""
+    runs = np.frombuffer(payload, dtype="<u4")
+    values = np.zeros(len(runs), dtype=np.uint8)
+    values[1::2] = 255
+    return np.repeat(values, runs).reshape(shape)
+
+
+def encode_message(header, payload=b""):
+    header = dict(header, payload=len(payload))
+    body = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return _HEADER.pack(len(body)) + body + payload
+
+
+def read_message(stream):
+    """(header, payload) of the next message on a binary file object, or
+    None once the connection is closed."""
+    prefix = stream.read(_HEADER.size)
+    if len(prefix) < _HEADER.size:
+        return None
+    body = stream.read(_HEADER.unpack(prefix)[0])
+    header = json.loads(body.decode("utf-8"))
+    payload = stream.read(header.get("payload", 0)) if header.get("payload") else b""
+    return header, payload
+
+
+class CameraNode:
+    """Node side: difference each frame against the last, detect, and send
+    the detections (and the RLE mask) to the central process."""
+
+    def __init__(self, port, camera, address, send_masks=True):
+        from .main import detect_motion, pyramid_level   # imported lazily: module cycle
+        self._detect = detect_motion
+        self.level = pyramid_level(port)
+        self.port = port
+        self.camera = camera
+        self.send_masks = send_masks
+        self.seq = 0
+        self._gray_old = None
+        self._socket = socket.create_connection(address)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._hello_sent = False
+
+    def process(self, frame, timestamp):
+        """Detect on one raw frame captured at ``timestamp`` (wall clock)
+        and send the result; the first frame only primes the differencing."""
+        gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        if not self._hello_sent:
+            self._socket.sendall(encode_message(
+                {"type": "hello", "port": self.port, "shape": list(gray.shape)}))
+            self._hello_sent = True
+        gray_old, self._gray_old = self._gray_old, gray
+        if gray_old is None:
+            return None
+        mask, detections = self._detect(gray, gray_old, self.camera, level=self.level)
+        header = {"type": "frame", "port": self.port, "seq": self.seq,
+                  "timestamp": float(timestamp),
+                  "detections": [[float(u), float(v)] for u, v in detections],
+                  "mask": list(mask.shape) if self.send_masks else None}
+        self._socket.sendall(encode_message(header, rle_encode(mask) if self.send_masks else b""))
+        self.seq += 1
+        return detections
+
+    def close(self):
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+
+
+class NodeServer:
+    """Central side: accept camera nodes and pair their messages by time.
+
+    next_set() takes the reference (first) port's oldest message and, from
+    every other node, its message captured within ``tolerance`` seconds;
+    a node that has not caught up yet is waited for up to ``max_wait``
+    seconds after the reference message arrived, then skipped for that set.
+    """
+
+    def __init__(self, ports, tolerance=None, max_wait=None, queue_frames=None):
+        self.ports = list(ports)
+        self.tolerance = float(tolerance if tolerance is not None
+                               else settings.NODE_PAIR_TOLERANCE_S)
+        self.max_wait = float(max_wait if max_wait is not None else settings.NODE_MAX_WAIT_S)
+        maxlen = int(queue_frames or settings.NODE_QUEUE_FRAMES)
+        # port -> deque of (timestamp, arrival, detections, mask)
+        self._queues = {port: collections.deque(maxlen=maxlen) for port in self.ports}
+        self._last_timestamp = {}
+        self.shapes = {}
+        self.connected = set()
+        self._lock = threading.Lock()
+        self._listener = None
+        self._connections = []        # live connections, for stop()
+        self._current = {}            # port -> its node's live connection
+        self.running = False
+
+    def start(self, host="0.0.0.0", port=None):
+        """Listen in a daemon thread; returns the actual bound port."""
+        self._listener = socket.create_server(
+            (host, settings.NODE_LISTEN_PORT if port is None else port))
+        self.running = True
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self._listener.getsockname()[1]
+
+    def _accept(self):
+        while self.running:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+            with self._lock:
+                self._connections.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        stream = conn.makefile("rb")
+        port = None
+        try:
+            while True:
+                message = read_message(stream)
+                if message is None:
+                    return
+                header, payload = message
+                if header["type"] == "hello":
+                    port = header["port"]
+                    if port not in self._queues:
+                        print(f"Camera node for unknown port {port} ignored.")
+                        return
+                    with self._lock:
+                        self.shapes[port] = tuple(header["shape"])
+                        self.connected.add(port)
+                        self._current[port] = conn   # a reconnect supersedes
+                    continue
+                mask = rle_decode(payload, tuple(header["mask"])) if header.get("mask") else None
+                entry = (header["timestamp"], time.perf_counter(),
+                         [tuple(d) for d in header["detections"]], mask)
+                with self._lock:
+                    self._queues[port].append(entry)
+                    self._last_timestamp[port] = header["timestamp"]
+        except (OSError, ValueError):
+            return
+        finally:
+            with self._lock:
+                self._connections.remove(conn)
+                if self._current.get(port) is conn:
+                    del self._current[port]
+                    self.connected.discard(port)
+            stream.close()
+            conn.close()
+
+    def next_set(self):
+        """(timestamp, {port: detections}, {port: mask}) of the next frame
+        set, or None when the reference node has nothing ready. Masks are
+        only listed for nodes that send them."""
+        with self._lock:
+            reference = self._queues[self.ports[0]]
+            if not reference:
+                return None
+            timestamp, arrival = reference[0][:2]
+            waited_out = time.perf_counter() - arrival > self.max_wait
+            picks = {}
+            for port in self.ports[1:]:
+                queue = self._queues[port]
+                while queue and queue[0][0] < timestamp - self.tolerance:
+                    queue.popleft()            # too old for this or any later set
+                if queue and queue[0][0] <= timestamp + self.tolerance:
+                    picks[port] = queue
+                elif (not queue and not waited_out
+                      and self._last_timestamp.get(port, -np.inf) < timestamp + self.tolerance):
+                    return None                # this node may still deliver
+            detections, masks = {}, {}
+            for port, queue in [(self.ports[0], reference)] + list(picks.items()):
+                _, _, found, mask = queue.popleft()
+                detections[port] = found
+                if mask is not None:
+                    masks[port] = mask
+            return timestamp, detections, masks
+
+    def stop(self):
+        self.running = False
+        if self._listener is not None:
+            self._listener.close()
+        with self._lock:
+            connections = list(self._connections)
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+
+
+def connect_node(port, camera, address, send_masks=True):
+    """A CameraNode connected to the central process at ``address``, retrying
+    until it is reachable: after NODE_RECONNECT_MIN_S, doubling up to
+    NODE_RECONNECT_MAX_S between attempts."""
+    delay = float(settings.NODE_RECONNECT_MIN_S)
+    while True:
+        try:
+            return CameraNode(port, camera, address, send_masks=send_masks)
+        except OSError as exc:
+            print(f"Central process at {address[0]}:{address[1]} unreachable ({exc}); "
+                  f"retrying in {delay:.1f} s")
+            time.sleep(delay)
+            delay = min(2.0 * delay, float(settings.NODE_RECONNECT_MAX_S))
+
+
+def run_node(port, address, send_masks=True):
+    """Capture loop of a node: newest frames from the local camera, detected
+    and shipped until interrupted. Waits for the central process to come up,
+    and reconnects when the connection drops."""
+    from .main import CameraStream   # imported lazily to avoid a module cycle
+    calibration_data = camera_calibration.load_calibration_data([port])
+    if calibration_data is None:
+        sys.exit("Intrinsics not found — run python -m pixel_to_voxel.camera_calibration first.")
+    stream = node = None
+    # Ring timestamps are perf_counter(); the wire carries wall-clock time
+    to_wall = time.time() - time.perf_counter()
+    try:
+        node = connect_node(port, calibration_data[port], address, send_masks=send_masks)
+        stream = CameraStream(port).start()
+        print(f"Camera {port} streaming detections to {address[0]}:{address[1]} (Ctrl+C to quit)")
+        while True:
+            newest = stream.read_newest()
+            if newest is None:
+                time.sleep(0.5 / settings.CAMERA_FPS)
+                continue
+            _, captured, frame = newest
+            try:
+                node.process(frame, captured + to_wall)
+            except OSError as exc:
+                print(f"Connection to the central process lost ({exc}); reconnecting.")
+                node.close()
+                node = None
+                node = connect_node(port, calibration_data[port], address,
+                                    send_masks=send_masks)
+    except KeyboardInterrupt:
+        print("\nCamera node stopped.")
+    finally:
+        if stream is not None:
+            stream.stop()
+        if node is not None:
+            node.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Camera node: detect locally, stream detections to the central process.")
+    parser.add_argument("--camera", type=int, required=True, help="Local camera port.")
+    parser.add_argument("--central", required=True,
+                        help=f"HOST[:PORT] of the central process (default port "
+                             f"{settings.NODE_LISTEN_PORT}).")
+    parser.add_argument("--no-masks", action="store_true",
+                        help="Send detections only (the central process then tracks "
+                             "without carving).")
+    args = parser.parse_args()
+    host, _, listen_port = args.central.partition(":")
+    run_node(args.camera, (host, int(listen_port or settings.NODE_LISTEN_PORT)),
+             send_masks=not args.no_masks)
+
+
+if __name__ == "__main__":
+    main()
@@ -71,11 +71,12 @@ class Dashboard:
 
     # -- pipeline side --------------------------------------------------
 
-    def publish(self, frames, state):
-        """Store the latest camera frames (BGR ndarrays) and state dict."""
+    def publish(self, frames, state, quality=80):
+        """Store the latest camera frames (BGR ndarrays, JPEG-encoded at
+        ``quality``) and state dict."""
         encoded = {}
         for port, frame in frames.items():
-            ok, jpeg = cv.imencode(".jpg", frame, [cv.IMWRITE_JPEG_QUALITY, 80])
+            ok, jpeg = cv.imencode(".jpg", frame, [cv.IMWRITE_JPEG_QUALITY, int(quality)])
             if ok:
                 encoded[port] = jpeg.tobytes()
         with self._cond:
@@ -143,12 +144,18 @@ class Dashboard:
 
 
 def serializable_state(sim_info, projection_enabled, fps, voxels, targets, grid,
-                       run_id):
+                       run_id, carving="ready", clusters=None, stages=None,
+                       shedding=None):
     """Build the JSON-able state dict published each frame.
 
     ``targets`` is the already-JSON-able list from MultiTargetTracker.state_list():
     per confirmed target its id, position, velocity, speed, heading, climb, and
     the ``cameras`` currently observing it (fewer than 2 means it is coasting).
+    ``carving`` is "warming up" while the carve tables are still being built,
+    "failed" if building them raised.
+    ``clusters`` is the already-JSON-able list from main.voxel_clusters().
+    ``stages`` is pipeline.Pipeline.stats(): per-stage throughput and cost.
+    ``shedding`` is pipeline.LoadShedder.state(): the current degradation level.
     """
     voxel_list = np.asarray(voxels, dtype=np.float64).reshape(-1, 3)
     sent = voxel_list
@@ -162,7 +169,11 @@ def serializable_state(sim_info, projection_enabled, fps, voxels, targets, grid,
         "voxel_count": int(len(voxel_list)),
         "voxels": [[round(float(c), 2) for c in row] for row in sent],
         "grid": grid,
+        "carving": carving,
         "targets": list(targets or []),
+        "clusters": list(clusters or []),
+        "stages": dict(stages or {}),
+        "shedding": shedding,
     }
 
 
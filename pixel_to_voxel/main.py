@@ -1,10 +1,13 @@
 import argparse
 import glob
+import hashlib
 import os
 import sys
+import tempfile
 import threading
 import time
 import webbrowser
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2 as cv
 import numpy as np
@@ -12,80 +15,936 @@ import numpy as np
 from . import settings
 from . import camera_calibration
 from . import camera_extrinsics
+from .camera_node import NodeServer
 from .dashboard import Dashboard, serializable_state
+from .occupancy import OccupancyGrid
+from .pipeline import LoadShedder, Pipeline
+from .shared_capture import FrameRing, SharedMemoryStream
 from .tracker import MultiTargetTracker
 
-class CameraStream:
-    def __init__(self, port):
+class CameraStream(FrameRing):
+    """Threaded camera reader keeping the last few frames in a ring buffer.
+
+    Frames are read straight into preallocated buffers (grab, timestamp,
+    then retrieve into the next slot), each stored with its sequence number
+    and capture timestamp (time.perf_counter() when the grab returned); the
+    FrameRing methods hand them out. The returned frames are views into the
+    ring: valid until the reader laps them, settings.CAMERA_BUFFER_FRAMES - 1
+    frames later, so copy anything kept longer.
+    """
+
+    def __init__(self, port, buffer_frames=None):
         self.stream = cv.VideoCapture(port)
-        (self.grabbed, self.frame) = self.stream.read()
+        self.size = int(buffer_frames or settings.CAMERA_BUFFER_FRAMES)
+        self.buffers = None                       # allocated from the first frame
+        self.sequence = np.full(self.size, -1, dtype=np.int64)
+        self.timestamps = np.zeros(self.size, dtype=np.float64)
+        self.latest = -1                          # newest sequence number written
+        self.last_read = -1                       # newest sequence number handed out
+        self._lock = threading.Lock()
+        self._thread = None
         self.stopped = False
 
     def start(self):
-        threading.Thread(target=self.update, args=()).start()
+        self._thread = threading.Thread(target=self.update, args=(), daemon=True)
+        self._thread.start()
         return self
 
     def update(self):
-        while True:
-            if self.stopped:
-                break
-            (self.grabbed, self.frame) = self.stream.read()
+        try:
+            while not self.stopped:
+                self._grab()
+        finally:
+            self.stream.release()
 
-    def read(self):
-        return self.frame
+    def _grab(self):
+        if not self.stream.grab():
+            time.sleep(0.001)
+            return
+        timestamp = time.perf_counter()
+        seq = self.latest + 1
+        slot = seq % self.size
+        with self._lock:
+            self.sequence[slot] = -1      # being overwritten: never hand it out
+        if self.buffers is None:
+            grabbed, frame = self.stream.retrieve()
+            if not grabbed:
+                return
+            self.buffers = [np.empty_like(frame) for _ in range(self.size)]
+            self.buffers[slot][...] = frame
+        else:
+            grabbed, frame = self.stream.retrieve(image=self.buffers[slot])
+            if not grabbed:
+                return
+            if frame is not self.buffers[slot]:
+                self.buffers[slot] = frame     # the camera changed resolution
+        with self._lock:
+            self.sequence[slot] = seq
+            self.timestamps[slot] = timestamp
+            self.latest = seq
 
     def stop(self):
         self.stopped = True
-        self.stream.release()
+        if self._thread is None:
+            self.stream.release()
+        else:
+            self._thread.join(1.0)   # the reader releases the capture on exit
 
-# Voxel-centre coordinates are fixed by settings, so they are built only once
-_voxel_centers = None
+# Voxels are addressed by flat index (C order over the x, y, z axes); their
+# coordinates are computed on demand from the per-axis centres, which are
+# fixed by settings and built only once
+_voxel_axes = None
 
-def voxel_grid_centers():
-    """World coordinates (N, 3) of every voxel centre in the grid spanned by
+def voxel_grid_axes():
+    """Per-axis voxel-centre coordinates (x, y, z) of the grid spanned by
     settings.VOXEL_GRID_MIN/MAX with edge length settings.VOXEL_SIZE."""
-    global _voxel_centers
-    if _voxel_centers is None:
+    global _voxel_axes
+    if _voxel_axes is None:
         size = float(settings.VOXEL_SIZE)
-        axes = [np.arange(low + size / 2.0, high, size)
-                for low, high in zip(settings.VOXEL_GRID_MIN, settings.VOXEL_GRID_MAX)]
-        grid = np.meshgrid(*axes, indexing="ij")
-        _voxel_centers = np.stack(grid, axis=-1).reshape(-1, 3)
-    return _voxel_centers
+        _voxel_axes = tuple(np.arange(low + size / 2.0, high, size)
+                            for low, high in zip(settings.VOXEL_GRID_MIN, settings.VOXEL_GRID_MAX))
+    return _voxel_axes
+
+# With settings.VOXEL_GRID_TYPE = "frustum" the cells are instead laid out
+# along the reference camera's pixel rays (index order: column, row, depth
+# bin), which needs that camera's calibration: the layout is built by the
+# first carve or prepare_carving() and kept until the calibration changes
+_frustum = {"key": None, "shape": None, "origin": None, "axis": None, "rays": None,
+            "depths": None, "edges": None}
+
+def _frustum_grid(shapes, cameras):
+    """Lay out the frustum grid from the reference camera.
+
+    Cells are FRUSTUM_PIXEL_BIN x FRUSTUM_PIXEL_BIN blocks of the reference
+    image, swept along their centre rays through depth bins that grow
+    geometrically by (1 + FRUSTUM_PIXEL_BIN / fx): every cell is about as deep
+    as it is wide, so it projects to roughly the same number of pixels at any
+    range. Depths span the VOXEL_GRID_MIN/MAX box as the reference camera sees
+    it; cells whose centre falls outside the box are never carved.
+    """
+    port = settings.FRUSTUM_REFERENCE_PORT
+    if port is None:
+        port = min(shapes)
+    key = (_calibration_key({port: shapes[port]}, cameras), _grid_key())
+    if _frustum["key"] != key:
+        height, width = shapes[port][:2]
+        K = np.asarray(cameras[port]["camera_matrix"], dtype=np.float64)
+        extrinsic = np.asarray(cameras[port]["extrinsic"], dtype=np.float64)
+        R, t = extrinsic[:3, :3], extrinsic[:3, 3]
+        step = int(settings.FRUSTUM_PIXEL_BIN)
+        u = np.minimum(np.arange(step / 2.0 - 0.5, width, step), width - 1)
+        v = np.minimum(np.arange(step / 2.0 - 0.5, height, step), height - 1)
+        uu, vv = np.meshgrid(u, v, indexing="ij")
+        pixels = np.stack([uu, vv, np.ones_like(uu)], axis=-1)
+        # World offset per metre of camera depth along each cell's centre ray
+        rays = pixels @ np.linalg.inv(K).T @ R
+
+        corners = np.array([(x, y, z) for x in (settings.VOXEL_GRID_MIN[0], settings.VOXEL_GRID_MAX[0])
+                            for y in (settings.VOXEL_GRID_MIN[1], settings.VOXEL_GRID_MAX[1])
+                            for z in (settings.VOXEL_GRID_MIN[2], settings.VOXEL_GRID_MAX[2])])
+        corner_depths = corners @ R[2] + t[2]
+        near = max(float(corner_depths.min()), float(settings.FRUSTUM_MIN_DEPTH))
+        far = max(float(corner_depths.max()), near)
+        ratio = 1.0 + step / K[0, 0]
+        bounds = near * ratio ** np.arange(int(np.ceil(np.log(far / near) / np.log(ratio))) + 1)
+        _frustum.update(key=key, shape=(len(u), len(v), len(bounds) - 1),
+                        origin=-R.T @ t, axis=R[2].copy(), rays=rays.reshape(-1, 3),
+                        depths=(bounds[:-1] + bounds[1:]) / 2.0,
+                        edges=(bounds[:-1] + bounds[1:]) / 2.0 * step / K[0, 0])
+    return _frustum
+
+def _grid_key():
+    """Settings that define the voxel grid, for cache keys."""
+    grid = (settings.VOXEL_GRID_TYPE, tuple(settings.VOXEL_GRID_MIN),
+            tuple(settings.VOXEL_GRID_MAX), float(settings.VOXEL_SIZE))
+    if settings.VOXEL_GRID_TYPE == "frustum":
+        grid += (settings.FRUSTUM_REFERENCE_PORT, int(settings.FRUSTUM_PIXEL_BIN),
+                 float(settings.FRUSTUM_MIN_DEPTH))
+    return grid
+
+def _frustum_layout():
+    if _frustum["key"] is None or _frustum["key"][1] != _grid_key():
+        raise RuntimeError("The frustum voxel grid is laid out from the reference "
+                           "camera by the first carve (or prepare_carving())")
+    return _frustum
+
+def voxel_grid_shape():
+    """Voxel counts along each grid axis: (nx, ny, nz) for the box grid,
+    (columns, rows, depth bins) for the frustum grid."""
+    if settings.VOXEL_GRID_TYPE == "frustum":
+        return _frustum_layout()["shape"]
+    return tuple(len(axis) for axis in voxel_grid_axes())
+
+def voxel_grid_info():
+    """JSON-able description of the voxel grid for the dashboard.
+
+    Always the carved box ("min", "max") and a voxel edge ("size"), tagged
+    with the grid "type". For the frustum grid, whose cells grow with range,
+    "size" is the nearest cells' edge and the rest describes the layout: the
+    reference camera's centre ("origin"), the corners of the gridded
+    frustum's "near" and "far" faces, and the cell edge at a point p as
+    (dot(axis, p) + offset) * edge_per_metre. None while the frustum grid is
+    not laid out yet (that takes the reference camera's first frame).
+    """
+    info = {"type": settings.VOXEL_GRID_TYPE, "min": list(settings.VOXEL_GRID_MIN),
+            "max": list(settings.VOXEL_GRID_MAX), "size": float(settings.VOXEL_SIZE)}
+    if settings.VOXEL_GRID_TYPE != "frustum":
+        return info
+    if _frustum["key"] is None or _frustum["key"][1] != _grid_key():
+        return None
+    columns, rows, _ = _frustum["shape"]
+    rays = _frustum["rays"].reshape(columns, rows, 3)
+    corners = rays[[0, -1, -1, 0], [0, 0, -1, -1]]
+    origin = _frustum["origin"]
+    depths, edges = _frustum["depths"], _frustum["edges"]
+    axis = _frustum["axis"]
+    return dict(info, size=float(edges[0]), origin=origin.tolist(),
+                near=(origin + corners * depths[0]).tolist(),
+                far=(origin + corners * depths[-1]).tolist(),
+                axis=axis.tolist(), offset=float(-axis @ origin),
+                edge_per_metre=float(edges[0] / depths[0]))
+
+def voxel_centers(indices):
+    """World coordinates (M, 3) of the voxel centres at flat ``indices``."""
+    ijk = np.unravel_index(np.asarray(indices, dtype=np.intp), voxel_grid_shape())
+    if settings.VOXEL_GRID_TYPE == "frustum":
+        grid = _frustum_layout()
+        ray = ijk[0] * grid["shape"][1] + ijk[1]
+        return grid["origin"] + grid["rays"][ray] * grid["depths"][ijk[2], None]
+    axes = voxel_grid_axes()
+    return np.stack([axis[i] for axis, i in zip(axes, ijk)], axis=-1)
+
+def _voxel_edges(indices):
+    """Edge length of the voxels at flat ``indices`` (frustum cells widen
+    with depth)."""
+    if settings.VOXEL_GRID_TYPE == "frustum":
+        ijk = np.unravel_index(np.asarray(indices, dtype=np.intp), voxel_grid_shape())
+        return _frustum_layout()["edges"][ijk[2]]
+    return np.full(len(indices), float(settings.VOXEL_SIZE))
+
+def _distortion(camera):
+    """The camera's lens distortion coefficients, or None for an ideal
+    pinhole (no or all-zero ``dist_coeffs``, as from the simulator)."""
+    dist = camera.get("dist_coeffs")
+    if dist is None or not np.any(dist):
+        return None
+    return np.asarray(dist, dtype=np.float64).ravel()
+
+def _distortion_limit(dist):
+    """Largest normalized radius up to which the radial distortion model
+    still grows outward; beyond it the polynomial folds far-off-axis points
+    back into the image, so they must not be projected through it."""
+    k1 = dist[0]
+    k2 = dist[1] if len(dist) > 1 else 0.0
+    k3 = dist[4] if len(dist) > 4 else 0.0
+    r = np.linspace(0.0, 4.0, 4001)[1:]
+    growth = 1 + 3 * k1 * r ** 2 + 5 * k2 * r ** 4 + 7 * k3 * r ** 6
+    folds = np.flatnonzero(growth <= 0)
+    return float(r[folds[0] - 1]) if len(folds) else np.inf
+
+def _camera_pixels(cam_points, camera):
+    """Pixel coordinates (..., 2) of camera-frame points (..., 3), through the
+    lens distortion when the camera has any, and whether each projection is
+    valid (in front of the camera, within the distortion model's range)."""
+    K = np.asarray(camera["camera_matrix"], dtype=np.float64)
+    depth = cam_points[..., 2]
+    valid = depth > 0
+    dist = _distortion(camera)
+    if dist is None:
+        uvw = cam_points @ K.T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return uvw[..., :2] / uvw[..., 2:3], valid
+    with np.errstate(divide="ignore", invalid="ignore"):
+        radius2 = (cam_points[..., 0] ** 2 + cam_points[..., 1] ** 2) / depth ** 2
+    valid &= radius2 < _distortion_limit(dist) ** 2
+    pixels = np.zeros(cam_points.shape[:-1] + (2,))
+    if valid.any():
+        projected, _ = cv.projectPoints(cam_points[valid].reshape(-1, 1, 3), np.zeros(3),
+                                        np.zeros(3), K, dist)
+        pixels[valid] = projected.reshape(-1, 2)
+    return pixels, valid
+
+def _project_to_pixels(points, camera, shape):
+    """Rounded pixels of world points in one camera.
+
+    Returns (indices, u, v): the positions in ``points`` that land in front of
+    the camera and inside an image of ``shape``, and their pixel coordinates.
+    Every carving engine projects through here, so they agree voxel for voxel.
+    Cameras with ``dist_coeffs`` project through their lens distortion, so
+    masks are carved as captured, without undistorting the frames.
+    """
+    extrinsic = np.asarray(camera["extrinsic"], dtype=np.float64)
+    cam_points = points @ extrinsic[:3, :3].T + extrinsic[:3, 3]
+    pixels, visible = _camera_pixels(cam_points, camera)
+    u = np.rint(pixels[visible, 0]).astype(np.intp)
+    v = np.rint(pixels[visible, 1]).astype(np.intp)
+    height, width = shape[:2]
+    inside = (u >= 0) & (u < width) & (v >= 0) & (v < height)
+    return np.flatnonzero(visible)[inside], u[inside], v[inside]
+
+def _image_shapes(masks):
+    return {port: mask.shape[:2] for port, mask in masks.items()}
+
+def _calibration_key(shapes, cameras):
+    return tuple(sorted(
+        (port, tuple(shape),
+         np.asarray(cameras[port]["camera_matrix"], dtype=np.float64).tobytes(),
+         np.asarray(cameras[port]["extrinsic"], dtype=np.float64).tobytes(),
+         None if _distortion(cameras[port]) is None else _distortion(cameras[port]).tobytes())
+        for port, shape in shapes.items()))
 
 # Which voxel centres each camera can see depends only on the calibration and
 # image sizes, so the projection tables are built once and reused every frame.
-_carve_cache = {"key": None, "per_camera": None, "visible_count": None}
+# Per camera they hold, for every voxel the camera sees, its flat voxel index
+# and the flat pixel offset (v * width + u) it projects to — both int32, so
+# 8 bytes per visible voxel per camera — plus a uint8 count of the cameras
+# seeing each voxel. Entries of voxels seen by fewer than two cameras are
+# dropped (see carve_coverage()). They are also saved to settings.CALIBRATION_DATA_PATH
+# and memory-mapped on later runs (settings.CARVE_TABLE_CACHE).
+_carve_cache = {"key": None, "per_camera": None, "visible_count": None,
+                "inverted": None, "bricks": None, "footprints": None, "coverage": None}
 
-def _carve_tables(masks, cameras):
-    key = tuple(sorted(
-        (port, mask.shape,
-         np.asarray(cameras[port]["camera_matrix"], dtype=np.float64).tobytes(),
-         np.asarray(cameras[port]["extrinsic"], dtype=np.float64).tobytes())
-        for port, mask in masks.items()))
+def _table_file(digest, name):
+    return os.path.join(settings.CALIBRATION_DATA_PATH, f"carve_{digest}_{name}.npy")
+
+def _load_table_files(digest, names):
+    """Memory-map previously saved carve tables, or None if any is missing.
+    Read-only maps let several pipeline processes share the same pages."""
+    try:
+        return {name: np.load(_table_file(digest, name), mmap_mode="r") for name in names}
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _save_table_files(digest, arrays):
+    """Write tables via a temporary file each, so a concurrent reader never
+    maps a half-written one. The temporary names are unique, so processes
+    building the same tables at once do not write into each other's files;
+    the last rename wins with identical contents."""
+    os.makedirs(settings.CALIBRATION_DATA_PATH, exist_ok=True)
+    for name, array in arrays.items():
+        path = _table_file(digest, name)
+        with tempfile.NamedTemporaryFile(dir=settings.CALIBRATION_DATA_PATH,
+                                         prefix=os.path.basename(path) + ".",
+                                         suffix=".tmp", delete=False) as f:
+            try:
+                np.save(f, array)
+            except BaseException:
+                f.close()
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, path)
+
+def _prune_table_files(digest):
+    """Delete saved tables of every other calibration or grid: each set can
+    run to gigabytes, and after recalibrating the old ones never match again.
+    A file still mapped by another process stays readable until it is
+    closed; one that cannot be removed (Windows) is left for the next prune."""
+    keep = f"carve_{digest}_"
+    for path in glob.glob(_table_file("?" * 16, "*")):
+        if not os.path.basename(path).startswith(keep):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def _in_grid_box(centers):
+    """Which voxel ``centers`` lie in the configured grid box (only frustum
+    cells can stick out of it; those are never carved)."""
+    low = np.asarray(settings.VOXEL_GRID_MIN, dtype=np.float64)
+    high = np.asarray(settings.VOXEL_GRID_MAX, dtype=np.float64)
+    return ((centers >= low) & (centers <= high)).all(axis=1)
+
+def _carve_tables(shapes, cameras):
+    """Carve tables for images of ``shapes`` ({port: (H, W)}), cached."""
+    if settings.VOXEL_GRID_TYPE == "frustum":
+        _frustum_grid(shapes, cameras)
+    key = (_calibration_key(shapes, cameras), _grid_key())
     if _carve_cache["key"] == key:
         return _carve_cache
-    centers = voxel_grid_centers()
-    per_camera = {}
-    visible_count = np.zeros(len(centers), dtype=np.int32)
+    # The on-disk name hashes the calibration key together with the grid, so
+    # stale tables are never picked up after recalibrating or resizing
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+    names = ["visible"] + [f"{port}_{part}" for port in sorted(shapes)
+                           for part in ("indices", "pixels")]
+    arrays = _load_table_files(digest, names) if settings.CARVE_TABLE_CACHE else None
+    if arrays is None:
+        # Project the grid a chunk of voxels at a time, so the peak memory is
+        # the tables themselves, not per-voxel temporaries over the whole grid
+        count = int(np.prod(voxel_grid_shape()))
+        chunk = int(settings.CARVE_TABLE_CHUNK)
+        visible = np.zeros(count, dtype=np.uint8)
+        parts = {port: ([], []) for port in shapes}
+        for start in range(0, count, chunk):
+            voxels = np.arange(start, min(start + chunk, count))
+            centers = voxel_centers(voxels)
+            inside = _in_grid_box(centers)
+            voxels, centers = voxels[inside], centers[inside]
+            for port, shape in shapes.items():
+                indices, u, v = _project_to_pixels(centers, cameras[port], shape)
+                indices = voxels[indices].astype(np.int32)
+                parts[port][0].append(indices)
+                parts[port][1].append((v * shape[1] + u).astype(np.int32))
+                visible[indices] += 1
+        # Voxels seen by fewer than two cameras can never be occupied: crop
+        # their entries, which on a divergent rig is most of the box
+        usable = visible >= 2
+        arrays = {"visible": visible}
+        for port, (indices, pixels) in parts.items():
+            indices = np.concatenate(indices)
+            keep = usable[indices]
+            arrays[f"{port}_indices"] = indices[keep]
+            arrays[f"{port}_pixels"] = np.concatenate(pixels)[keep]
+        if settings.CARVE_TABLE_CACHE:
+            _save_table_files(digest, arrays)
+            _prune_table_files(digest)
+    per_camera = {port: (arrays[f"{port}_indices"], arrays[f"{port}_pixels"])
+                  for port in shapes}
+    _carve_cache.update(key=key, per_camera=per_camera, visible_count=arrays["visible"],
+                        inverted=None, bricks=None, footprints=None, coverage=None)
+    return _carve_cache
+
+def carve_coverage():
+    """How much of the configured grid the cameras can carve: {"usable":
+    voxels seen by two or more cameras, "total": voxels in the grid box,
+    "fraction", "bounds": (min, max) world corners of the usable voxels'
+    centres, or None}. Only usable voxels are kept in the carve tables.
+    Frustum cells outside the box count in neither. None before the first
+    carve."""
+    if _carve_cache["key"] is None:
+        return None
+    if _carve_cache["coverage"] is None:
+        usable = np.flatnonzero(_carve_cache["visible_count"] >= 2)
+        total = count = len(_carve_cache["visible_count"])
+        if settings.VOXEL_GRID_TYPE == "frustum":
+            total = 0
+            chunk = int(settings.CARVE_TABLE_CHUNK)
+            for start in range(0, count, chunk):
+                centers = voxel_centers(np.arange(start, min(start + chunk, count)))
+                total += int(_in_grid_box(centers).sum())
+        bounds = None
+        if len(usable):
+            centers = voxel_centers(usable)
+            bounds = (centers.min(axis=0).tolist(), centers.max(axis=0).tolist())
+        _carve_cache["coverage"] = {"usable": len(usable), "total": total,
+                                    "fraction": len(usable) / max(total, 1),
+                                    "bounds": bounds}
+    return _carve_cache["coverage"]
+
+def carve_table_nbytes():
+    """Memory held by the cached carve tables (inverted index and footprints
+    included once built), in bytes; 0 before the first carve."""
+    if _carve_cache["key"] is None:
+        return 0
+    arrays = [_carve_cache["visible_count"]]
+    for tables in ("per_camera", "inverted", "footprints"):
+        for pair in (_carve_cache[tables] or {}).values():
+            arrays.extend(pair)
+    return int(sum(a.nbytes for a in arrays))
+
+def _carve_dense(masks, cameras):
+    """Test every voxel of the grid through the precomputed carve tables."""
+    tables = _carve_tables(_image_shapes(masks), cameras)
+    support = np.zeros(len(tables["visible_count"]), dtype=np.uint8)
     for port, mask in masks.items():
-        K = np.asarray(cameras[port]["camera_matrix"], dtype=np.float64)
+        indices, pixels = tables["per_camera"][port]
+        hit = mask.ravel()[pixels] > 0
+        support[indices[hit]] += 1
+    visible = tables["visible_count"]
+    return np.flatnonzero((visible >= 2) & (support == visible))
+
+def _footprint_tables(shapes, cameras):
+    """Per camera, the carve table's entries with their projected voxel
+    footprints: (indices, corners), where row i of the (N, 4) ``corners``
+    holds the flat indices, in the image's (H + 1) x (W + 1) integral image,
+    of the top-left, top-right, bottom-left and bottom-right corners of entry
+    i's footprint: (2 half_u + 1) x (2 half_v + 1) pixels around its centre
+    pixel, clipped at the image border.
+
+    The half-sizes are fx * edge / 2 / depth (fy likewise), rounded: the
+    projection of the voxel's face toward the camera. They ignore lens
+    distortion, which stretches or squeezes footprints toward the image
+    edges (only the centre pixel is distorted). Built on first use and
+    cached with the carve tables.
+    """
+    tables = _carve_tables(shapes, cameras)
+    if tables.get("footprints") is None:
+        footprints = {}
+        chunk = int(settings.CARVE_TABLE_CHUNK)
+        for port, (height, width) in shapes.items():
+            K = np.asarray(cameras[port]["camera_matrix"], dtype=np.float64)
+            extrinsic = np.asarray(cameras[port]["extrinsic"], dtype=np.float64)
+            indices, pixels = tables["per_camera"][port]
+            corners = np.empty((len(indices), 4), dtype=np.int32)
+            for start in range(0, len(indices), chunk):
+                block = indices[start:start + chunk]
+                depth = voxel_centers(block) @ extrinsic[2, :3] + extrinsic[2, 3]
+                half_edge = _voxel_edges(block) / 2.0
+                half_u = np.rint(K[0, 0] * half_edge / depth).astype(np.int64)
+                half_v = np.rint(K[1, 1] * half_edge / depth).astype(np.int64)
+                v, u = np.divmod(pixels[start:start + chunk].astype(np.int64), width)
+                u0, u1 = np.maximum(u - half_u, 0), np.minimum(u + half_u + 1, width)
+                v0, v1 = np.maximum(v - half_v, 0), np.minimum(v + half_v + 1, height)
+                corners[start:start + chunk] = np.column_stack(
+                    [v0 * (width + 1) + u0, v0 * (width + 1) + u1,
+                     v1 * (width + 1) + u0, v1 * (width + 1) + u1])
+            footprints[port] = (indices, corners)
+        tables["footprints"] = footprints
+    return tables
+
+def _carve_footprint(masks, cameras):
+    """Dense carving where a camera supports a voxel when ANY mask pixel lies
+    in the voxel's projected footprint, not just under its centre. Thin or
+    distant silhouettes that fall between voxel centres are still caught, so
+    voxels can be much coarser than the object for the same recall; the hull
+    grows by up to a voxel.
+
+    One integral image per mask, then four lookups per entry: the footprint's
+    box sum is nonzero exactly when a set pixel lies in it, whatever the
+    footprint's size.
+    """
+    tables = _footprint_tables(_image_shapes(masks), cameras)
+    support = np.zeros(len(tables["visible_count"]), dtype=np.uint8)
+    for port, mask in masks.items():
+        indices, corners = tables["footprints"][port]
+        integral = cv.integral((np.asarray(mask) > 0).view(np.uint8)).ravel()
+        box = (integral[corners[:, 3]] - integral[corners[:, 1]]
+               - integral[corners[:, 2]] + integral[corners[:, 0]])
+        support[indices[box > 0]] += 1
+    visible = tables["visible_count"]
+    return np.flatnonzero((visible >= 2) & (support == visible))
+
+def _inverted_tables(shapes, cameras):
+    """Per camera, the carve table inverted into CSR form: the voxels seen at
+    flat pixel p are ``voxels[offsets[p]:offsets[p + 1]]``. Built on first use
+    and cached with the carve tables they invert."""
+    tables = _carve_tables(shapes, cameras)
+    if tables.get("inverted") is None:
+        inverted = {}
+        for port, (height, width) in shapes.items():
+            indices, pixels = tables["per_camera"][port]
+            order = np.argsort(pixels, kind="stable")
+            offsets = np.zeros(height * width + 1, dtype=np.int32)
+            np.cumsum(np.bincount(pixels, minlength=height * width), out=offsets[1:])
+            inverted[port] = (offsets, indices[order])
+        tables["inverted"] = inverted
+    return tables
+
+def _csr_gather(offsets, values, rows):
+    """Concatenation of ``values[offsets[r]:offsets[r + 1]]`` over ``rows``."""
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    if not lengths.sum():
+        return values[:0]
+    ends = np.cumsum(lengths)
+    return values[np.repeat(starts - ends + lengths, lengths) + np.arange(ends[-1])]
+
+def _carve_inverted(masks, cameras):
+    """Carve from the mask pixels instead of the grid: the voxels behind each
+    set pixel become candidates, which are then checked against every camera
+    under the same visibility-aware rule as the dense engine.
+
+    A voxel is occupied when it is visible to at least two cameras and every
+    camera that sees it has a set pixel there (support == visible). Leaving
+    one camera out still leaves one of those cameras among the seeds, and it
+    lists the voxel behind its set pixel; so seeding from all cameras except
+    the one with the most set pixels finds every occupied voxel. Work scales
+    with the set pixels, not the grid volume.
+    """
+    tables = _inverted_tables(_image_shapes(masks), cameras)
+    set_pixels = {port: np.flatnonzero(mask.ravel()) for port, mask in masks.items()}
+    seeds = sorted(masks, key=lambda port: len(set_pixels[port]))[:-1]
+    candidates = np.unique(np.concatenate(
+        [_csr_gather(*tables["inverted"][port], set_pixels[port]) for port in seeds]
+        or [np.empty(0, dtype=np.int32)]))
+    return _carve_candidates(candidates, masks, tables)
+
+def _carve_candidates(candidates, masks, tables):
+    """The occupied subset of sorted candidate voxels, tested one by one
+    through the carve tables under the dense engine's rule."""
+    visible = tables["visible_count"][candidates]
+    candidates = candidates[visible >= 2]
+    visible = visible[visible >= 2]
+    support = np.zeros(len(candidates), dtype=np.uint8)
+    for port, mask in masks.items():
+        indices, pixels = tables["per_camera"][port]
+        if not len(indices):
+            continue
+        pos = np.minimum(np.searchsorted(indices, candidates), len(indices) - 1)
+        seen = np.flatnonzero(indices[pos] == candidates)
+        support[seen] += mask.ravel()[pixels[pos[seen]]] > 0
+    return candidates[support == visible]
+
+def _brick_tables(shapes, cameras):
+    """Per-brick summary of the carve tables, built on first use.
+
+    The grid is cut into bricks of settings.CARVE_BRICK voxels per edge. For
+    each camera, a brick gets the pixel box bounding the projections of its
+    voxels and whether the camera sees every one of its usable (two-camera)
+    voxels; bricks with no usable voxel are marked uncarvable once and for
+    all.
+    """
+    tables = _carve_tables(shapes, cameras)
+    if tables.get("bricks") is None:
+        edge = int(settings.CARVE_BRICK)
+        shape = np.array(voxel_grid_shape())
+        counts = -(-shape // edge)
+
+        def brick_of(indices):
+            ijk = np.unravel_index(indices, shape)
+            return np.ravel_multi_index([i // edge for i in ijk], counts)
+
+        brick_voxels = np.bincount(brick_of(np.flatnonzero(tables["visible_count"] >= 2)),
+                                   minlength=int(np.prod(counts)))
+        carvable = brick_voxels > 0
+        per_camera = {}
+        for port, (height, width) in shapes.items():
+            indices, pixels = tables["per_camera"][port]
+            brick = brick_of(indices)
+            order = np.argsort(brick, kind="stable")
+            brick = brick[order]
+            u = pixels[order] % width
+            v = pixels[order] // width
+            starts = np.flatnonzero(np.r_[True, brick[1:] != brick[:-1]]) if len(brick) else []
+            ids = brick[starts]
+            box = np.tile(np.array([width, -1, height, -1], dtype=np.int32),
+                          (len(brick_voxels), 1))
+            if len(ids):
+                box[ids, 0] = np.minimum.reduceat(u, starts)
+                box[ids, 1] = np.maximum.reduceat(u, starts)
+                box[ids, 2] = np.minimum.reduceat(v, starts)
+                box[ids, 3] = np.maximum.reduceat(v, starts)
+            seen = np.zeros(len(brick_voxels), dtype=np.int64)
+            seen[ids] = np.diff(np.r_[starts, len(brick)])
+            per_camera[port] = (*box.T, seen == brick_voxels)
+        tables["bricks"] = {"edge": edge, "counts": counts, "carvable": carvable,
+                            "per_camera": per_camera}
+    return tables
+
+def _blob_boxes(mask, step=4):
+    """Inclusive pixel boxes (x0, x1, y0, y1) around the mask's blobs.
+
+    Blobs are labelled on a copy max-pooled by ``step`` (a corner-anchored
+    dilation sampled every ``step`` pixels), which is ~step^2 times cheaper
+    than labelling the full mask; each box grows by less than ``step``
+    pixels, which can only keep a few extra bricks.
+    """
+    pooled = cv.dilate(mask, np.ones((step, step), np.uint8), anchor=(0, 0))[::step, ::step]
+    _, _, stats, _ = cv.connectedComponentsWithStats(pooled, connectivity=8)
+    x, y, w, h = stats[1:, :4].T * step
+    return x, x + w - 1, y, y + h - 1
+
+def _carve_bricks(masks, cameras):
+    """Carve only the bricks that could hold a moving object: a camera that
+    sees a whole brick vetoes it when the brick's pixel box misses every
+    blob bounding box in its mask. Voxels of the surviving bricks are then
+    tested one by one, so the cost follows the number of moving objects."""
+    tables = _brick_tables(_image_shapes(masks), cameras)
+    bricks = tables["bricks"]
+    active = bricks["carvable"].copy()
+    for port, mask in masks.items():
+        u0, u1, v0, v1, full = bricks["per_camera"][port]
+        x0, x1, y0, y1 = _blob_boxes(mask)
+        sel = np.flatnonzero(active & full)
+        overlap = ((u0[sel, None] <= x1) & (u1[sel, None] >= x0)
+                   & (v0[sel, None] <= y1) & (v1[sel, None] >= y0)).any(axis=1)
+        active[sel[~overlap]] = False
+
+    edge = bricks["edge"]
+    corner = np.stack(np.unravel_index(np.flatnonzero(active), bricks["counts"]), axis=1) * edge
+    offsets = np.stack(np.meshgrid(*[np.arange(edge)] * 3, indexing="ij"), axis=-1).reshape(-1, 3)
+    voxels = (corner[:, None, :] + offsets).reshape(-1, 3)
+    shape = np.array(voxel_grid_shape())
+    voxels = voxels[(voxels < shape).all(axis=1)]
+    candidates = np.sort(np.ravel_multi_index(voxels.T, shape))
+    return _carve_candidates(candidates, masks, tables)
+
+def _mask_pyramid(mask):
+    """Max-pooled levels of a binary mask: level k holds, per 2^k x 2^k pixel
+    block, whether any pixel in it is set. The last level is a single cell."""
+    levels = [np.ascontiguousarray(mask > 0)]
+    while max(levels[-1].shape) > 1:
+        m = levels[-1]
+        height, width = m.shape
+        if height % 2 or width % 2:
+            m = np.pad(m, ((0, height % 2), (0, width % 2)))
+        levels.append(m[0::2, 0::2] | m[1::2, 0::2] | m[0::2, 1::2] | m[1::2, 1::2])
+    return levels
+
+def _pyramid_any(levels, u0, u1, v0, v1):
+    """Conservative "any mask pixel set in the box" for many pixel boxes.
+
+    Each inclusive box [u0, u1] x [v0, v1] is looked up on the coarsest level
+    whose cells are at least as wide as the box, so it touches at most 2 x 2
+    cells there. Those cells may cover a little more than the box, which only
+    ever keeps a cell that could have been dropped.
+    """
+    span = np.maximum(u1 - u0, v1 - v0) + 1
+    level = np.minimum(np.ceil(np.log2(span)).astype(np.intp), len(levels) - 1)
+    result = np.zeros(len(span), dtype=bool)
+    for k in np.unique(level):
+        sel = np.flatnonzero(level == k)
+        grid = levels[k]
+        height, width = grid.shape
+        cu0 = np.minimum(u0[sel] >> k, width - 1)
+        cu1 = np.minimum(u1[sel] >> k, width - 1)
+        cv0 = np.minimum(v0[sel] >> k, height - 1)
+        cv1 = np.minimum(v1[sel] >> k, height - 1)
+        result[sel] = grid[cv0, cu0] | grid[cv0, cu1] | grid[cv1, cu0] | grid[cv1, cu1]
+    return result
+
+def _distorted_bounds(cam_points, camera, samples=3):
+    """Pixel bounds (u0, u1, v0, v1) of everything inside convex point sets
+    seen through a distorting lens, and whether each bound holds.
+
+    ``cam_points`` (C, S, 3) holds the corners of C convex sets in the camera
+    frame. Their normalized coordinates (x/z, y/z) stay inside the 2D box of
+    the corners' (the pinhole part maps lines to lines), so the bound covers
+    that box: the undistorted part spans it exactly, and the distortion's
+    displacement is sampled on a ``samples`` x ``samples`` grid over it and
+    widened by its Jacobian bound times the distance to the nearest sample.
+    The bound only holds for sets wholly in front of the camera and within
+    the distortion model's range, and for the k1, k2, p1, p2, k3 model; for
+    any other it is flagged as not holding.
+    """
+    K = np.asarray(camera["camera_matrix"], dtype=np.float64)
+    dist = np.zeros(5)
+    coeffs = _distortion(camera)
+    dist[:min(len(coeffs), 5)] = coeffs[:5]
+    k1, k2, p1, p2, k3 = dist
+    depth = cam_points[..., 2]
+    holds = (depth > 0).all(axis=1) & (not np.any(coeffs[5:]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        normalized = cam_points[..., :2] / depth[..., None]
+    normalized[~holds] = 0.0
+    x0, y0 = normalized.min(axis=1).T
+    x1, y1 = normalized.max(axis=1).T
+    X = np.maximum(np.abs(x0), np.abs(x1))
+    Y = np.maximum(np.abs(y0), np.abs(y1))
+    R2 = X ** 2 + Y ** 2
+    holds &= R2 < _distortion_limit(coeffs) ** 2
+
+    # Displacement e(x, y) = distorted - undistorted, on the sample grid
+    steps = np.linspace(0.0, 1.0, samples)
+    x = (x0[:, None] + np.outer(x1 - x0, steps))[:, :, None]
+    y = (y0[:, None] + np.outer(y1 - y0, steps))[:, None, :]
+    r2 = x ** 2 + y ** 2
+    radial = k1 * r2 + k2 * r2 ** 2 + k3 * r2 ** 3
+    ex = (x * radial + 2 * p1 * x * y + p2 * (r2 + 2 * x ** 2)).reshape(len(x0), -1)
+    ey = (y * radial + p1 * (r2 + 2 * y ** 2) + 2 * p2 * x * y).reshape(len(x0), -1)
+    # Bounds on |de/dx|, |de/dy| over the box (g = 1 + radial, g' = dg/dr2)
+    H = abs(k1) * R2 + abs(k2) * R2 ** 2 + abs(k3) * R2 ** 3
+    G = abs(k1) + 2 * abs(k2) * R2 + 3 * abs(k3) * R2 ** 2
+    cross = 2 * X * Y * G + 2 * abs(p1) * X + 2 * abs(p2) * Y
+    hx = (x1 - x0) / (2 * (samples - 1))
+    hy = (y1 - y0) / (2 * (samples - 1))
+    pad_x = (H + 2 * X ** 2 * G + 2 * abs(p1) * Y + 6 * abs(p2) * X) * hx + cross * hy
+    pad_y = cross * hx + (H + 2 * Y ** 2 * G + 6 * abs(p1) * Y + 2 * abs(p2) * X) * hy
+    lo_x, hi_x = x0 + ex.min(axis=1) - pad_x, x1 + ex.max(axis=1) + pad_x
+    lo_y, hi_y = y0 + ey.min(axis=1) - pad_y, y1 + ey.max(axis=1) + pad_y
+
+    skew = K[0, 1] * np.stack([lo_y, hi_y])
+    u0 = K[0, 0] * lo_x + skew.min(axis=0) + K[0, 2]
+    u1 = K[0, 0] * hi_x + skew.max(axis=0) + K[0, 2]
+    v0 = K[1, 1] * lo_y + K[1, 2]
+    v1 = K[1, 1] * hi_y + K[1, 2]
+    return u0, u1, v0, v1, holds
+
+def _cell_footprints(cells, size, axes, shapes, cameras):
+    """Projected pixel boxes of grid cells (``size`` voxels per edge).
+
+    A cell is bounded by the box spanning its voxel centres, so the rounded
+    projection of every centre inside lies within the box through its eight
+    corners (widened to whole pixels). Lens distortion bows the cell's edges;
+    for such cameras the box comes from _distorted_bounds() instead, a bound
+    that holds for the whole cell. Per port, returns (u0, u1, v0, v1, full,
+    partial): ``full`` cells are seen voxel for voxel by the camera,
+    ``partial`` cells may have some voxels in its view.
+    """
+    shape = np.array([len(a) for a in axes])
+    lo = cells * size
+    hi = np.minimum(lo + size, shape) - 1
+    bounds = [np.stack([axes[d][lo[:, d]], axes[d][hi[:, d]]], axis=1) for d in range(3)]
+    corners = np.stack([np.stack([bounds[0][:, a], bounds[1][:, b], bounds[2][:, c]], axis=1)
+                        for a in (0, 1) for b in (0, 1) for c in (0, 1)], axis=1)
+
+    footprints = {}
+    for port, (height, width) in shapes.items():
         extrinsic = np.asarray(cameras[port]["extrinsic"], dtype=np.float64)
-        cam_points = centers @ extrinsic[:3, :3].T + extrinsic[:3, 3]
-        visible = cam_points[:, 2] > 0
-        uvw = cam_points[visible] @ K.T
-        pixels = uvw[:, :2] / uvw[:, 2:3]
-        u = np.rint(pixels[:, 0]).astype(np.intp)
-        v = np.rint(pixels[:, 1]).astype(np.intp)
-        height, width = mask.shape[:2]
-        inside = (u >= 0) & (u < width) & (v >= 0) & (v < height)
-        indices = np.flatnonzero(visible)[inside]
-        per_camera[port] = (indices, u[inside], v[inside])
-        visible_count[indices] += 1
-    _carve_cache.update(key=key, per_camera=per_camera, visible_count=visible_count)
-    return _carve_cache
+        cam_points = corners @ extrinsic[:3, :3].T + extrinsic[:3, 3]
+        behind = (cam_points[..., 2] <= 0).all(axis=1)
+        if _distortion(cameras[port]) is None:
+            pixels, valid = _camera_pixels(cam_points, cameras[port])
+            # Cells not wholly in front cannot be bounded by their corners:
+            # never full, always partial
+            trusted = valid.all(axis=1)
+            pixels[~valid] = 0.0
+            u0, v0 = pixels.min(axis=1).T
+            u1, v1 = pixels.max(axis=1).T
+        else:
+            u0, u1, v0, v1, trusted = _distorted_bounds(cam_points, cameras[port])
+            u0, u1, v0, v1 = (np.where(trusted, a, 0.0) for a in (u0, u1, v0, v1))
+        u0, v0 = np.floor(u0), np.floor(v0)
+        u1, v1 = np.ceil(u1), np.ceil(v1)
+        full = trusted & (u0 >= 0) & (u1 < width) & (v0 >= 0) & (v1 < height)
+        overlaps = (u1 >= 0) & (u0 < width) & (v1 >= 0) & (v0 < height)
+        partial = ~behind & (~trusted | overlaps)
+        box = [np.clip(a, 0, limit - 1).astype(np.intp)
+               for a, limit in ((u0, width), (u1, width), (v0, height), (v1, height))]
+        footprints[port] = (*box, full, partial)
+    return footprints
+
+def _cells_may_be_occupied(footprints, pyramids):
+    """Cells that can still hold an occupied voxel: at least two cameras may
+    see part of them, and no camera that sees all of them shows background
+    over their whole footprint (that camera would carve every voxel)."""
+    seen_by = None
+    keep = None
+    for port, (u0, u1, v0, v1, full, partial) in footprints.items():
+        seen_by = partial.astype(np.int32) if seen_by is None else seen_by + partial
+        vetoed = np.zeros(len(full), dtype=bool)
+        sel = np.flatnonzero(full)
+        vetoed[sel] = ~_pyramid_any(pyramids[port], u0[sel], u1[sel], v0[sel], v1[sel])
+        keep = ~vetoed if keep is None else keep & ~vetoed
+    return keep & (seen_by >= 2)
+
+def _coarse_cell_edge(voxel_size):
+    """Edge of the coarsest hierarchical cells, in voxels: the power of two
+    nearest settings.CARVE_COARSE_CELL metres."""
+    ratio = float(settings.CARVE_COARSE_CELL) / float(voxel_size)
+    return 2 ** max(int(round(np.log2(max(ratio, 1.0)))), 0)
+
+def _top_cells(shape, size):
+    """(C, 3) indices of the cells of ``size`` voxels covering a grid."""
+    counts = -(-np.asarray(shape) // size)
+    return np.stack(np.meshgrid(*[np.arange(n) for n in counts], indexing="ij"),
+                    axis=-1).reshape(-1, 3)
+
+def _carve_hierarchy(masks, cameras, axes, size, cells, footprints, pyramids):
+    """Coarse-to-fine carve of the grid with per-axis voxel centres ``axes``,
+    starting from ``cells`` of ``size`` voxels with their ``footprints``.
+    Returns the (M, 3) ijk indices of the occupied voxels."""
+    shape = np.array([len(a) for a in axes])
+    shapes = _image_shapes(masks)
+    octants = np.array([(a, b, c) for a in (0, 1) for b in (0, 1) for c in (0, 1)])
+    while size > 1:
+        cells = cells[_cells_may_be_occupied(footprints, pyramids)]
+        size //= 2
+        cells = (2 * cells[:, None, :] + octants).reshape(-1, 3)
+        cells = cells[(cells * size < shape).all(axis=1)]
+        if size > 1:
+            footprints = _cell_footprints(cells, size, axes, shapes, cameras)
+
+    points = np.stack([axes[d][cells[:, d]] for d in range(3)], axis=1)
+    visible = np.zeros(len(points), dtype=np.int32)
+    support = np.zeros(len(points), dtype=np.int32)
+    for port, mask in masks.items():
+        indices, u, v = _project_to_pixels(points, cameras[port], mask.shape)
+        visible[indices] += 1
+        support[indices[mask[v, u] > 0]] += 1
+    return cells[(visible >= 2) & (support == visible)]
+
+# Footprints of the top-level cells are as static as the carve tables
+_hierarchy_cache = {"key": None, "size": None, "cells": None, "footprints": None}
+
+def _hierarchy_top(shapes, cameras):
+    """Top-level cells of the hierarchical engine and their footprints."""
+    check_carve_settings("hierarchical")
+    size = _coarse_cell_edge(settings.VOXEL_SIZE)
+    key = (_calibration_key(shapes, cameras), _grid_key(), size)
+    if _hierarchy_cache["key"] != key:
+        cells = _top_cells(voxel_grid_shape(), size)
+        footprints = _cell_footprints(cells, size, voxel_grid_axes(), shapes, cameras)
+        _hierarchy_cache.update(key=key, size=size, cells=cells, footprints=footprints)
+    return _hierarchy_cache
+
+def _carve_hierarchical(masks, cameras):
+    """Coarse-to-fine carving: cells of about settings.CARVE_COARSE_CELL metres
+    per edge are tested against max-pooled mask pyramids and only survivors are
+    split into octants, down to single voxels tested exactly as the dense
+    engine tests them. The occupied set is identical; the work follows the
+    hull's surface instead of the grid's volume, and no carve tables are
+    needed."""
+    top = _hierarchy_top(_image_shapes(masks), cameras)
+    pyramids = {port: _mask_pyramid(mask) for port, mask in masks.items()}
+    voxels = _carve_hierarchy(masks, cameras, voxel_grid_axes(), top["size"],
+                              top["cells"], top["footprints"], pyramids)
+    return np.sort(np.ravel_multi_index(voxels.T, voxel_grid_shape()))
+
+def carve_target_patches(masks, cameras, targets):
+    """Fine-resolution hull around each target, beside the global grid.
+
+    For every target (a MultiTargetTracker.state_list() entry) a cube of
+    settings.TARGET_PATCH_EXTENT metres, with settings.TARGET_PATCH_VOXEL_SIZE
+    voxels, is centred on its filtered position and carved coarse-to-fine
+    like the hierarchical engine, with projections computed on the fly for
+    that patch only. Cost grows with the number of targets, not the grid.
+
+    Returns {target id: {"volume": occupied m^3, "extent": [dx, dy, dz] m of
+    the occupied voxels' bounding box}}.
+    """
+    size = float(settings.TARGET_PATCH_VOXEL_SIZE)
+    count = max(int(round(float(settings.TARGET_PATCH_EXTENT) / size)), 1)
+    offsets = (np.arange(count) - (count - 1) / 2.0) * size
+    edge = min(_coarse_cell_edge(size), 2 ** int(np.log2(count)))
+    cells = _top_cells((count,) * 3, edge)
+    shapes = _image_shapes(masks)
+    pyramids = {port: _mask_pyramid(mask) for port, mask in masks.items()}
+    patches = {}
+    for target in targets:
+        axes = tuple(float(c) + offsets for c in target["position"])
+        footprints = _cell_footprints(cells, edge, axes, shapes, cameras)
+        voxels = _carve_hierarchy(masks, cameras, axes, edge, cells, footprints, pyramids)
+        extent = [0.0, 0.0, 0.0]
+        if len(voxels):
+            extent = [round(float(np.ptp(voxels[:, d]) + 1) * size, 2) for d in range(3)]
+        patches[target["id"]] = {"volume": round(len(voxels) * size ** 3, 4),
+                                 "extent": extent}
+    return patches
+
+_CARVE_ENGINES = {
+    "dense": _carve_dense,
+    "hierarchical": _carve_hierarchical,
+    "inverted": _carve_inverted,
+    "bricks": _carve_bricks,
+    "footprint": _carve_footprint,
+}
 
-def pixel_to_voxel(masks, cameras):
+# What each engine precomputes, given the image shapes and calibration
+_CARVE_PREPARATION = {
+    "dense": _carve_tables,
+    "hierarchical": _hierarchy_top,
+    "inverted": _inverted_tables,
+    "bricks": _brick_tables,
+    "footprint": _footprint_tables,
+}
+
+_GRID_TYPES = ("box", "frustum")
+
+def check_carve_settings(engine=None):
+    """Raise ValueError unless ``engine`` (default settings.CARVE_ENGINE) is
+    known and can carve settings.VOXEL_GRID_TYPE."""
+    if engine is None:
+        engine = settings.CARVE_ENGINE
+    if engine not in _CARVE_ENGINES:
+        raise ValueError(f"Unknown carving engine '{engine}'; "
+                         f"expected one of {sorted(_CARVE_ENGINES)}")
+    if settings.VOXEL_GRID_TYPE not in _GRID_TYPES:
+        raise ValueError(f"Unknown VOXEL_GRID_TYPE '{settings.VOXEL_GRID_TYPE}'; "
+                         f"expected one of {_GRID_TYPES}")
+    if engine == "hierarchical" and settings.VOXEL_GRID_TYPE != "box":
+        raise ValueError("The hierarchical engine carves axis-aligned cells; "
+                         "it needs VOXEL_GRID_TYPE = \"box\"")
+
+def prepare_carving(shapes, cameras, engine=None):
+    """Build (or load) everything ``engine`` needs before the first carve, so
+    it can run off the pipeline thread. ``shapes`` is {port: (H, W)} of the
+    masks that will be carved."""
+    if engine is None:
+        engine = settings.CARVE_ENGINE
+    _CARVE_PREPARATION[engine]({port: tuple(shape[:2]) for port, shape in shapes.items()},
+                               cameras)
+
+def carve_indices(masks, cameras, engine=None):
     """Carve the voxel grid against every camera's motion mask (visual hull
     with partial coverage — see docs/adr/0003).
 
@@ -95,22 +954,390 @@ def pixel_to_voxel(masks, cameras):
     **at least two** cameras can see it (one bearing cannot fix depth). A
     camera that sees the voxel as background carves it — which also erases
     two-camera ghost intersections wherever a third camera has coverage.
-    Masks come from undistorted frames, so the ideal pinhole model applies.
+    Masks come from the raw, distorted frames: voxels are projected through
+    each camera's lens model (cv.projectPoints with its ``dist_coeffs``), so
+    no frame is ever undistorted.
 
     masks   -- {port: binary (H, W) mask} for EVERY camera in ``cameras``
-    cameras -- {port: {"camera_matrix": 3x3 K, "extrinsic": 4x4 world->camera}}
-    Returns the (M, 3) world coordinates of the occupied voxel centres.
+    cameras -- {port: {"camera_matrix": 3x3 K, "extrinsic": 4x4 world->camera,
+               optionally "dist_coeffs": OpenCV distortion coefficients}};
+               without them (or all zero) the camera is an ideal pinhole
+    engine  -- carving engine, default settings.CARVE_ENGINE: "dense" tests
+               every voxel through cached tables, "hierarchical" carves
+               coarse-to-fine, "inverted" starts from the set mask pixels,
+               "bricks" only carves bricks near mask blobs; all give the
+               same occupied set. "footprint" instead counts support
+               anywhere in a voxel's projected footprint (a superset)
+    Returns the sorted flat indices of the occupied voxels (see
+    voxel_centers() for their coordinates).
     """
-    centers = voxel_grid_centers()
-    tables = _carve_tables(masks, cameras)
-    support = np.zeros(len(centers), dtype=np.int32)
-    for port, mask in masks.items():
-        indices, u, v = tables["per_camera"][port]
-        hit = mask[v, u] > 0
-        support[indices[hit]] += 1
-    visible = tables["visible_count"]
-    occupied = (visible >= 2) & (support == visible)
-    return centers[occupied]
+    if engine is None:
+        engine = settings.CARVE_ENGINE
+    check_carve_settings(engine)
+    return _CARVE_ENGINES[engine](masks, cameras)
+
+def _pack_frames(block):
+    """Up to 64 binary (H, W) masks as one little-endian 64-bit word per
+    pixel, bit f set where frame f's mask is."""
+    block = np.asarray(block).reshape(len(block), -1)
+    if block.dtype != np.uint8:
+        block = (block != 0).view(np.uint8)
+    planes = np.zeros((8, block.shape[1]), dtype=np.uint8)
+    bit = np.empty(block.shape[1], dtype=np.uint8)
+    for frame, mask in enumerate(block):
+        plane = planes[frame // 8]
+        cv.threshold(mask, 0, 1 << (frame % 8), cv.THRESH_BINARY, dst=bit)
+        cv.bitwise_or(plane, bit, dst=plane)
+    return np.ascontiguousarray(planes.T).view("<u8").ravel()
+
+def carve_indices_batch(mask_stacks, cameras):
+    """Carve a recorded sequence: carve_indices() for every frame at once.
+
+    mask_stacks -- {port: (T, H, W) binary masks} for EVERY camera, the same
+                   T frames each (arrays or memory-maps of a recording)
+    cameras     -- as for carve_indices()
+    Returns a list of T sorted flat-index arrays, identical to carving each
+    frame with the "dense", "hierarchical", "inverted" or "bricks" engine
+    (not "footprint", which accepts support anywhere in a voxel's footprint).
+
+    Frames are processed 64 at a time: each camera's masks are bit-packed
+    into one 64-bit word per pixel (bit f = frame f), gathered through the
+    carve table once and ANDed into one word per usable voxel, so a voxel's
+    bit survives exactly when every camera that sees it has mask support.
+    Memory stays at a few words per table entry whatever T is.
+    """
+    ports = sorted(mask_stacks)
+    frames = len(mask_stacks[ports[0]])
+    tables = _carve_tables({port: mask_stacks[port].shape[1:3] for port in ports}, cameras)
+    usable = np.flatnonzero(tables["visible_count"] >= 2)
+    # Table entries as positions among the usable voxels (tables are cropped
+    # to them, see carve_coverage())
+    compact = {port: np.searchsorted(usable, tables["per_camera"][port][0]) for port in ports}
+    results = []
+    for start in range(0, frames, 64):
+        count = min(64, frames - start)
+        support = np.full(len(usable), np.iinfo(np.uint64).max, dtype=np.uint64)
+        for port in ports:
+            words = _pack_frames(mask_stacks[port][start:start + count])
+            support[compact[port]] &= words[tables["per_camera"][port][1]]
+        occupied = np.flatnonzero(support)
+        bits = np.unpackbits(support[occupied].astype("<u8").view(np.uint8).reshape(-1, 8),
+                             axis=1, bitorder="little")
+        results.extend(usable[occupied[bits[:, frame] > 0]] for frame in range(count))
+    return results
+
+# Half of a voxel's 26-neighbourhood (the offsets after (0, 0, 0) in
+# lexicographic order), so each neighbouring pair is visited once
+_FORWARD_NEIGHBOURS = np.array([(i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1)
+                                for k in (-1, 0, 1) if (i, j, k) > (0, 0, 0)])
+
+def label_voxel_clusters(indices):
+    """26-connected component labels of sorted flat voxel ``indices``.
+
+    Works on the occupied set itself: neighbours are found by binary search
+    among the indices and components merged by label propagation with
+    pointer jumping, so the cost follows the occupied count, not the grid.
+    Returns labels 0..K-1 aligned with ``indices``.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    count = len(indices)
+    if not count:
+        return np.empty(0, dtype=np.intp)
+    shape = np.array(voxel_grid_shape())
+    ijk = np.stack(np.unravel_index(indices, shape), axis=1)
+    first, second = [], []
+    for offset in _FORWARD_NEIGHBOURS:
+        other = ijk + offset
+        inside = np.flatnonzero(((other >= 0) & (other < shape)).all(axis=1))
+        flat = np.ravel_multi_index(other[inside].T, shape)
+        pos = np.minimum(np.searchsorted(indices, flat), count - 1)
+        found = indices[pos] == flat
+        first.append(inside[found])
+        second.append(pos[found])
+    first, second = np.concatenate(first), np.concatenate(second)
+
+    # Each label is a parent pointer; hook the larger root of every edge onto
+    # the smaller one, then jump pointers until every label is a root
+    labels = np.arange(count)
+    while True:
+        a, b = labels[first], labels[second]
+        split = a != b
+        if not split.any():
+            break
+        np.minimum.at(labels, np.maximum(a[split], b[split]), np.minimum(a[split], b[split]))
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    return np.unique(labels, return_inverse=True)[1].reshape(-1)
+
+def voxel_clusters(indices, targets=None):
+    """Per-object summaries of the carved hull: its 26-connected clusters.
+
+    indices -- sorted flat voxel indices, as from carve_indices()
+    targets -- optional MultiTargetTracker.state_list(); each cluster is then
+               associated with the target nearest its centroid, within
+               settings.CLUSTER_TARGET_GATE_M metres
+    Returns a list of {"count", "volume" (m^3), "centroid", "min", "max"
+    (bounds of the voxel centres), "target" (id or None)}, largest first.
+    """
+    labels = label_voxel_clusters(indices)
+    if not len(labels):
+        return []
+    centers = voxel_centers(indices)
+    groups = int(labels.max()) + 1
+    count = np.bincount(labels, minlength=groups)
+    volume = np.bincount(labels, _voxel_edges(indices) ** 3, minlength=groups)
+    centroid = np.stack([np.bincount(labels, centers[:, d], minlength=groups)
+                         for d in range(3)], axis=1) / count[:, None]
+    low = np.full((groups, 3), np.inf)
+    high = np.full((groups, 3), -np.inf)
+    np.minimum.at(low, labels, centers)
+    np.maximum.at(high, labels, centers)
+
+    nearest = [None] * groups
+    if targets:
+        positions = np.array([target["position"] for target in targets], dtype=np.float64)
+        distance = np.linalg.norm(centroid[:, None, :] - positions[None, :, :], axis=2)
+        best = distance.argmin(axis=1)
+        for group in range(groups):
+            if distance[group, best[group]] <= settings.CLUSTER_TARGET_GATE_M:
+                nearest[group] = targets[best[group]]["id"]
+
+    return [{"count": int(count[g]),
+             "volume": round(float(volume[g]), 3),
+             "centroid": [round(float(c), 2) for c in centroid[g]],
+             "min": [round(float(c), 2) for c in low[g]],
+             "max": [round(float(c), 2) for c in high[g]],
+             "target": nearest[g]}
+            for g in np.argsort(-count, kind="stable")]
+
+def pixel_to_voxel(masks, cameras, engine=None):
+    """World coordinates (M, 3) of the occupied voxel centres; carve_indices()
+    with the coordinates filled in."""
+    return voxel_centers(carve_indices(masks, cameras, engine))
+
+def detection_rois(points, camera, shape, pad=None):
+    """Regions of interest (x0, y0, x1, y1) around the projections of world
+    ``points`` (predicted target centres) in one camera: squares of
+    ``pad`` pixels (default settings.ROI_PAD_PX) each way, clipped to the
+    image, overlapping or touching ones merged so no pixel is searched twice
+    and no blob is split along a shared edge."""
+    if pad is None:
+        pad = int(settings.ROI_PAD_PX)
+    if not len(points):
+        return []
+    extrinsic = np.asarray(camera["extrinsic"], dtype=np.float64)
+    cam_points = np.asarray(points, dtype=np.float64) @ extrinsic[:3, :3].T + extrinsic[:3, 3]
+    pixels, valid = _camera_pixels(cam_points, camera)
+    height, width = shape[:2]
+    boxes = []
+    for u, v in pixels[valid]:
+        box = [max(int(u) - pad, 0), max(int(v) - pad, 0),
+               min(int(u) + pad + 1, width), min(int(v) + pad + 1, height)]
+        if box[0] < box[2] and box[1] < box[3]:
+            boxes.append(box)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]),
+                                max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(box) for box in boxes]
+
+def pyramid_level(port):
+    """Detection pyramid level of one camera, from
+    settings.DETECTION_PYRAMID_LEVEL (one level for all, or {port: level})."""
+    level = settings.DETECTION_PYRAMID_LEVEL
+    if isinstance(level, dict):
+        level = level.get(port, 0)
+    return int(level)
+
+def _coarse_blobs(small):
+    """Blobs of a coarse binary mask, largest first and at most
+    settings.MAX_DETECTIONS_PER_CAMERA: (labels, boxes) with blob i
+    (1-based) painted i in the int32 ``labels`` and its (x, y, w, h) bounding
+    box at boxes[i - 1]. Found with settings.BLOB_DETECTOR, like level 0."""
+    limit = settings.MAX_DETECTIONS_PER_CAMERA
+    if settings.BLOB_DETECTOR == "components":
+        _, labels, stats, _ = cv.connectedComponentsWithStats(small, connectivity=8,
+                                                              ltype=cv.CV_32S)
+        order = np.argsort(-stats[1:, cv.CC_STAT_AREA], kind="stable")[:limit] + 1
+        # Renumber the kept blobs 1..n and clear the rest
+        renumber = np.zeros(len(stats), dtype=np.int32)
+        renumber[order] = np.arange(1, len(order) + 1)
+        return renumber[labels], stats[order, :4]
+    if settings.BLOB_DETECTOR != "contours":
+        raise ValueError(f"Unknown blob detector {settings.BLOB_DETECTOR!r}; "
+                         "expected 'components' or 'contours'.")
+    contours, _ = cv.findContours(small, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+    # Outline area is 0 for a blob one cell thick: bounding-box area breaks ties
+    boxes = [cv.boundingRect(contour) for contour in contours]
+    keys = [(cv.contourArea(contour), w * h) for contour, (_, _, w, h) in zip(contours, boxes)]
+    order = sorted(range(len(contours)), key=keys.__getitem__, reverse=True)[:limit]
+    labels = np.zeros(small.shape, dtype=np.int32)
+    for label, index in enumerate(order, 1):
+        cv.drawContours(labels, contours, index, label, thickness=cv.FILLED)
+    return labels, [boxes[index] for index in order]
+
+def _pyramid_detect(gray, gray_old, level):
+    """Motion mask and blob centroids found on a frame difference ``2**level``
+    times smaller, each blob then re-thresholded and measured on its
+    full-resolution crop: sub-pixel centroids at a fraction of the full-frame
+    cost. The mask is set only within the refined crops.
+
+    Blobs are found on the coarse level with settings.BLOB_DETECTOR, each
+    widened by one cell all round to catch faint edge pixels that the
+    averaging pushed under the threshold. A cell bordering two blobs goes to
+    the larger one, so every full-resolution pixel counts toward at most one
+    blob.
+    Returns the mask and the blobs as (area, u, v), largest first.
+    """
+    scale = 1 << level
+    height, width = gray.shape[:2]
+    # One full-resolution difference, shrunk once and cropped by every blob:
+    # cheaper than shrinking both frames, and a cell's mean absolute
+    # difference never misses motion that averaging the frames would see
+    diff = cv.absdiff(gray, gray_old)
+    small = diff
+    for _ in range(level):
+        # Halving with INTER_AREA averages 2 x 2 cells on OpenCV's fast path
+        # (a single resize by 2**level is several times slower)
+        small = cv.resize(small, (small.shape[1] // 2, small.shape[0] // 2),
+                          interpolation=cv.INTER_AREA)
+    small_h, small_w = small.shape[:2]
+    cv.threshold(small, settings.PIXEL_NOISE_THRESHOLD, 255, cv.THRESH_BINARY, dst=small)
+    labels, boxes = _coarse_blobs(small)
+
+    mask = np.zeros((height, width), dtype=np.uint8)
+    ring = np.ones((3, 3), np.uint8)
+    blobs = []
+    for label, (x, y, w, h) in enumerate(boxes, 1):
+        # The blob's cells plus two all round: the one-cell ring it may own,
+        # and the neighbours that decide who owns each ring cell. At full
+        # resolution the last row / column of cells also takes the remainder
+        # of the frame.
+        cx0, cy0 = max(x - 2, 0), max(y - 2, 0)
+        cx1, cy1 = min(x + w + 2, small_w), min(y + h + 2, small_h)
+        window = labels[cy0:cy1, cx0:cx1]
+        # Labels follow blob size, so the smallest neighbouring label owns
+        nearest = cv.erode(np.where(window > 0, window, len(boxes) + 1).astype(np.float32),
+                           ring)
+        owned = (window == label) | ((window == 0) & (nearest == label))
+        x0, y0 = cx0 * scale, cy0 * scale
+        x1 = width if cx1 == small_w else cx1 * scale
+        y1 = height if cy1 == small_h else cy1 * scale
+        footprint = cv.resize(owned.view(np.uint8), ((cx1 - cx0) * scale, (cy1 - cy0) * scale),
+                              interpolation=cv.INTER_NEAREST)
+        footprint = cv.copyMakeBorder(footprint, 0, y1 - y0 - footprint.shape[0],
+                                      0, x1 - x0 - footprint.shape[1], cv.BORDER_REPLICATE)
+        roi = mask[y0:y1, x0:x1]
+        _, blob = cv.threshold(diff[y0:y1, x0:x1], settings.PIXEL_NOISE_THRESHOLD, 255,
+                               cv.THRESH_BINARY)
+        blob = cv.bitwise_and(blob, blob, mask=footprint)
+        cv.bitwise_or(roi, blob, dst=roi)
+        moments = cv.moments(blob, binaryImage=True)
+        if moments["m00"] >= settings.EXTRINSICS_MIN_CONTOUR_AREA:
+            blobs.append((moments["m00"], x0 + moments["m10"] / moments["m00"],
+                          y0 + moments["m01"] / moments["m00"]))
+    blobs.sort(key=lambda blob: -blob[0])
+    return mask, blobs
+
+
+def detect_motion(gray, gray_old, camera, rois=None, level=0):
+    """Motion mask of two consecutive raw grayscale frames and its blob
+    centroids, undistorted into ideal pinhole pixels for the tracker.
+
+    With ``rois`` (from detection_rois()) only those regions are differenced
+    and searched; the rest of the mask stays empty. Otherwise ``level`` > 0
+    searches a pyramid level ``2**level`` times smaller and refines each
+    blob at full resolution (see _pyramid_detect()). Blobs are found with
+    settings.BLOB_DETECTOR at every level.
+    """
+    if rois is None and level > 0:
+        mask, blobs = _pyramid_detect(gray, gray_old, level)
+        centroids = [(u, v) for _, u, v in blobs]
+    elif rois is None:
+        diff = cv.absdiff(gray, gray_old)
+        _, mask = cv.threshold(diff, settings.PIXEL_NOISE_THRESHOLD, 255, cv.THRESH_BINARY)
+        centroids = camera_extrinsics.mask_centroids(mask)
+    else:
+        mask = np.zeros(gray.shape[:2], dtype=np.uint8)
+        blobs = []
+        for x0, y0, x1, y1 in rois:
+            roi = mask[y0:y1, x0:x1]
+            cv.absdiff(gray[y0:y1, x0:x1], gray_old[y0:y1, x0:x1], dst=roi)
+            cv.threshold(roi, settings.PIXEL_NOISE_THRESHOLD, 255, cv.THRESH_BINARY, dst=roi)
+            blobs += [(area, u + x0, v + y0) for area, u, v in camera_extrinsics.mask_blobs(roi)]
+        # Largest first across all regions, as in a full-frame search, so the
+        # cap drops the smallest blobs rather than a later region's targets
+        blobs.sort(key=lambda blob: -blob[0])
+        centroids = [(u, v) for _, u, v in blobs[:settings.MAX_DETECTIONS_PER_CAMERA]]
+    detections = camera_extrinsics.undistort_centroids(
+        centroids, camera["camera_matrix"], camera["dist_coeffs"])
+    return mask, detections
+
+def detection_level_timings(gray, gray_old, camera, levels=(0, 1, 2, 3), repeats=5):
+    """{level: (milliseconds per detect_motion() call, detections)} for one
+    camera's frame pair at each pyramid level, to pick its level. The time
+    is the best of ``repeats`` calls, which other load on the machine can
+    only make slower."""
+    timings = {}
+    for level in levels:
+        detect_motion(gray, gray_old, camera, level=level)      # warm-up
+        best = np.inf
+        for _ in range(repeats):
+            began = time.perf_counter()
+            _, detections = detect_motion(gray, gray_old, camera, level=level)
+            best = min(best, time.perf_counter() - began)
+        timings[level] = (best * 1e3, detections)
+    return timings
+
+def process_camera_frame(raw, gray_old, camera, rois=None, level=0):
+    """One camera's per-frame work: difference the raw frame against the
+    previous grayscale one into a motion mask and detect blob centroids
+    (undistorted for the tracker). Only GIL-releasing OpenCV calls, so
+    cameras run in parallel threads.
+
+    ``rois`` restricts differencing and detection to those regions, and
+    ``level`` detects on a pyramid level (see detect_motion()).
+
+    Returns (gray, mask, detections); mask and detections are None on a
+    camera's first frame, with nothing to difference against.
+    """
+    # Differencing and carving work on the raw frame: the carve tables
+    # project through the lens distortion, and only the detected centroids
+    # are undistorted for the tracker. The dashboard pane is rendered later
+    # (camera_pane()), for the frames that are actually displayed.
+    gray = cv.cvtColor(raw, cv.COLOR_BGR2GRAY)
+    mask = detections = None
+    if gray_old is not None:
+        mask, detections = detect_motion(gray, gray_old, camera, rois, level)
+    return gray, mask, detections
+
+def camera_pane(raw, mask, detections, maps):
+    """Dashboard pane of one camera: the undistorted frame, with the
+    detected centroids marked, beside its undistorted motion mask (blank
+    without one). Remapped through ``maps`` cached per camera (no-op without
+    distortion)."""
+    frame = camera_calibration.undistort_frame(raw, maps)
+    if frame is raw:
+        frame = raw.copy()
+    for u, v in detections or ():
+        cv.drawMarker(frame, (int(round(u)), int(round(v))),
+                      (0, 255, 255), cv.MARKER_CROSS, 20, 2)
+    mask_pane = mask if mask is not None else np.zeros(raw.shape[:2], dtype=np.uint8)
+    mask_pane = camera_calibration.undistort_frame(mask_pane, maps)
+    return np.hstack([frame, cv.cvtColor(mask_pane, cv.COLOR_GRAY2BGR)])
 
 def load_simulation(directory=None):
     """Ports, calibration (with ground-truth extrinsics), and looping frame
@@ -166,16 +1393,60 @@ def setup_cameras():
         for port in ports:
             calibration_data[port]["extrinsic"] = extrinsics[port]
 
-    streams = {port: CameraStream(port) for port in ports}
+    # Optionally one capture process per camera, frames shared zero-copy
+    stream_class = SharedMemoryStream if settings.CAPTURE_PROCESSES else CameraStream
+    streams = {port: stream_class(port) for port in ports}
     return ports, calibration_data, streams
 
-def main(sim=False, browser=True):
+def setup_nodes(ports, listen=None):
+    """Ports, calibration (plus extrinsics when available), and a listening
+    NodeServer for a rig of remote camera nodes (camera_node.py)."""
+    if len(ports) < 2:
+        sys.exit(f"{len(ports)} camera nodes given, need at least 2.")
+    calibration_data = camera_calibration.load_calibration_data(ports)
+    if calibration_data is None:
+        sys.exit("Calibration data not found for the camera nodes' ports.")
+    extrinsics = camera_extrinsics.load_extrinsics(ports)
+    if extrinsics is None:
+        print("Extrinsics not found, voxel projection disabled. "
+              "Run python -m pixel_to_voxel.camera_extrinsics to calibrate.")
+    else:
+        for port in ports:
+            calibration_data[port]["extrinsic"] = extrinsics[port]
+    host, port = listen or (settings.NODE_LISTEN_HOST, settings.NODE_LISTEN_PORT)
+    server = NodeServer(ports)
+    bound = server.start(host, port)
+    print(f"Waiting for camera nodes {ports} on {host}:{bound}")
+    return ports, calibration_data, server
+
+def node_pane(mask, detections, shape, maps):
+    """Dashboard pane of a remote camera: its motion mask (blank when the
+    node sends detections only) with the detections marked. The node's mask
+    is raw and its detections undistorted, so the mask is remapped through
+    ``maps`` first, as camera_pane() does."""
+    gray = mask if mask is not None else np.zeros(shape, dtype=np.uint8)
+    gray = camera_calibration.undistort_frame(gray, maps)
+    pane = cv.cvtColor(gray, cv.COLOR_GRAY2BGR)
+    for u, v in detections:
+        cv.drawMarker(pane, (int(round(u)), int(round(v))),
+                      (0, 255, 255), cv.MARKER_CROSS, 20, 2)
+    return pane
+
+def main(sim=False, browser=True, nodes=None, listen=None):
+    # Fail on a bad engine / grid pair now, not in the carving warm-up
+    check_carve_settings()
+    server = None
     if sim:
         ports, calibration_data, streams = load_simulation()
         frame_period = 1.0 / 30.0    # pace the recorded sequence at ~30 fps
+    elif nodes:
+        # Remote cameras detect for themselves; only their results arrive
+        ports, calibration_data, server = setup_nodes(nodes, listen)
+        streams = {}
+        frame_period = 1.0 / settings.CAMERA_FPS
     else:
         ports, calibration_data, streams = setup_cameras()
-        frame_period = 0.005         # cameras own the rate; just avoid spinning
+        frame_period = 1.0 / settings.CAMERA_FPS   # the cameras' own rate
     for stream in streams.values():
         stream.start()
 
@@ -190,122 +1461,393 @@ def main(sim=False, browser=True):
     if not have_extrinsics:
         dashboard.add_event("extrinsics missing - voxel projection disabled")
 
-    grid_info = {"min": list(settings.VOXEL_GRID_MIN),
-                 "max": list(settings.VOXEL_GRID_MAX),
-                 "size": settings.VOXEL_SIZE}
+    # The frustum grid's layout only exists once carving has seen a frame:
+    # publish() fills it in then
+    grid_info = {"grid": voxel_grid_info()}
     total_frames = None
     sim_dt = None
     if sim:
         total_frames = max(len(stream.frame_paths) for stream in streams.values())
         # Sim measurements use the dataset's own timebase, not wall clock
         sim_dt = settings.SIM_TRAJECTORY_DURATION / max(total_frames - 1, 1)
-    frames_played = 0
-    run_id = 0
-    tracker = MultiTargetTracker(calibration_data) if have_extrinsics else None
-    ended_announced = False
-    fps = None
+    queues = settings.PIPELINE_QUEUES
+    for stage in ("detect", "track"):
+        if queues[stage][1] != "block":
+            raise ValueError(f"PIPELINE_QUEUES[{stage!r}] must use the 'block' policy: "
+                             "the tracker has to see every frame, in order.")
 
-    # Previous grayscale frame per port, for frame differencing
-    gray_old = {port: None for port in ports}
+    # Carving tables are built off the pipeline thread as soon as the first
+    # frames reveal the image sizes; until then frames are detected and
+    # tracked but not carved, so table construction never stalls the tracker
+    image_shapes = {}
+    carving_ready = threading.Event()
+    warm_up = None
+    warm_up_failure = []
 
-    try:
-        while True:
-            loop_start = time.perf_counter()
-            masks = {}
-            detections = {}
-            display_frames = {}
-            got_frame = False
+    def warm_up_carving(shapes):
+        try:
+            prepare_carving(shapes, calibration_data)
+        except Exception as exc:
+            # capture() re-raises it, which stops the pipeline
+            warm_up_failure.append(exc)
+            dashboard.add_event(f"carving failed: {exc}")
+            return
+        carving_ready.set()
+        nbytes = carve_table_nbytes()
+        coverage = carve_coverage()
+        details = []
+        if nbytes:
+            details.append(f"{nbytes / 1e6:.1f} MB of carve tables")
+        if coverage is not None:
+            details.append(f"{coverage['fraction']:.0%} of the grid seen by 2+ cameras")
+        dashboard.add_event("carving ready" + (f" ({', '.join(details)})" if details else ""))
+
+    # One persistent worker per camera; OpenCV's own thread pool is narrowed
+    # so the two do not oversubscribe the cores
+    pool = None
+    if settings.PARALLEL_CAMERAS and len(ports) > 1:
+        pool = ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix="camera")
+    opencv_threads = settings.OPENCV_THREADS
+    if opencv_threads is None and pool is not None:
+        opencv_threads = max(1, (os.cpu_count() or 1) // len(ports))
+    if opencv_threads is not None:
+        cv.setNumThreads(int(opencv_threads))
+
+    # The per-frame work runs as concurrent stages joined by bounded queues
+    # (see pipeline.py). A packet dict carries one capture through them; its
+    # "run" id changes when a sim restart rewinds the sequence, and each stage
+    # resets its own state on the first packet of a new run.
+
+    # -- capture: read every camera, stamp the packet ---------------------
+    capture_state = {"run": 0, "frames_played": 0, "ended_announced": False}
+
+    def capture():
+        if warm_up_failure:
+            raise warm_up_failure[0]
+        state = capture_state
+        if shedder is not None:
+            shedder.update(pipeline)
+        # A dashboard restart request rewinds the sim sequence
+        if sim and dashboard.pop_restart():
+            for stream in streams.values():
+                stream.reset()
+            state.update(run=state["run"] + 1, frames_played=0, ended_announced=False)
+            dashboard.add_event("sequence restarted")
+
+        frames = {}
+        if server is not None:
+            # Camera nodes send detections (and masks), paired by capture time
+            paired = server.next_set()
+            if paired is None:
+                return None
+            timestamp, detections, masks = paired
+            return {"run": state["run"], "timestamp": timestamp, "frames": {},
+                    "remote": (detections, masks), "sim": {"active": False}}
+        if sim:
             for port in ports:
                 raw = streams[port].read()
-                if raw is None:
-                    continue
-                got_frame = True
-
-                # Undistort the frame
-                frame = cv.undistort(raw, calibration_data[port]["camera_matrix"], calibration_data[port]["dist_coeffs"])
-
-                # Convert to grayscale
-                gray_new = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
-
-                # Create mask with the difference of the old and new frames
-                # (on the first frame there is no previous frame to diff against)
-                mask = None
-                if gray_old[port] is not None:
-                    diff = cv.absdiff(gray_new, gray_old[port])
-                    _, mask = cv.threshold(diff, settings.PIXEL_NOISE_THRESHOLD, 255, cv.THRESH_BINARY)
-                    masks[port] = mask
-                    # All detected centroids, marked in the camera pane
-                    detections[port] = camera_extrinsics.mask_centroids(mask)
-                    for u, v in detections[port]:
-                        cv.drawMarker(frame, (int(round(u)), int(round(v))),
-                                      (0, 255, 255), cv.MARKER_CROSS, 20, 2)
-
-                # Update the old frame
-                gray_old[port] = gray_new
-
-                # Camera pane for the dashboard: clean frame | motion mask
-                mask_pane = mask if mask is not None else np.zeros_like(gray_new)
-                display_frames[port] = np.hstack(
-                    [frame, cv.cvtColor(mask_pane, cv.COLOR_GRAY2BGR)])
-
-            # Carve this frame's motion masks into the shared voxel grid
-            voxels = np.empty((0, 3))
-            if have_extrinsics and len(masks) == len(ports):
-                voxels = pixel_to_voxel(masks, calibration_data)
-
-            if sim and got_frame:
-                frames_played = min(frames_played + 1, total_frames)
-
-            # Associate detections to targets and update their filters
-            targets = []
-            if tracker is not None and got_frame:
-                now = (frames_played - 1) * sim_dt if sim else time.perf_counter()
-                lifecycle = tracker.step(detections, now)
-                for target_id in lifecycle["confirmed"]:
-                    dashboard.add_event(f"target {target_id} confirmed")
-                for target_id in lifecycle["deleted"]:
-                    dashboard.add_event(f"target {target_id} lost")
-                targets = tracker.state_list()
-            elif tracker is not None:
-                targets = tracker.state_list()
-
-            if sim and not got_frame and frames_played and not ended_announced:
+                if raw is not None:
+                    frames[port] = raw
+            if frames:
+                state["frames_played"] = min(state["frames_played"] + 1, total_frames)
+            # Sim measurements use the dataset's own timebase, not wall clock
+            timestamp = (state["frames_played"] - 1) * sim_dt
+        else:
+            # The reference camera's newest new frame sets the measurement
+            # time; every other camera contributes its new frame captured
+            # closest to it. Nothing new: nothing to process. The ring hands
+            # out views its reader laps after CAMERA_BUFFER_FRAMES - 1 frames,
+            # sooner than a packet can leave the pipeline, so copy them out.
+            newest = streams[ports[0]].read_newest()
+            if newest is None:
+                return None
+            _, timestamp, frame = newest
+            frames[ports[0]] = frame.copy()
+            for port in ports[1:]:
+                closest = streams[port].read_closest(timestamp)
+                if closest is not None:
+                    frames[port] = closest[2].copy()
+
+        sim_info = {"active": False}
+        if sim:
+            ended = bool(state["frames_played"] and not frames)
+            sim_info = {"active": True, "frame": state["frames_played"],
+                        "total": total_frames, "ended": ended}
+            if ended and not state["ended_announced"]:
                 dashboard.add_event("sequence ended")
-                ended_announced = True
-
-            sim_info = {"active": False}
-            if sim:
-                sim_info = {"active": True, "frame": frames_played,
-                            "total": total_frames,
-                            "ended": bool(frames_played and not got_frame)}
-            dashboard.publish(display_frames,
-                              serializable_state(sim_info, have_extrinsics, fps,
-                                                 voxels, targets, grid_info, run_id))
-
-            # A dashboard restart request rewinds the sim sequence
-            if sim and dashboard.pop_restart():
-                for stream in streams.values():
-                    stream.reset()
-                gray_old = {port: None for port in ports}
-                if tracker is not None:
-                    tracker = MultiTargetTracker(calibration_data)
-                frames_played = 0
-                run_id += 1
-                ended_announced = False
-                dashboard.add_event("sequence restarted")
-
-            elapsed = time.perf_counter() - loop_start
-            time.sleep(max(0.0, frame_period - elapsed))
-            loop_time = time.perf_counter() - loop_start
-            instant_fps = 1.0 / max(loop_time, 1e-6)
-            fps = instant_fps if fps is None else 0.9 * fps + 0.1 * instant_fps
+                state["ended_announced"] = True
+        return {"run": state["run"], "timestamp": timestamp, "frames": frames,
+                "sim": sim_info}
+
+    # -- detect: per-camera differencing and detection --------------------
+    # Previous grayscale frame per port, for frame differencing
+    gray_old = {port: None for port in ports}
+    undistort_maps = {}
+    detect_run = [0]
+    detect_frames = [0]
+
+    def roi_plan(packet, shapes):
+        """{port: ROIs} around the tracker's predicted targets for this
+        packet, or None for a full-frame search: with nothing tracked yet,
+        and every settings.ROI_FULL_FRAME_EVERY frames to spawn new targets."""
+        detect_frames[0] += 1
+        if (not settings.DETECTION_ROI or tracking["tracker"] is None
+                or tracking["run"] != packet["run"]
+                or detect_frames[0] % int(settings.ROI_FULL_FRAME_EVERY) == 0):
+            return None
+        with tracking_lock:
+            points = tracking["tracker"].predicted_positions(packet["timestamp"])
+        if not len(points):
+            return None
+        return {port: detection_rois(points, calibration_data[port], shape)
+                for port, shape in shapes.items()}
+
+    def detect(packet):
+        if "remote" in packet:
+            return detect_remote(packet)
+        if packet["run"] != detect_run[0]:
+            detect_run[0] = packet["run"]
+            gray_old.update((port, None) for port in ports)
+        for port, raw in packet["frames"].items():
+            if port not in undistort_maps:
+                undistort_maps[port] = camera_calibration.load_undistort_maps(
+                    port, calibration_data[port]["camera_matrix"],
+                    calibration_data[port]["dist_coeffs"], raw.shape)
+
+        # Between full-frame searches only the regions around the predicted
+        # targets are differenced and searched
+        rois = roi_plan(packet, {port: raw.shape for port, raw in packet["frames"].items()})
+
+        # One pool worker per camera; everything is gathered before carving
+        # and tracking
+        frames = packet.pop("frames")
+        jobs = {port: (raw, gray_old[port], calibration_data[port],
+                       None if rois is None else rois[port], pyramid_level(port))
+                for port, raw in frames.items()}
+        if pool is not None:
+            futures = {port: pool.submit(process_camera_frame, *job)
+                       for port, job in jobs.items()}
+            results = {port: future.result() for port, future in futures.items()}
+        else:
+            results = {port: process_camera_frame(*job) for port, job in jobs.items()}
+        masks, detections, views = {}, {}, {}
+        for port, (gray_new, mask, found) in results.items():
+            if mask is not None:
+                masks[port] = mask
+                detections[port] = found
+            gray_old[port] = gray_new
+            image_shapes[port] = gray_new.shape
+            views[port] = (frames[port], mask, found)
+
+        start_warm_up()
+        # Panes are rendered by publish(), only for the frames it displays
+        packet.update(got_frame=bool(results), masks=masks, detections=detections,
+                      views=views)
+        return packet
+
+    def detect_remote(packet):
+        """Camera nodes already detected: pass their results on and draw
+        the panes. Carving needs every node to send masks."""
+        detections, masks = packet.pop("remote")
+        image_shapes.update((port, shape) for port, shape in server.shapes.items()
+                            if port in masks)
+        node_views = {}
+        for port, found in detections.items():
+            if port not in server.shapes:
+                continue
+            shape = server.shapes[port]
+            if port not in undistort_maps:
+                undistort_maps[port] = camera_calibration.load_undistort_maps(
+                    port, calibration_data[port]["camera_matrix"],
+                    calibration_data[port]["dist_coeffs"], shape)
+            node_views[port] = (masks.get(port), found, shape)
+        start_warm_up()
+        # Panes are rendered by publish(), like those of local cameras
+        packet.update(got_frame=True, masks=masks, detections=detections,
+                      node_views=node_views)
+        return packet
+
+    def start_warm_up():
+        nonlocal warm_up
+        if have_extrinsics and warm_up is None and len(image_shapes) == len(ports):
+            warm_up = threading.Thread(target=warm_up_carving,
+                                       args=(dict(image_shapes),), daemon=True)
+            warm_up.start()
+            dashboard.add_event("carving warming up")
+
+    # -- track: every frame, in capture order -----------------------------
+    tracking = {"run": 0,
+                "tracker": MultiTargetTracker(calibration_data) if have_extrinsics else None}
+    # Held while the tracker steps, so detection can read its predictions
+    tracking_lock = threading.Lock()
+
+    def track(packet):
+        if packet["run"] != tracking["run"] and tracking["tracker"] is not None:
+            tracking["tracker"] = MultiTargetTracker(calibration_data)
+        tracking["run"] = packet["run"]
+        tracker = tracking["tracker"]
+
+        # Associate detections to targets and update their filters
+        targets = []
+        if tracker is not None and packet["got_frame"]:
+            with tracking_lock:
+                lifecycle = tracker.step(packet["detections"], packet["timestamp"])
+            for target_id in lifecycle["confirmed"]:
+                dashboard.add_event(f"target {target_id} confirmed")
+            for target_id in lifecycle["deleted"]:
+                dashboard.add_event(f"target {target_id} lost")
+            targets = tracker.state_list()
+        elif tracker is not None:
+            targets = tracker.state_list()
+        packet["targets"] = targets
+        return packet
+
+    # -- carve: hull, target patches and clusters of the latest frame -----
+    carving = {"run": 0, "occupancy": None, "last": None}
+
+    def carve(packet):
+        if packet["run"] != carving["run"] and carving["occupancy"] is not None:
+            carving["occupancy"].reset()
+        carving["run"] = packet["run"]
+        masks, targets = packet["masks"], packet["targets"]
+
+        # Carve this frame's motion masks into the shared voxel grid,
+        # optionally through the temporal occupancy layer
+        voxels = np.empty((0, 3))
+        indices = None
+        if have_extrinsics and carving_ready.is_set() and len(masks) == len(ports):
+            indices = carve_indices(masks, calibration_data)
+            if settings.OCCUPANCY_LOG_ODDS:
+                # Sized on first use: a frustum grid exists only once carved
+                if carving["occupancy"] is None:
+                    carving["occupancy"] = OccupancyGrid(int(np.prod(voxel_grid_shape())))
+                indices = carving["occupancy"].update(indices, packet["timestamp"])
+            voxels = voxel_centers(indices)
+
+        # Fine hull patches around the targets: per-target volume and extent
+        if (settings.TARGET_PATCHES and targets and have_extrinsics
+                and len(masks) == len(ports)):
+            patches = carve_target_patches(masks, calibration_data, targets)
+            for target in targets:
+                target.update(patches[target["id"]])
+
+        # Per-object clusters of the hull, attributed to targets
+        clusters = voxel_clusters(indices, targets) if indices is not None else []
+        packet.update(voxels=voxels, clusters=clusters)
+        carving["last"] = (packet["run"], voxels, clusters,
+                           {target["id"]: {key: target.get(key) for key in ("volume", "extent")}
+                            for target in targets})
+        return packet
+
+    def carve_skipped(packet):
+        """A frame the load shedder keeps from carving: reuse the last hull."""
+        last = carving["last"]
+        if last is None or last[0] != packet["run"]:
+            packet.update(voxels=np.empty((0, 3)), clusters=[])
+            return packet
+        _, voxels, clusters, patches = last
+        for target in packet["targets"]:
+            target.update(patches.get(target["id"], {}))
+        packet.update(voxels=voxels, clusters=clusters)
+        return packet
+
+    # -- publish: JPEG-encode and hand the state to the dashboard ---------
+    def publish(packet):
+        if grid_info["grid"] is None:
+            grid_info["grid"] = voxel_grid_info()
+        # Undistorting whole frames costs two remaps per camera: done here,
+        # after the load shedder's publish stride
+        if "node_views" in packet:
+            display_frames = {port: node_pane(*view, undistort_maps[port])
+                              for port, view in packet["node_views"].items()}
+        else:
+            display_frames = {port: camera_pane(*view, undistort_maps[port])
+                              for port, view in packet["views"].items()}
+        stats = pipeline.stats()
+        fps = stats["track"]["rate"]
+        quality = shedder.jpeg_quality if shedder is not None else 80
+        dashboard.publish(display_frames,
+                          serializable_state(packet["sim"], have_extrinsics, fps,
+                                             packet["voxels"], packet["targets"],
+                                             grid_info["grid"],
+                                             packet["run"],
+                                             carving="ready" if carving_ready.is_set()
+                                             else "failed" if warm_up_failure
+                                             else "warming up",
+                                             clusters=packet["clusters"], stages=stats,
+                                             shedding=shedder.state() if shedder else None),
+                          quality=quality)
+
+    pipeline = Pipeline()
+    # Live cameras are polled at twice their rate, so a new frame waits at
+    # most half a frame period in the ring buffer
+    pipeline.add("capture", capture, period=frame_period if sim else frame_period / 2.0)
+    pipeline.add("detect", detect, *queues["detect"])
+    pipeline.add("track", track, *queues["track"])
+    pipeline.add("carve", carve, *queues["carve"], skip=carve_skipped)
+    pipeline.add("publish", publish, *queues["publish"])
+
+    # Under load, carving and display shed frames so tracking keeps the
+    # camera rate (re-evaluated on every capture)
+    shedder = None
+    if settings.LOAD_SHEDDING:
+        shedder = LoadShedder(frame_period, settings.SHED_LEVELS,
+                              budget=settings.SHED_BUDGET)
+
+    try:
+        pipeline.start()
+        pipeline.wait()
     except KeyboardInterrupt:
         print("\nShutting down.")
     finally:
+        pipeline.stop()
         for stream in streams.values():
             stream.stop()
+        if server is not None:
+            server.stop()
+        if pool is not None:
+            pool.shutdown(wait=False)
         dashboard.stop()
 
+def report_detection_levels(sim=False, levels=(0, 1, 2, 3), sim_frame=60):
+    """Time full-frame detection at each pyramid level on a real frame pair
+    per camera and print the table (settings.DETECTION_PYRAMID_LEVEL picks
+    the level; a level that loses detections is too coarse)."""
+    if sim:
+        ports, calibration_data, streams = load_simulation()
+    else:
+        ports, calibration_data, streams = setup_cameras()
+    for stream in streams.values():
+        stream.start()
+    pairs = {}
+    for port, stream in streams.items():
+        # Live cameras: two consecutive frames; the sim: a pair mid-flight
+        frames, read = [], 0
+        deadline = time.time() + 5.0
+        while read < (sim_frame if sim else 2) and time.time() < deadline:
+            frame = stream.read()
+            if frame is None:
+                if sim:
+                    break
+                time.sleep(0.005)
+                continue
+            frames, read = frames[-1:] + [cv.cvtColor(frame, cv.COLOR_BGR2GRAY)], read + 1
+        stream.stop()
+        if len(frames) == 2:
+            pairs[port] = frames
+    print(f"{'camera':>6} {'level':>5} {'scale':>6} {'ms':>8} {'detections':>10}")
+    for port in ports:
+        if port not in pairs:
+            print(f"{port:>6}  no frames")
+            continue
+        gray_old, gray = pairs[port]
+        height, width = gray.shape
+        timings = detection_level_timings(gray, gray_old, calibration_data[port], levels)
+        for level, (ms, detections) in timings.items():
+            scale = f"1/{1 << level}"
+            print(f"{port:>6} {level:>5} {scale:>6} {ms:>8.2f} {len(detections):>10}"
+                  + (f"   ({width}x{height})" if level == levels[0] else ""))
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Live pixel-to-voxel projection, served as a web dashboard.")
@@ -314,5 +1856,23 @@ if __name__ == "__main__":
                              "instead of physical cameras.")
     parser.add_argument("--no-browser", action="store_true",
                         help="Don't open the dashboard in a browser automatically.")
+    parser.add_argument("--nodes", metavar="PORTS",
+                        help="Comma-separated camera ports served by remote camera "
+                             "nodes (python -m pixel_to_voxel.camera_node) instead "
+                             "of local cameras, e.g. 0,1,2.")
+    parser.add_argument("--listen", metavar="HOST:PORT",
+                        help=f"Address to accept camera nodes on (default "
+                             f"{settings.NODE_LISTEN_HOST}:{settings.NODE_LISTEN_PORT}).")
+    parser.add_argument("--detection-timings", action="store_true",
+                        help="Time detection at each pyramid level on a frame pair "
+                             "per camera, print the table and exit.")
     args = parser.parse_args()
-    main(sim=args.sim, browser=not args.no_browser)
+    if args.detection_timings:
+        report_detection_levels(sim=args.sim)
+        sys.exit()
+    nodes = [int(port) for port in args.nodes.split(",")] if args.nodes else None
+    listen = None
+    if args.listen:
+        host, _, port = args.listen.rpartition(":")
+        listen = (host or settings.NODE_LISTEN_HOST, int(port))
+    main(sim=args.sim, browser=not args.no_browser, nodes=nodes, listen=listen)
@@ -0,0 +1,83 @@
+"""Temporal occupancy over the voxel grid (log-odds, sparse updates).
+
+carve_indices() gives an independent binary hull every frame: one missed blob
+in one camera erases the object for that frame, and a one-frame ghost appears
+in full. OccupancyGrid accumulates per-voxel log-odds across frames instead —
+a carved-occupied voxel gains OCCUPANCY_HIT, a previously believed voxel that
+this frame carves away gains OCCUPANCY_MISS — and reports the voxels whose
+belief reaches OCCUPANCY_THRESHOLD. With the defaults one hit shows a voxel,
+so an object moving a voxel per frame is never hidden, and it takes two
+misses to vanish, so a one-frame dropout is bridged by the previous hull.
+The price is that a one-frame ghost also lingers for a second frame.
+
+Only voxels in this frame's hull or already believed occupied are touched per
+update, so the cost follows the hull, not the grid. Belief also decays toward
+the prior with time constant OCCUPANCY_DECAY_S (so a stalled pipeline does not
+freeze stale voxels); the decay is applied lazily from a per-voxel timestamp
+when a voxel is next touched or queried, never as a whole-grid sweep.
+
+Voxels whose belief falls back to the prior (log-odds 0) are forgotten: the
+grid keeps no "known free" evidence, which carving re-derives every frame.
+"""
+
+import numpy as np
+
+from . import settings
+
+
+class OccupancyGrid:
+    """Per-voxel log-odds over flat voxel indices (see carve_indices()).
+
+    Feed ``update(indices, timestamp)`` with each carved frame's occupied flat
+    indices; ``occupied()`` returns the sorted flat indices currently believed
+    occupied.
+    """
+
+    def __init__(self, voxel_count, hit=None, miss=None, limit=None,
+                 threshold=None, decay_s=None):
+        self.hit = float(hit if hit is not None else settings.OCCUPANCY_HIT)
+        self.miss = float(miss if miss is not None else settings.OCCUPANCY_MISS)
+        self.limit = float(limit if limit is not None else settings.OCCUPANCY_LIMIT)
+        self.threshold = float(threshold if threshold is not None
+                               else settings.OCCUPANCY_THRESHOLD)
+        self.decay_s = float(decay_s if decay_s is not None else settings.OCCUPANCY_DECAY_S)
+        # Allocated once; only the active entries are ever read or written
+        self.log_odds = np.zeros(voxel_count, dtype=np.float32)
+        self.stamp = np.zeros(voxel_count, dtype=np.float64)
+        self.active = np.empty(0, dtype=np.int64)   # sorted, log-odds > 0
+
+    def reset(self):
+        self.log_odds[self.active] = 0.0
+        self.active = np.empty(0, dtype=np.int64)
+
+    def _decayed(self, indices, timestamp):
+        """Belief of ``indices`` at ``timestamp``, decayed since last touched."""
+        belief = self.log_odds[indices].astype(np.float64)
+        if self.decay_s > 0:
+            elapsed = np.maximum(timestamp - self.stamp[indices], 0.0)
+            belief *= np.exp(-elapsed / self.decay_s)
+        return belief
+
+    def update(self, indices, timestamp):
+        """Fold one frame's carved hull (flat voxel indices) in at ``timestamp``
+        (seconds) and return the voxels now believed occupied."""
+        indices = np.unique(np.asarray(indices, dtype=np.int64))
+        touched = np.union1d(self.active, indices)
+        hit = np.zeros(len(touched), dtype=bool)
+        hit[np.searchsorted(touched, indices)] = True
+        belief = self._decayed(touched, timestamp)
+        belief += np.where(hit, self.hit, self.miss)
+        np.clip(belief, 0.0, self.limit, out=belief)
+        self.log_odds[touched] = belief
+        self.stamp[touched] = timestamp
+        self.active = touched[belief > 0]
+        return self.active[belief[belief > 0] >= self.threshold]
+
+    def occupied(self, timestamp=None):
+        """Sorted flat indices believed occupied, as of the last update or —
+        with ``timestamp`` — decayed to that time."""
+        if timestamp is None:
+            belief = self.log_odds[self.active]
+        else:
+            belief = self._decayed(self.active, timestamp)
+        return self.active[belief >= self.threshold]
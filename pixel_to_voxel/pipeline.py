@@ -0,0 +1,313 @@
+"""Concurrent pipeline stages joined by bounded queues.
+
+main.main() runs the per-frame work as a chain of stages, each on its own
+thread:
+
+    capture -> detect -> track -> carve -> publish
+
+so a slow carve or JPEG encode no longer delays the next capture. A stage
+takes one item at a time from its inbox, passes it to its function, and puts
+the result (unless None) into the next stage's inbox. Every queue is bounded,
+with one of two drop policies:
+
+    "block"    never drops: a full queue makes the upstream stage wait. For
+               everything the tracker must see, in order.
+    "oldest"   a full queue discards its oldest item to make room. For
+               carving and display, where only the latest frame matters.
+
+Each stage measures its own throughput (items per second, exponentially
+smoothed) and the time its function takes per item; ``Pipeline.stats()``
+collects them for the dashboard.
+
+A stage can also be told to work on only every ``stride``-th item, handing
+the rest to a cheap ``skip`` function instead. LoadShedder sets those strides
+from the measured costs, so when the machine falls behind the expensive,
+non-critical stages (carving, display) shed frames first and detection and
+tracking keep the full camera rate.
+"""
+
+import collections
+import threading
+import time
+
+DROP_POLICIES = ("block", "oldest")
+
+
+class BoundedQueue:
+    """Thread-safe FIFO of at most ``maxsize`` items with a drop policy."""
+
+    def __init__(self, maxsize, drop="block"):
+        if drop not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy {drop!r}; expected one of {DROP_POLICIES}.")
+        self.maxsize = max(int(maxsize), 1)
+        self.drop = drop
+        self.dropped = 0
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    def put(self, item):
+        """Queue ``item`` (waiting for room under "block"); False once closed."""
+        with self._cond:
+            if self.drop == "block":
+                self._cond.wait_for(lambda: len(self._items) < self.maxsize or self._closed)
+            if self._closed:
+                return False
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Oldest queued item; None on timeout or once closed and drained."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._closed, timeout=timeout)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        """Wake every waiter; later puts are refused, gets drain what is left."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class Stage:
+    """One pipeline stage on its own thread.
+
+    ``func(item)`` turns an inbox item into an outbox item (None passes
+    nothing on). A source stage has no inbox and calls ``func()`` in a loop,
+    at most once per ``period`` seconds when given. With ``stride`` n > 1
+    only every n-th inbox item goes to ``func``; the others go to ``skip``
+    (None: dropped), untimed. An exception in ``func`` stops the stage and is
+    kept in ``error`` for Pipeline.wait() to re-raise.
+    """
+
+    def __init__(self, name, func, inbox=None, outbox=None, period=None, skip=None,
+                 smoothing=0.1):
+        self.name = name
+        self.func = func
+        self.period = period
+        self.skip = skip
+        self.stride = 1
+        self.inbox = inbox
+        self.outbox = outbox
+        self.smoothing = smoothing
+        self.rate = None           # items per second
+        self.busy_s = None         # seconds of func per item
+        self.processed = 0
+        self._seen = 0
+        self.error = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"stage-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _smooth(self, old, new):
+        return new if old is None else (1.0 - self.smoothing) * old + self.smoothing * new
+
+    def _run(self):
+        last_done = None
+        next_tick = time.perf_counter()
+        try:
+            while not self._stopped.is_set():
+                if self.inbox is None:
+                    if self.period:
+                        time.sleep(max(0.0, next_tick - time.perf_counter()))
+                        next_tick = max(next_tick + self.period, time.perf_counter())
+                    began = time.perf_counter()
+                    result = self.func()
+                else:
+                    item = self.inbox.get()
+                    if item is None:
+                        break
+                    self._seen += 1
+                    if self.stride > 1 and self._seen % self.stride:
+                        result = self.skip(item) if self.skip is not None else None
+                        if result is not None and self.outbox is not None:
+                            if not self.outbox.put(result):
+                                break
+                        continue
+                    began = time.perf_counter()
+                    result = self.func(item)
+                done = time.perf_counter()
+                self.busy_s = self._smooth(self.busy_s, done - began)
+                if last_done is not None:
+                    self.rate = self._smooth(self.rate, 1.0 / max(done - last_done, 1e-6))
+                last_done = done
+                self.processed += 1
+                if result is not None and self.outbox is not None:
+                    if not self.outbox.put(result):
+                        break
+        except Exception as exc:
+            self.error = exc
+
+    def stop(self):
+        self._stopped.set()
+
+    def alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "rate": None if self.rate is None else round(self.rate, 1),
+            "busy_ms": None if self.busy_s is None else round(self.busy_s * 1e3, 1),
+            "queued": 0 if self.inbox is None else len(self.inbox),
+            "dropped": 0 if self.inbox is None else self.inbox.dropped,
+            "stride": self.stride,
+        }
+
+
+class Pipeline:
+    """A chain of stages, each feeding the next through a bounded queue."""
+
+    def __init__(self):
+        self.stages = []
+
+    def add(self, name, func, queue_size=1, drop="block", period=None, skip=None):
+        """Append a stage. The first stage added is the source (no inbox,
+        paced by ``period``); later stages read from a new queue of
+        ``queue_size`` with ``drop`` policy, fed by the previous stage."""
+        inbox = None
+        if self.stages:
+            inbox = BoundedQueue(queue_size, drop)
+            self.stages[-1].outbox = inbox
+        stage = Stage(name, func, inbox=inbox, period=period, skip=skip)
+        self.stages.append(stage)
+        return stage
+
+    def stage(self, name):
+        return next(stage for stage in self.stages if stage.name == name)
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def wait(self, poll=0.2):
+        """Block while every stage runs; re-raise the first stage failure."""
+        while all(stage.alive() for stage in self.stages):
+            time.sleep(poll)
+        for stage in self.stages:
+            if stage.error is not None:
+                raise stage.error
+
+    def stop(self, timeout=2.0):
+        for stage in self.stages:
+            stage.stop()
+            if stage.inbox is not None:
+                stage.inbox.close()
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def stats(self):
+        """{stage name: {"rate", "busy_ms", "queued", "dropped", "stride"}}."""
+        return {stage.name: stage.stats() for stage in self.stages}
+
+
+class LoadShedder:
+    """Deadline-aware degradation of the non-critical stages.
+
+    ``levels`` is a list of (carve_every, publish_every, jpeg_quality), least
+    degraded first. Every frame must fit in ``period`` seconds; from the
+    measured per-item cost of each stage, the load of a level is
+
+        (capture + detect + track + carve / carve_every
+         + publish / publish_every) / period
+
+    and ``update()`` picks the least degraded level whose load fits
+    ``budget`` — stepping back down only once it fits ``hysteresis * budget``
+    — then applies its strides to the "carve" and "publish" stages. Costs
+    are wall-clock, so stages slowed by contention count as costlier. A
+    backlog in front of detection or tracking (a full queue) escalates one
+    level at once, before the smoothed costs catch up.
+    """
+
+    def __init__(self, period, levels, budget=1.0, hysteresis=0.8,
+                 critical=("capture", "detect", "track")):
+        if not levels:
+            raise ValueError("LoadShedder needs at least one level.")
+        self.period = float(period)
+        self.levels = [tuple(level) for level in levels]
+        self.budget = float(budget)
+        self.hysteresis = float(hysteresis)
+        self.critical = tuple(critical)
+        self.level = 0
+        self.load = None
+
+    @property
+    def carve_every(self):
+        return self.levels[self.level][0]
+
+    @property
+    def publish_every(self):
+        return self.levels[self.level][1]
+
+    @property
+    def jpeg_quality(self):
+        return self.levels[self.level][2]
+
+    def predicted_load(self, costs, level):
+        """Fraction of the frame period ``level`` would fill, from per-item
+        stage costs in seconds ({name: seconds})."""
+        carve_every, publish_every, _ = self.levels[level]
+        work = sum(costs.get(name, 0.0) for name in self.critical)
+        work += costs.get("carve", 0.0) / carve_every
+        work += costs.get("publish", 0.0) / publish_every
+        return work / self.period
+
+    def update(self, pipeline):
+        """Re-pick the level from the pipeline's current stage costs and
+        apply its strides; returns the level."""
+        stages = {stage.name: stage for stage in pipeline.stages}
+        costs = {name: stage.busy_s for name, stage in stages.items()
+                 if stage.busy_s is not None}
+        if not costs:
+            return self.level
+        loads = [self.predicted_load(costs, level) for level in range(len(self.levels))]
+        fitting = [level for level, load in enumerate(loads) if load <= self.budget]
+        target = fitting[0] if fitting else len(self.levels) - 1
+        if target < self.level and loads[target] > self.hysteresis * self.budget:
+            # Step down only as far as the margin allows
+            relaxed = [level for level in range(target, self.level)
+                       if loads[level] <= self.hysteresis * self.budget]
+            target = relaxed[0] if relaxed else self.level
+        backlog = any(len(stages[name].inbox) >= stages[name].inbox.maxsize
+                      for name in self.critical
+                      if name in stages and stages[name].inbox is not None)
+        if backlog:
+            target = max(target, min(self.level + 1, len(self.levels) - 1))
+        self.level = target
+        self.load = loads[self.level]
+        if "carve" in stages:
+            stages["carve"].stride = self.carve_every
+        if "publish" in stages:
+            stages["publish"].stride = self.publish_every
+        return self.level
+
+    def state(self):
+        """JSON-able summary for the dashboard."""
+        return {
+            "level": self.level,
+            "levels": len(self.levels),
+            "carve_every": self.carve_every,
+            "publish_every": self.publish_every,
+            "jpeg_quality": self.jpeg_quality,
+            "load": None if self.load is None else round(self.load, 2),
+        }
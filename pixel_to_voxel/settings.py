@@ -20,7 +20,10 @@ PIXEL_NOISE_THRESHOLD = 25
 
 # Extrinsics Self-Calibration Settings
 
-# Smallest motion-mask blob (in pixels of contour area) accepted as the object
+# Smallest motion-mask blob (in pixels of contour area) accepted as the
+# object. The "components" blob detector compares its pixel count instead,
+# which is larger for the same blob (a 3 x 2 blob: 2 vs 6), so it accepts
+# slightly smaller blobs at the same value
 EXTRINSICS_MIN_CONTOUR_AREA = 5
 
 # Max timestamp gap (seconds) when pairing track samples between two cameras
@@ -56,6 +59,36 @@ TRACKER_MIN_UPDATES = 5
 # Most detections kept per camera per frame (largest blobs first)
 MAX_DETECTIONS_PER_CAMERA = 15
 
+# Blob detector turning a motion mask into detections: "contours"
+# (cv.findContours + per-contour moments, the original detector: cheapest on
+# clean, sparse masks, ~2 ms at 1080p with a few hundred speckles, but its
+# cost grows with every speckle) or "components" (one
+# cv.connectedComponentsWithStats pass: ~15 ms at 1080p, but flat however
+# many speckles the mask holds — it wins past ~5000, on noisy skies). For
+# large sensors see DETECTION_PYRAMID_LEVEL below
+BLOB_DETECTOR = "contours"
+
+# Prediction-gated detection: once the tracker has targets, difference and
+# search only squares of ROI_PAD_PX pixels each way around their predicted
+# projections, with a full-frame search every ROI_FULL_FRAME_EVERY frames to
+# pick up new objects. Cuts detection cost on large sensors; objects farther
+# than the pad from any prediction are found on the next full-frame search.
+# Masks outside the regions stay empty, so carving sees the tracked targets
+# only between full-frame searches
+DETECTION_ROI = False
+ROI_PAD_PX = 64
+ROI_FULL_FRAME_EVERY = 10
+
+# Pyramid level full-frame detection runs on: 0 thresholds the frame
+# difference at full resolution and finds blobs with BLOB_DETECTOR; level L
+# shrinks the difference 2**L times (INTER_AREA), finds blobs there with
+# BLOB_DETECTOR and re-thresholds each on its full-resolution crop, so
+# centroids keep sub-pixel accuracy (EXTRINSICS_MIN_CONTOUR_AREA then counts
+# pixels). Blobs closer than about 2**L pixels merge, and objects must stay a
+# few pixels wide at that level. One level for all cameras, or {port: level};
+# `python -m pixel_to_voxel.main --detection-timings` times each level per camera
+DETECTION_PYRAMID_LEVEL = 0
+
 # Detections closer than this (pixels) are merged into one before
 # association: frame differencing splits a fast mover into leading/trailing
 # blobs about one body-length apart, which must not become phantom twins
@@ -81,6 +114,81 @@ TARGET_DELETE_AFTER_S = 1.5
 SPAWN_SUPPRESSION_RADIUS_M = 5.0
 
 
+# Pipeline Settings
+
+# Process each camera's frame (differencing, thresholding, blob detection,
+# dashboard pane) on its own persistent worker thread; the OpenCV calls
+# release the GIL, so cameras run concurrently. OPENCV_THREADS sets OpenCV's
+# internal thread count (cv.setNumThreads); None leaves OpenCV's default when
+# running serially and gives each camera worker an equal share of the cores
+# otherwise, so the two pools do not oversubscribe the machine
+PARALLEL_CAMERAS = True
+OPENCV_THREADS = None
+
+# The main loop runs as concurrent stages, capture -> detect -> track ->
+# carve -> publish, each reading from a bounded queue: (size, drop policy)
+# per stage. "block" never drops (the upstream stage waits for room);
+# "oldest" discards the oldest queued frame when full. Detection and tracking
+# must see every frame in order, so their queues always block; carving and
+# the dashboard only ever want the latest frame.
+PIPELINE_QUEUES = {
+    "detect": (2, "block"),
+    "track": (2, "block"),
+    "carve": (1, "oldest"),
+    "publish": (1, "oldest"),
+}
+
+# Nominal frame rate of physical cameras: the capture stage polls their ring
+# buffers at twice this rate for new frames, and it is the deadline the load
+# shedder keeps detection and tracking within
+CAMERA_FPS = 30.0
+
+# Frames each physical camera's reader keeps in its ring buffer (with
+# sequence numbers and capture timestamps); a frame handed to the pipeline
+# stays valid for this many frames minus one
+CAMERA_BUFFER_FRAMES = 8
+
+# Read each physical camera in its own process (shared_capture.py), handing
+# frames to the pipeline through a shared-memory ring buffer instead of a
+# reader thread: no GIL contention between the readers and the processing,
+# for rigs with many cameras at high frame rates
+CAPTURE_PROCESSES = False
+
+# Load shedding: when the measured per-frame cost of the stages no longer
+# fits the frame period, degrade the non-critical stages first. Levels are
+# (carve every Nth frame, publish every Nth frame, dashboard JPEG quality),
+# least degraded first; the least degraded level whose predicted load fits
+# SHED_BUDGET (a fraction of the frame period, counting the stages' costs as
+# if run back to back — raise it on machines with cores to spare, where
+# stages overlap) is used. Detection and tracking are never shed.
+LOAD_SHEDDING = True
+SHED_LEVELS = [
+    (1, 1, 80),
+    (2, 1, 80),
+    (2, 2, 70),
+    (3, 3, 60),
+    (5, 5, 50),
+]
+SHED_BUDGET = 1.0
+
+# Camera nodes (camera_node.py): cameras on other machines detect locally and
+# stream detections and run-length-encoded masks to `main --nodes`, which
+# listens on NODE_LISTEN_HOST:NODE_LISTEN_PORT. Messages are paired by capture
+# timestamp: another node's message counts for the reference node's frame
+# when captured within NODE_PAIR_TOLERANCE_S of it; a node with nothing that
+# recent is waited for up to NODE_MAX_WAIT_S, then left out of that frame.
+# Each node's backlog is capped at NODE_QUEUE_FRAMES messages. A node that
+# cannot reach the central process (not up yet, or the connection dropped)
+# retries after NODE_RECONNECT_MIN_S, doubling up to NODE_RECONNECT_MAX_S
+NODE_LISTEN_HOST = "0.0.0.0"
+NODE_LISTEN_PORT = 8400
+NODE_PAIR_TOLERANCE_S = 0.012
+NODE_MAX_WAIT_S = 0.05
+NODE_QUEUE_FRAMES = 30
+NODE_RECONNECT_MIN_S = 0.5
+NODE_RECONNECT_MAX_S = 10.0
+
+
 # Voxel Grid Settings (pixel-to-voxel projection stage)
 
 # Axis-aligned bounds of the reconstruction volume, in world coordinates
@@ -91,9 +199,86 @@ VOXEL_GRID_MIN = (-30.0, -15.0, 0.0)
 VOXEL_GRID_MAX = (30.0, 15.0, 50.0)
 
 # Edge length of a single cubic voxel, in the same units (0.5 -> 120x60x100).
-# Keep it below the object's diameter, or the carve can miss voxel centres.
+# Keep it below the object's diameter, or the carve can miss voxel centres
+# (the "footprint" engine below lifts that limit).
 VOXEL_SIZE = 0.5
 
+# Voxel grid layout: "box" is the uniform Cartesian grid above; "frustum"
+# aligns cells to the rays of FRUSTUM_REFERENCE_PORT's camera (None = lowest
+# port), FRUSTUM_PIXEL_BIN reference pixels across, with depth bins growing
+# with range so every cell projects to about that many pixels. It only spans
+# what the reference camera sees of the box (nearer than FRUSTUM_MIN_DEPTH
+# metres is skipped) and is coarser far out, where the cameras cannot resolve
+# 0.5 m anyway: ~2.5x fewer cells than the box on the sim rig. The
+# hierarchical engine needs the box grid.
+VOXEL_GRID_TYPE = "box"
+FRUSTUM_REFERENCE_PORT = None
+FRUSTUM_PIXEL_BIN = 8
+FRUSTUM_MIN_DEPTH = 1.0
+
+# Carving engine used by pixel_to_voxel(): "dense" tests every voxel against
+# cached projection tables; "hierarchical" carves coarse cells first and only
+# refines survivors, so its cost follows the hull rather than the grid volume
+# (same occupied set, no tables — the one to use for fine voxels);
+# "inverted" looks up the voxels behind each set mask pixel through an
+# inverted copy of the tables, so its cost follows the motion-mask area;
+# "bricks" skips whole bricks of voxels whose projection misses every mask
+# blob's bounding box, so its cost follows the number of moving objects.
+# "footprint" differs from the rest: a camera supports a voxel when any mask
+# pixel lies in the voxel's projected footprint (a box sum over the mask's
+# integral image), not just under its centre, so voxels much coarser than a
+# distant object still catch it — a slightly fatter hull for far fewer voxels
+CARVE_ENGINE = "dense"
+
+# Edge of the hierarchical engine's coarsest cells (rounded to a power-of-two
+# number of voxels: 4.0 -> 8 voxels at 0.5 m, 32 at 0.1 m). Noisy masks with
+# speckle all over the sky defeat the coarse test and favour "dense".
+CARVE_COARSE_CELL = 4.0
+
+# Edge of the "bricks" engine's bricks, in voxels (8 -> 4 m at 0.5 m voxels)
+CARVE_BRICK = 8
+
+# Save the carve tables to CALIBRATION_DATA_PATH (keyed by a hash of the
+# calibration and grid) and memory-map them on later starts, instead of
+# re-projecting the whole grid through every camera on the first frame.
+# Saving a new set deletes the tables of earlier calibrations and grids
+CARVE_TABLE_CACHE = True
+
+# Voxels projected per step while building carve tables; bounds the
+# temporaries to this many voxels instead of the whole grid
+CARVE_TABLE_CHUNK = 1 << 20
+
+# Fine hull patches carved around every tracked target each frame, beside the
+# global grid: a cube of TARGET_PATCH_EXTENT metres (centred on the target's
+# filtered position) at TARGET_PATCH_VOXEL_SIZE voxels. Gives each target a
+# volume and extent at a resolution the whole grid could never afford. Voxels
+# much smaller than a pixel's footprint at the target's range (~0.09 m at 50 m
+# on the sim rig) cost time without adding detail.
+TARGET_PATCHES = True
+TARGET_PATCH_EXTENT = 4.0
+TARGET_PATCH_VOXEL_SIZE = 0.1
+
+# Temporal occupancy (occupancy.py): accumulate per-voxel log-odds across
+# frames and publish the voxels believed occupied instead of each frame's raw
+# hull. Carved-occupied voxels gain OCCUPANCY_HIT, believed voxels carved
+# away gain OCCUPANCY_MISS, belief is clamped to [0, OCCUPANCY_LIMIT] and
+# decays toward 0 with time constant OCCUPANCY_DECAY_S seconds. The defaults
+# show a voxel on its first hit (the sim target moves about a voxel per frame,
+# so a voxel is rarely hit twice) and drop it after two misses, so a
+# one-frame blob dropout no longer flickers the hull; a one-frame ghost shows
+# for two frames.
+OCCUPANCY_LOG_ODDS = False
+OCCUPANCY_HIT = 1.0
+OCCUPANCY_MISS = -0.6
+OCCUPANCY_LIMIT = 1.5
+OCCUPANCY_THRESHOLD = 0.3
+OCCUPANCY_DECAY_S = 1.0
+
+# The carved hull is split into 26-connected voxel clusters every frame (one
+# per object, ideally); a cluster is attributed to the tracked target nearest
+# its centroid when within this many metres
+CLUSTER_TARGET_GATE_M = 3.0
+
 
 # Simulator Settings (synthetic multi-camera dataset generation)
 
@@ -0,0 +1,231 @@
+"""One capture process per camera, handing frames over in shared memory.
+
+With every CameraStream reader thread and the whole pipeline in one
+interpreter, the GIL-bound Python parts of the readers contend with the
+processing and, at many cameras and high frame rates, frames are dropped.
+SharedMemoryStream instead runs each camera's reader in its own process,
+which grabs frames straight into a ring buffer in a
+``multiprocessing.shared_memory`` block:
+
+    sequence    int64[n]        frame sequence number per slot (-1: empty or
+                                being written)
+    timestamps  float64[n]      capture time per slot (time.perf_counter(),
+                                a system-wide monotonic clock)
+    latest      int64[1]        newest sequence number written
+    frames      uint8[n, H, W, C]
+
+The main process reads the ring as zero-copy NumPy views through the same
+``read_newest()`` / ``read_closest()`` / ``read()`` / ``stop()`` interface as
+main.CameraStream (FrameRing below), so it is a drop-in behind
+settings.CAPTURE_PROCESSES. A cross-process lock guards the slot metadata
+only, never the frame copies.
+"""
+
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2 as cv
+import numpy as np
+
+from . import settings
+
+_HANDSHAKE_TIMEOUT_S = 10.0
+
+
+class FrameRing:
+    """Read side of a ring of (sequence, capture timestamp, frame) slots.
+
+    Subclasses provide ``size``, ``buffers`` (frame per slot, None until the
+    first frame), ``sequence``, ``timestamps``, ``latest``, ``last_read`` and
+    ``_lock``. Returned frames are views into the ring: valid until the
+    writer laps them, ``size - 1`` frames later, so copy anything kept longer.
+    """
+
+    def _take(self, slot):
+        self.last_read = max(self.last_read, int(self.sequence[slot]))
+        return int(self.sequence[slot]), float(self.timestamps[slot]), self.buffers[slot]
+
+    def read_newest(self):
+        """(sequence, timestamp, frame) of the newest frame not yet handed
+        out, or None when nothing new has arrived."""
+        with self._lock:
+            latest = int(self.latest)
+            if latest <= self.last_read:
+                return None
+            return self._take(latest % self.size)
+
+    def read_closest(self, timestamp):
+        """(sequence, timestamp, frame) of the not-yet-handed-out frame whose
+        capture time is closest to ``timestamp``, or None. Older unseen frames
+        are skipped along with it."""
+        with self._lock:
+            unseen = np.flatnonzero(self.sequence > self.last_read)
+            if not len(unseen):
+                return None
+            slot = unseen[np.argmin(np.abs(self.timestamps[unseen] - timestamp))]
+            return self._take(slot)
+
+    def read(self):
+        """Newest unseen frame, or None (the interface SimulatedStream mirrors)."""
+        newest = self.read_newest()
+        return None if newest is None else newest[2]
+
+
+def _ring_layout(size, shape, dtype):
+    """Byte offsets of the ring's arrays in the shared block, and its size."""
+    frames_offset = -(-(16 * size + 8) // 64) * 64      # frames 64-byte aligned
+    frame_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return frames_offset, frames_offset + size * frame_bytes
+
+
+def _ring_views(buf, size, shape, dtype):
+    """(sequence, timestamps, latest, frames) arrays over a shared block."""
+    frames_offset, _ = _ring_layout(size, shape, dtype)
+    sequence = np.ndarray((size,), dtype=np.int64, buffer=buf, offset=0)
+    timestamps = np.ndarray((size,), dtype=np.float64, buffer=buf, offset=8 * size)
+    latest = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=16 * size)
+    frames = np.ndarray((size,) + tuple(shape), dtype=dtype, buffer=buf, offset=frames_offset)
+    return sequence, timestamps, latest, frames
+
+
+def _capture_process(port, size, conn, lock, stop):
+    """Child process: open the camera, agree the ring's layout with the
+    parent from the first frame, then grab into the shared ring until told
+    to stop."""
+    stream = cv.VideoCapture(port)
+    try:
+        first = None
+        while first is None and not stop.is_set():
+            if stream.grab():
+                ok, frame = stream.retrieve()
+                first = (time.perf_counter(), frame) if ok else None
+            elif not stream.isOpened():
+                break
+            else:
+                time.sleep(0.001)
+        if first is None:
+            conn.send(None)
+            return
+        conn.send((first[1].shape, first[1].dtype.str))
+        name = conn.recv()
+        # The parent owns (and unlinks) the block; a spawned child shares the
+        # parent's resource tracker, so attaching adds no second owner
+        block = shared_memory.SharedMemory(name=name)
+        sequence, timestamps, latest, frames = _ring_views(block.buf, size, first[1].shape,
+                                                           first[1].dtype)
+        frames[0] = first[1]
+        with lock:
+            timestamps[0], sequence[0], latest[0] = first[0], 0, 0
+        seq = 0
+        while not stop.is_set():
+            if not stream.grab():
+                time.sleep(0.001)
+                continue
+            timestamp = time.perf_counter()
+            seq += 1
+            slot = seq % size
+            with lock:
+                sequence[slot] = -1      # being overwritten: never hand it out
+            ok, frame = stream.retrieve(image=frames[slot])
+            if not ok or frame.shape != frames.shape[1:] or frame.dtype != frames.dtype:
+                continue                  # a format change cannot be shared
+            if not np.shares_memory(frame, frames[slot]):
+                frames[slot] = frame      # retrieved into a buffer of its own
+            with lock:
+                timestamps[slot], sequence[slot], latest[0] = timestamp, seq, seq
+        del sequence, timestamps, latest, frames
+        block.close()
+    finally:
+        stream.release()
+
+
+class SharedMemoryStream(FrameRing):
+    """Drop-in for main.CameraStream with the reader in its own process.
+
+    The frames handed out are views of the shared block, which the capture
+    process overwrites CAMERA_BUFFER_FRAMES - 1 frames later without asking:
+    as with CameraStream, copy anything kept longer (main's capture stage
+    does).
+    """
+
+    def __init__(self, port, buffer_frames=None):
+        self.port = port
+        self.size = int(buffer_frames or settings.CAMERA_BUFFER_FRAMES)
+        self.buffers = None
+        self.sequence = np.full(self.size, -1, dtype=np.int64)
+        self.timestamps = np.zeros(self.size, dtype=np.float64)
+        self._latest = np.full(1, -1, dtype=np.int64)
+        self.last_read = -1
+        self._context = mp.get_context("spawn")
+        self._lock = self._context.Lock()
+        self._stop = self._context.Event()
+        self._block = None
+        self._process = None
+        self._handshake = None
+        self.stopped = False
+
+    @property
+    def latest(self):
+        return int(self._latest[0])
+
+    def start(self):
+        """Spawn the capture process and return at once; a handshake thread
+        maps its ring once the first frame has sized it, so several cameras
+        start in parallel. Until then (and for a camera that never delivers
+        a frame) reads return None."""
+        conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(
+            target=_capture_process, args=(self.port, self.size, child_conn, self._lock, self._stop),
+            name=f"capture-{self.port}", daemon=True)
+        self._process.start()
+        self._handshake = threading.Thread(target=self._attach, args=(conn,),
+                                           name=f"capture-{self.port}-handshake", daemon=True)
+        self._handshake.start()
+        return self
+
+    def _attach(self, conn):
+        """Handshake thread: size the shared block from the child's first
+        frame, map it, and tell the child its name."""
+        deadline = time.perf_counter() + _HANDSHAKE_TIMEOUT_S
+        while not conn.poll(0.05):
+            if self._stop.is_set() or time.perf_counter() > deadline:
+                return
+        layout = conn.recv()
+        if layout is None or self._stop.is_set():
+            return
+        shape, dtype = layout
+        _, nbytes = _ring_layout(self.size, shape, dtype)
+        block = shared_memory.SharedMemory(create=True, size=nbytes)
+        sequence, timestamps, latest, buffers = _ring_views(block.buf, self.size, shape, dtype)
+        sequence[:] = -1
+        latest[0] = -1
+        with self._lock:
+            self._block = block
+            self.sequence, self.timestamps, self.buffers = sequence, timestamps, buffers
+            self._latest = latest
+        conn.send(block.name)
+
+    def stop(self):
+        self.stopped = True
+        self._stop.set()
+        if self._handshake is not None:
+            self._handshake.join()
+        if self._process is not None:
+            self._process.join(2.0)
+            if self._process.is_alive():
+                self._process.terminate()
+        if self._block is not None:
+            self._block.unlink()
+            # Frames still referenced by the caller keep the mapping alive
+            # (close() refuses while views exist); it goes with them
+            self.sequence = self.sequence.copy()
+            self.timestamps = self.timestamps.copy()
+            self._latest = self._latest.copy()
+            self.last_read = max(self.last_read, self.latest)   # nothing left to hand out
+            self.buffers = None
+            try:
+                self._block.close()
+            except BufferError:
+                pass
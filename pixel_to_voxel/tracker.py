@@ -387,6 +387,13 @@ class MultiTargetTracker:
         self.targets = remaining
         return events
 
+    def predicted_positions(self, timestamp):
+        """(N, 3) predicted centres of every target, tentative ones included,
+        at ``timestamp`` — where the next detections should come from."""
+        points = [target.filter.predict_position(timestamp) for target in list(self.targets)
+                  if target.filter.x is not None]
+        return np.asarray(points, dtype=np.float64).reshape(-1, 3)
+
     def _vetoed_by_third_camera(self, point, spawn_ports, detections):
         """A candidate is a likely ghost if another camera should see it but
         has no detection anywhere near its projection."""
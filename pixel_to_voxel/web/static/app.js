@@ -45,6 +45,7 @@ let sceneBuilt = false;
 let voxelMesh = null;
 let voxelSize = 1;
 let gridZ = [0, 1];
+let cellEdge = null;   // frustum grid: cell edge at a world point
 
 function buildScene(grid) {
   const lo = new THREE.Vector3(...grid.min);
@@ -61,6 +62,22 @@ function buildScene(grid) {
   scene.add(ground);
 
   scene.add(new THREE.Box3Helper(new THREE.Box3(lo, hi), 0x39445a));
+  if (grid.type === 'frustum') {
+    // Cells fan out from the reference camera and grow with range; only
+    // those inside the box above are carved
+    const pts = [];
+    for (let i = 0; i < 4; i++) {
+      const j = (i + 1) % 4;
+      pts.push(grid.near[i], grid.near[j], grid.far[i], grid.far[j],
+               grid.near[i], grid.far[i]);
+    }
+    const geo = new THREE.BufferGeometry().setFromPoints(
+      pts.map(p => new THREE.Vector3(...p)));
+    scene.add(new THREE.LineSegments(geo,
+      new THREE.LineBasicMaterial({ color: 0x4a5670 })));
+    cellEdge = p => (grid.axis[0] * p[0] + grid.axis[1] * p[1]
+                     + grid.axis[2] * p[2] + grid.offset) * grid.edge_per_metre;
+  }
 
   const axes = new THREE.AxesHelper(0.15 * maxExt);
   axes.position.set(0, 0, 0.02);
@@ -93,6 +110,7 @@ function updateVoxels(voxels) {
   const n = Math.min(voxels.length, MAX_VOXELS);
   for (let i = 0; i < n; i++) {
     dummy.position.set(voxels[i][0], voxels[i][1], voxels[i][2]);
+    dummy.scale.setScalar(cellEdge ? cellEdge(voxels[i]) / voxelSize : 1);
     dummy.updateMatrix();
     voxelMesh.setMatrixAt(i, dummy.matrix);
     const t = Math.min(1, Math.max(0,
@@ -288,6 +306,7 @@ function renderDetail(target) {
     for (const id of ['t-speed','t-speed-kmh','t-heading','t-climb','t-alt']) $(id).textContent = '—';
     $('t-cardinal').textContent = '';
     $('t-pos').textContent = '—';
+    $('t-hull').textContent = '—';
     return;
   }
   const n = target.cameras.length;
@@ -302,6 +321,9 @@ function renderDetail(target) {
   $('t-alt').textContent = target.position[2].toFixed(1);
   $('t-pos').textContent =
     `x ${target.position[0].toFixed(1)}   y ${target.position[1].toFixed(1)}   z ${target.position[2].toFixed(1)}`;
+  $('t-hull').textContent = target.extent
+    ? `${target.extent.map(e => e.toFixed(1)).join(' × ')}   ${target.volume.toFixed(2)} m³`
+    : '—';
 }
 
 function update(state) {
@@ -315,10 +337,25 @@ function update(state) {
   }
   lastRunId = state.run_id;
 
-  setPill($('pill-projection'), state.projection ? 'PROJECTION OK' : 'NO EXTRINSICS',
-          state.projection ? 'ok' : 'bad');
-  setPill($('pill-voxels'), `VOXELS ${state.voxel_count}`);
+  if (!state.projection) setPill($('pill-projection'), 'NO EXTRINSICS', 'bad');
+  else if (state.carving === 'failed') setPill($('pill-projection'), 'CARVING FAILED', 'bad');
+  else if (state.carving !== 'ready') setPill($('pill-projection'), 'CARVING WARMING UP');
+  else setPill($('pill-projection'), 'PROJECTION OK', 'ok');
+  const clusters = (state.clusters || []).length;
+  setPill($('pill-voxels'), `VOXELS ${state.voxel_count}` +
+    (clusters ? ` · ${clusters} CLUSTER${clusters === 1 ? '' : 'S'}` : ''));
   setPill($('pill-fps'), `FPS ${fmt(state.fps)}`);
+  // Per-stage throughput on hover: rate, cost per frame, frames dropped
+  $('pill-fps').title = Object.entries(state.stages || {}).map(([name, s]) =>
+    `${name}: ${fmt(s.rate)}/s, ${fmt(s.busy_ms)} ms` +
+    (s.dropped ? `, ${s.dropped} dropped` : '')).join('\n');
+  // Load shedding: carving and display degrade first, tracking never
+  const shed = state.shedding;
+  if (!shed || shed.level === 0) setPill($('pill-shed'), 'FULL RATE', 'ok');
+  else setPill($('pill-shed'), `SHEDDING ${shed.level}/${shed.levels - 1}`,
+    shed.level === shed.levels - 1 ? 'bad' : '');
+  $('pill-shed').title = shed ? `carve every ${shed.carve_every} · display every ` +
+    `${shed.publish_every} at JPEG ${shed.jpeg_quality} · load ${fmt(shed.load, 2)}` : '';
 
   updateVoxels(state.voxels || []);
 
@@ -0,0 +1,224 @@
+"""Camera-node check over loopback (no cameras, no rendering).
+
+Three simulated camera nodes, each in its own thread, draw the default
+trajectories' objects as discs into synthetic frames of their own camera,
+detect them locally and stream timestamped detections and run-length-encoded
+masks over TCP to one NodeServer. The central side pairs the messages by
+capture time and feeds MultiTargetTracker.step(): every object must be
+confirmed near its ground-truth position, and the masks that crossed the
+wire must still carve a hull around them. A node's dashboard pane must show
+its undistorted detections on its (undistorted) mask blobs.
+
+Run as a plain script (matching the existing test convention):
+
+    python tests/test_camera_node.py
+"""
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import cv2 as cv
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from pixel_to_voxel import camera_calibration, settings
+from pixel_to_voxel.camera_extrinsics import mask_centroids, undistort_centroids
+from pixel_to_voxel.camera_node import (CameraNode, NodeServer, connect_node, rle_decode,
+                                        rle_encode)
+from pixel_to_voxel.main import node_pane, pixel_to_voxel
+from pixel_to_voxel.tracker import MultiTargetTracker
+from pixel_to_voxel.simulator.rig import CameraRig
+from pixel_to_voxel.simulator import trajectory
+
+settings.CARVE_TABLE_CACHE = False   # keep test runs from writing carve tables
+
+FPS = 30.0
+START = 10
+FRAMES = 45
+DISC_PX = 7
+# The default wide-baseline pair plus a third camera on the other flank
+CAMERA_POSITIONS = list(settings.SIM_CAMERA_POSITIONS) + [(-36.0, -33.0, 1.5)]
+
+
+def test_rle_round_trip():
+    rng = np.random.default_rng(0)
+    for mask in (np.zeros((4, 5), np.uint8), np.full((4, 5), 255, np.uint8),
+                 np.where(rng.random((48, 64)) > 0.9, 255, 0).astype(np.uint8)):
+        payload = rle_encode(mask)
+        assert np.array_equal(rle_decode(payload, mask.shape), mask)
+    sparse = np.zeros((480, 640), np.uint8)
+    cv.circle(sparse, (300, 200), DISC_PX, 255, -1)
+    assert len(rle_encode(sparse)) < 200, "a small blob must encode to a few runs"
+    print("PASS: run-length encoding round-trips masks.")
+
+
+def build_scene():
+    rig = CameraRig.from_positions(
+        positions=CAMERA_POSITIONS, target=settings.SIM_LOOK_AT,
+        width=settings.SIM_IMAGE_WIDTH, height=settings.SIM_IMAGE_HEIGHT,
+        fov_deg=settings.SIM_FOV_DEG)
+    # Frames START.. of each flight: off the ground, and apart in every view
+    total = START + FRAMES
+    paths = np.stack([trajectory.parabola(p0=spec["p0"], v0=spec["v0"], num_frames=total,
+                                          duration=(total - 1) / FPS)[START:]
+                      for spec in settings.SIM_TRAJECTORIES])
+    return rig, paths
+
+
+def render(cam, points):
+    frame = np.zeros((cam.height, cam.width, 3), np.uint8)
+    pixels, valid = cam.project(points)
+    for (u, v), ok in zip(pixels, valid):
+        if ok:
+            cv.circle(frame, (int(round(u)), int(round(v))), DISC_PX, (255, 255, 255), -1)
+    return frame
+
+
+def test_nodes_feed_one_tracker():
+    rig, paths = build_scene()
+    calibration = {cam.id: {"camera_matrix": cam.K, "dist_coeffs": cam.dist_coeffs,
+                            "extrinsic": cam.extrinsic_4x4()} for cam in rig.cameras}
+    ports = [cam.id for cam in rig.cameras]
+    # Unpaced nodes on a busy machine can fall far behind: wait for them
+    server = NodeServer(ports, max_wait=5.0, queue_frames=FRAMES)
+    address = ("127.0.0.1", server.start("127.0.0.1", 0))
+
+    def run_node(cam):
+        node = CameraNode(cam.id, calibration[cam.id], address)
+        try:
+            for i in range(FRAMES):
+                node.process(render(cam, paths[:, i]), i / FPS)
+        finally:
+            node.close()
+
+    nodes = [threading.Thread(target=run_node, args=(cam,)) for cam in rig.cameras]
+    for thread in nodes:
+        thread.start()
+
+    tracker = MultiTargetTracker(calibration)
+    sets, last_masks = [], None
+    deadline = time.time() + 30.0
+    while len(sets) < FRAMES - 1 and time.time() < deadline:
+        paired = server.next_set()
+        if paired is None:
+            time.sleep(0.002)
+            continue
+        timestamp, detections, masks = paired
+        assert sorted(detections) == ports, f"frame at {timestamp} lost a node"
+        tracker.step(detections, timestamp)
+        sets.append(timestamp)
+        last_masks = masks
+    for thread in nodes:
+        thread.join(5.0)
+    server.stop()
+
+    assert sets == [i / FPS for i in range(1, FRAMES)], "sets out of order or missing"
+    assert sorted(server.shapes.values()) == [(rig.cameras[0].height, rig.cameras[0].width)] * len(ports)
+    truth = paths[:, FRAMES - 1]
+    confirmed = tracker.state_list()
+    assert len(confirmed) == len(truth), f"{len(confirmed)} confirmed targets"
+    assert all(target["cameras"] for target in confirmed), "a target lost its detections"
+    for point in truth:
+        error = min(np.linalg.norm(np.asarray(target["position"]) - point)
+                    for target in confirmed)
+        assert error < 1.5, f"no target within 1.5 m of {point} (closest {error:.2f} m)"
+
+    # The decoded masks still carve: occupied voxels near the objects
+    assert sorted(last_masks) == ports
+    voxels = pixel_to_voxel(last_masks, calibration)
+    assert len(voxels), "the transmitted masks carved nothing"
+    nearest = np.linalg.norm(voxels[:, None] - truth[None], axis=2).min(axis=1)
+    assert np.median(nearest) < 2.0, f"hull strays from the objects ({np.median(nearest):.2f} m)"
+    print(f"PASS: {len(ports)} camera nodes fed {len(sets)} frame sets to one tracker "
+          f"({len(confirmed)} targets confirmed).")
+
+
+def test_lagging_node_is_skipped():
+    """A node that never catches up is left out once NODE_MAX_WAIT_S passes."""
+    server = NodeServer([0, 1], tolerance=0.01, max_wait=0.05, queue_frames=4)
+    with server._lock:
+        server._queues[0].append((1.0, time.perf_counter(), [(1.0, 2.0)], None))
+        server._last_timestamp[1] = 0.5
+    assert server.next_set() is None, "a node that may still deliver must be waited for"
+    time.sleep(0.06)
+    timestamp, detections, masks = server.next_set()
+    assert timestamp == 1.0 and detections == {0: [(1.0, 2.0)]} and masks == {}
+    print("PASS: a lagging node is skipped after the pairing wait.")
+
+
+def test_node_waits_for_central_and_reconnects():
+    """A node started before the central process connects once it listens,
+    and a reconnecting node takes over its port's slot."""
+    camera = {"camera_matrix": np.eye(3), "dist_coeffs": np.zeros(5), "extrinsic": np.eye(4)}
+    with socket.socket() as probe:               # a free port, closed again
+        probe.bind(("127.0.0.1", 0))
+        listen_port = probe.getsockname()[1]
+    address = ("127.0.0.1", listen_port)
+    saved = settings.NODE_RECONNECT_MIN_S
+    settings.NODE_RECONNECT_MIN_S = 0.05
+    server = NodeServer([0])
+    try:
+        connected = []
+        waiting = threading.Thread(target=lambda: connected.append(connect_node(0, camera, address)))
+        waiting.start()
+        time.sleep(0.3)
+        assert waiting.is_alive() and not connected, "nothing listens yet"
+        server.start("127.0.0.1", listen_port)
+        waiting.join(5.0)
+        first = connected[0]
+        frame = np.zeros((48, 64), np.uint8)
+        first.process(frame, 0.0)
+        second = connect_node(0, camera, address)
+        second.process(frame, 1.0)
+        second.process(frame, 1.0 + 1 / FPS)      # sent after its hello
+        deadline = time.time() + 2.0
+        while not server._queues[0] and time.time() < deadline:
+            time.sleep(0.01)
+        first.close()
+        time.sleep(0.1)
+        assert server.connected == {0}, "the old connection's end must not drop the new one"
+        assert len(server._connections) == 1, "a closed connection must be forgotten"
+        second.close()
+    finally:
+        settings.NODE_RECONNECT_MIN_S = saved
+        server.stop()
+    print("PASS: a node waits for the central process and reconnects.")
+
+
+def test_node_pane_matches_detections():
+    """A node's detections are undistorted pixels; its pane undistorts the
+    raw mask so the markers land on their blobs."""
+    K = np.array([[550.0, 0.0, 320.0], [0.0, 550.0, 240.0], [0.0, 0.0, 1.0]])
+    dist = np.array([-0.25, 0.08, 0.001, -0.001, 0.0])
+    mask = np.zeros((480, 640), np.uint8)
+    cv.circle(mask, (560, 420), 15, 255, -1)
+    raw = mask_centroids(mask)
+    found = undistort_centroids(raw, K, dist)
+    assert np.hypot(*np.subtract(found[0], raw[0])) > 10.0, "needs a visibly distorted spot"
+    saved_path = settings.CALIBRATION_DATA_PATH
+    with tempfile.TemporaryDirectory() as directory:
+        settings.CALIBRATION_DATA_PATH = directory + os.sep
+        try:
+            maps = camera_calibration.load_undistort_maps(0, K, dist, mask.shape)
+        finally:
+            settings.CALIBRATION_DATA_PATH = saved_path
+    pane = node_pane(mask, found, mask.shape, maps)
+    # White mask pixels keep their blue channel; the yellow marker has none
+    blob = np.where(pane[..., 0] > 127, 255, 0).astype(np.uint8)
+    cv.drawMarker(blob, tuple(int(round(c)) for c in found[0]), 255, cv.MARKER_CROSS, 20, 2)
+    centre = mask_centroids(blob)[0]
+    assert np.hypot(*np.subtract(centre, found[0])) < 1.0, (centre, found)
+    print("PASS: a node's pane shows its detections on their blobs.")
+
+
+if __name__ == "__main__":
+    test_rle_round_trip()
+    test_nodes_feed_one_tracker()
+    test_lagging_node_is_skipped()
+    test_node_waits_for_central_and_reconnects()
+    test_node_pane_matches_detections()
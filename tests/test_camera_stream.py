@@ -0,0 +1,112 @@
+"""Ring-buffer CameraStream check (no camera: a generated video file).
+
+cv.VideoCapture reads a video file through the same grab/retrieve calls as a
+camera, so a short clip whose frames encode their own index stands in for
+one. The stream must keep only the newest CAMERA_BUFFER_FRAMES frames, in
+reused buffers, with increasing sequence numbers and capture timestamps, and
+hand each frame out at most once — newest first, or closest to a given time.
+SharedMemoryStream must do the same from a capture process, zero-copy.
+
+Run as a plain script (matching the existing test convention):
+
+    python tests/test_camera_stream.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import cv2 as cv
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from pixel_to_voxel.main import CameraStream
+from pixel_to_voxel.shared_capture import SharedMemoryStream
+
+FRAMES = 20
+BUFFER = 8
+
+
+def write_clip(path):
+    """FRAMES grey frames, frame i at level 10 * i (MJPG keeps it within a few levels)."""
+    writer = cv.VideoWriter(path, cv.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    for i in range(FRAMES):
+        writer.write(np.full((48, 64, 3), 10 * i, dtype=np.uint8))
+    writer.release()
+
+
+def test_ring_buffer():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "clip.avi")
+        write_clip(path)
+        stream = CameraStream(path, buffer_frames=BUFFER).start()
+        deadline = time.time() + 5.0
+        while stream.latest < FRAMES - 1 and time.time() < deadline:
+            time.sleep(0.01)
+        assert stream.latest == FRAMES - 1, f"read {stream.latest + 1} of {FRAMES} frames"
+
+        kept = np.sort(stream.sequence)
+        assert np.array_equal(kept, np.arange(FRAMES - BUFFER, FRAMES)), kept
+        order = np.argsort(stream.sequence)
+        assert np.all(np.diff(stream.timestamps[order]) >= 0), "capture timestamps out of order"
+
+        # Closest to a capture time: that frame, a view into the ring
+        target = int(np.flatnonzero(stream.sequence == 14)[0])
+        seq, timestamp, frame = stream.read_closest(stream.timestamps[target])
+        assert seq == 14 and timestamp == stream.timestamps[target]
+        assert abs(frame.mean() - 140) < 4
+        assert any(frame is buffer for buffer in stream.buffers), "frame was copied"
+
+        seq, _, frame = stream.read_newest()
+        assert seq == FRAMES - 1 and abs(frame.mean() - 10 * (FRAMES - 1)) < 4
+        # Every frame is handed out at most once, and older ones are skipped
+        assert stream.read_newest() is None and stream.read() is None
+        assert stream.read_closest(stream.timestamps[target]) is None
+
+        stream.stop()
+        assert not stream._thread.is_alive()
+    print(f"PASS: ring buffer keeps the newest {BUFFER} frames with sequence and time.")
+
+
+def test_shared_memory_stream():
+    """The same clip read by a capture process: frames arrive as zero-copy
+    views of the shared ring, and stop() tears the block down."""
+    from multiprocessing import shared_memory
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "clip.avi")
+        write_clip(path)
+        began = time.perf_counter()
+        stream = SharedMemoryStream(path, buffer_frames=BUFFER).start()
+        # Cameras start in parallel: start() does not wait for a first frame
+        assert time.perf_counter() - began < 1.0, "start() blocked on the handshake"
+        deadline = time.time() + 10.0
+        while stream.latest < FRAMES - 1 and time.time() < deadline:
+            time.sleep(0.01)
+        assert stream.latest == FRAMES - 1, f"read {stream.latest + 1} of {FRAMES} frames"
+        assert np.array_equal(np.sort(stream.sequence), np.arange(FRAMES - BUFFER, FRAMES))
+
+        target = int(np.flatnonzero(stream.sequence == 15)[0])
+        seq, _, frame = stream.read_closest(stream.timestamps[target])
+        assert seq == 15 and abs(frame.mean() - 150) < 4
+        assert np.shares_memory(frame, stream.buffers), "frame was copied out of the ring"
+        seq, _, frame = stream.read_newest()
+        assert seq == FRAMES - 1 and abs(frame.mean() - 10 * (FRAMES - 1)) < 4
+        assert stream.read() is None
+
+        name = stream._block.name
+        stream.stop()
+        assert not stream._process.is_alive() and stream.read() is None
+        try:
+            shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            pass
+        else:
+            raise AssertionError("the shared ring outlived stop()")
+    print("PASS: capture process shares its ring buffer zero-copy.")
+
+
+if __name__ == "__main__":
+    test_ring_buffer()
+    test_shared_memory_stream()
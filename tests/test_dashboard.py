@@ -4,8 +4,9 @@ Starts the embedded server on an ephemeral port and asserts over real HTTP —
 the page and static assets load, the MJPEG stream delivers a JPEG, the SSE
 feed carries the pipeline state, and the restart endpoint round-trips. The
 end-to-end part drives 20 frames of the actual sim pipeline (load dataset ->
-undistort -> mask -> carve -> track -> publish) and validates the tracked
-state as served to the browser against the dataset's exported ground truth.
+mask per camera on a thread pool -> carve -> track -> publish) and validates
+the tracked state as served to the browser against the dataset's exported
+ground truth.
 
 Run as a plain script (matching the existing test convention):
 
@@ -16,6 +17,7 @@ import glob
 import json
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from http.client import HTTPConnection
 
 import cv2 as cv
@@ -26,7 +28,8 @@ sys.path.append(os.getcwd())
 from pixel_to_voxel import settings
 from pixel_to_voxel.dashboard import Dashboard, serializable_state
 from pixel_to_voxel.camera_extrinsics import mask_centroids
-from pixel_to_voxel.main import load_simulation, pixel_to_voxel
+from pixel_to_voxel.main import (camera_pane, load_simulation, pixel_to_voxel,
+                                 process_camera_frame)
 from pixel_to_voxel.tracker import MultiTargetTracker
 
 GRID = {"min": list(settings.VOXEL_GRID_MIN),
@@ -140,22 +143,27 @@ def test_sim_pipeline_through_dashboard():
     gray_old = {port: None for port in ports}
     frames_read = 20
     carved_any = False
+    # One worker per camera, as in main()
+    pool = ThreadPoolExecutor(max_workers=len(ports))
     try:
         for i in range(frames_read):
             masks, detections, display = {}, {}, {}
-            for port in ports:
-                frame = streams[port].read()
-                frame = cv.undistort(frame, calibration_data[port]["camera_matrix"],
-                                     calibration_data[port]["dist_coeffs"])
-                gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
-                if gray_old[port] is not None:
-                    diff = cv.absdiff(gray, gray_old[port])
-                    _, mask = cv.threshold(diff, settings.PIXEL_NOISE_THRESHOLD, 255,
-                                           cv.THRESH_BINARY)
+            raws = {port: streams[port].read() for port in ports}
+            futures = {port: pool.submit(process_camera_frame, raws[port],
+                                         gray_old[port], calibration_data[port])
+                       for port in ports}
+            for port, future in futures.items():
+                gray, mask, found = future.result()
+                if mask is not None:
                     masks[port] = mask
-                    detections[port] = mask_centroids(mask)
+                    detections[port] = found
+                    # The pool must change nothing: same masks as in-line
+                    assert np.array_equal(mask, cv.threshold(
+                        cv.absdiff(gray, gray_old[port]), settings.PIXEL_NOISE_THRESHOLD,
+                        255, cv.THRESH_BINARY)[1])
+                    assert found == mask_centroids(mask)
                 gray_old[port] = gray
-                display[port] = frame
+                display[port] = camera_pane(raws[port], mask, found, None)
             voxels = np.empty((0, 3))
             if len(masks) == len(ports):
                 voxels = pixel_to_voxel(masks, calibration_data)
@@ -204,6 +212,7 @@ def test_sim_pipeline_through_dashboard():
     finally:
         for stream in streams.values():
             stream.stop()
+        pool.shutdown()
         dashboard.stop()
 
 
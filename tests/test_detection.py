@@ -0,0 +1,269 @@
+"""Detection checks on synthetic frames and masks (no cameras, no rendering).
+
+A sky mask with a few object blobs of different sizes and hundreds of noise
+speckles: the connected-components detector must find the same blobs, in the
+same largest-first order and at the same centroids, as the original
+findContours detector. Prediction-gated detection must find the
+same objects inside its regions as a full-frame search, and keep a tracker
+locked on crossing objects between full-frame searches. Detection on a
+coarser pyramid level must refine to the full-resolution centroids, giving
+every pixel to one blob only. Timings are printed.
+
+Run as a plain script (matching the existing test convention):
+
+    python tests/test_detection.py
+"""
+
+import os
+import sys
+import time
+
+import cv2 as cv
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from pixel_to_voxel import settings
+from pixel_to_voxel.camera_extrinsics import mask_centroids
+from pixel_to_voxel.main import (_pyramid_detect, detect_motion, detection_level_timings,
+                                 detection_rois, pyramid_level)
+from pixel_to_voxel.tracker import MultiTargetTracker
+from pixel_to_voxel.simulator.rig import CameraRig, intrinsic_matrix, look_at_extrinsic
+from pixel_to_voxel.simulator import trajectory
+
+# (u, v, radius): objects at different ranges, largest first
+BLOBS = [(900.5, 300.0, 21), (301.0, 650.5, 12), (1500.0, 820.0, 6), (60.0, 1000.0, 3)]
+
+
+def noisy_sky_mask(seed=0, shape=(1079, 1917), speckles=600):
+    """Disc blobs plus isolated one- and two-pixel speckles, on an odd image
+    size."""
+    rng = np.random.default_rng(seed)
+    mask = np.zeros(shape, np.uint8)
+    for u, v, radius in BLOBS:
+        cv.circle(mask, (int(u * 16), int(v * 16)), radius * 16, 255, -1, shift=4)
+    ys = rng.integers(0, shape[0] - 1, speckles)
+    xs = rng.integers(0, shape[1] - 1, speckles)
+    far = np.min([np.hypot(xs - u, ys - v) - radius for u, v, radius in BLOBS], axis=0) > 8
+    mask[ys[far], xs[far]] = 255
+    pairs = far & (rng.random(speckles) < 0.5)
+    mask[ys[pairs], xs[pairs] + 1] = 255
+    return mask
+
+
+def timed(func, repeats=20):
+    func()
+    began = time.perf_counter()
+    for _ in range(repeats):
+        result = func()
+    return result, (time.perf_counter() - began) / repeats * 1e3
+
+
+def test_components_match_contours():
+    mask = noisy_sky_mask()
+    contours, contour_ms = timed(lambda: mask_centroids(mask, detector="contours"))
+    components, component_ms = timed(lambda: mask_centroids(mask, detector="components"))
+    assert len(contours) == len(components) == len(BLOBS), (contours, components)
+    for (u, v, _), found, reference in zip(BLOBS, components, contours):
+        assert np.hypot(found[0] - reference[0], found[1] - reference[1]) < 0.05, (found, reference)
+        assert np.hypot(found[0] - u, found[1] - v) < 0.25, (found, (u, v))
+    assert mask_centroids(mask, max_count=2, detector="components") == components[:2]
+    print(f"PASS: components match contours ({component_ms:.2f} ms vs {contour_ms:.2f} ms "
+          f"on a mask with {len(BLOBS)} blobs and ~600 speckles).")
+
+
+def test_pyramid_blobs_share_no_pixels():
+    """Two objects one coarse cell apart, bridged by faint pixels the coarse
+    level misses: the cell between them is searched for both, but each of its
+    pixels counts toward one blob only."""
+    rng = np.random.default_rng(4)
+    old = rng.integers(0, 20, (480, 640), dtype=np.uint8)
+    new = old.copy()
+    for u in (299, 332):
+        cv.circle(new, (u, 240), 12, 255, -1)
+    new[238:243, 310:322] = old[238:243, 310:322] + settings.PIXEL_NOISE_THRESHOLD + 5
+    mask, blobs = _pyramid_detect(new, old, 3)
+    assert len(blobs) == 2, blobs
+    assert sum(area for area, _, _ in blobs) == np.count_nonzero(mask), blobs
+    moments = cv.moments(mask, binaryImage=True)
+    u = sum(area * u for area, u, _ in blobs) / moments["m00"]
+    assert np.isclose(u, moments["m10"] / moments["m00"]), (u, moments)
+    print("PASS: pyramid blobs sharing a cell split its pixels between them.")
+
+
+def test_unknown_detector():
+    try:
+        mask_centroids(np.zeros((4, 4), np.uint8), detector="hough")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("an unknown detector must be rejected")
+    print("PASS: an unknown detector is rejected.")
+
+
+def uhd_camera():
+    """A 4K camera 50 m south of the scene, as a calibration dict."""
+    R, t = look_at_extrinsic((0.0, -48.0, 1.5), settings.SIM_LOOK_AT)
+    extrinsic = np.eye(4)
+    extrinsic[:3, :3], extrinsic[:3, 3] = R, t
+    return {"camera_matrix": intrinsic_matrix(3840, 2160, settings.SIM_FOV_DEG),
+            "dist_coeffs": np.zeros(5), "extrinsic": extrinsic}
+
+
+def test_detection_rois():
+    camera = uhd_camera()
+    shape = (2160, 3840)
+    K = camera["camera_matrix"]
+    on_axis = np.asarray(settings.SIM_LOOK_AT, dtype=np.float64)
+    (box,) = detection_rois([on_axis], camera, shape, pad=50)
+    cx, cy = int(K[0, 2]), int(K[1, 2])
+    assert box == (cx - 50, cy - 50, cx + 51, cy + 51), box
+    # Two nearby predictions share one region; one behind the camera has none
+    behind = np.array([0.0, -80.0, 1.5])
+    boxes = detection_rois([on_axis, on_axis + [0.5, 0.0, 0.0], behind], camera, shape, pad=50)
+    assert len(boxes) == 1 and boxes[0][2] - boxes[0][0] > 101, boxes
+    # Boxes that only touch merge too: a blob on the shared edge stays whole
+    R, t = camera["extrinsic"][:3, :3], camera["extrinsic"][:3, 3]
+    depth = (R @ on_axis + t)[2]
+    beside = R.T @ (depth * np.linalg.inv(K) @ [cx + 101.5, cy + 0.5, 1.0] - t)
+    assert detection_rois([beside], camera, shape, pad=50)[0][0] == box[2]
+    touching = detection_rois([on_axis, beside], camera, shape, pad=50)
+    assert len(touching) == 1, touching
+    # Clipped to the image
+    corner = detection_rois([[-60.0, 0.0, 0.0]], camera, shape, pad=50)
+    assert all(0 <= x0 < x1 <= shape[1] and 0 <= y0 < y1 <= shape[0]
+               for x0, y0, x1, y1 in corner), corner
+    print("PASS: regions of interest are centred, merged and clipped.")
+
+
+def test_roi_detection_matches_full_frame():
+    camera = uhd_camera()
+    rng = np.random.default_rng(2)
+    old = rng.integers(0, 20, (2160, 3840), dtype=np.uint8)
+    new = old.copy()
+    objects = [(1200, 700), (1290, 760), (3000, 1500)]
+    for u, v in objects:
+        cv.circle(new, (u, v), 15, 255, -1)
+    full = detect_motion(new, old, camera)[1]
+    rois = [(1100, 600, 1400, 900)]          # around the first two objects only
+    roi_mask, roi = detect_motion(new, old, camera, rois)
+    assert len(full) == 3 and len(roi) == 2
+    assert sorted(roi) == sorted(d for d in full if d[0] < 2000), (roi, full)
+    assert not roi_mask[:, 1400:].any() and roi_mask[600:900, 1100:1400].any()
+
+    # The per-camera cap keeps the largest blobs across all regions: a
+    # region full of small clutter does not crowd out a later region's target
+    clutter = new.copy()
+    for i in range(settings.MAX_DETECTIONS_PER_CAMERA + 5):
+        cv.circle(clutter, (110 + 12 * (i % 15), 110 + 12 * (i // 15)), 3, 255, -1)
+    capped = detect_motion(clutter, old, camera, [(100, 100, 300, 300), rois[0]])[1]
+    assert len(capped) == settings.MAX_DETECTIONS_PER_CAMERA
+    assert all(any(np.hypot(u - cu, v - cv_) < 0.5 for cu, cv_ in capped)
+               for u, v in objects[:2]), "a large target was cut for clutter"
+
+    _, full_ms = timed(lambda: detect_motion(new, old, camera), repeats=5)
+    _, roi_ms = timed(lambda: detect_motion(new, old, camera, rois), repeats=5)
+    print(f"PASS: ROI detection matches the full-frame search inside its regions "
+          f"(4K frame: {full_ms:.1f} ms full, {roi_ms:.2f} ms in one 300x300 region).")
+
+
+def test_prediction_gated_tracking():
+    """Crossing objects, detected in regions around the predictions with a
+    full-frame search every ROI_FULL_FRAME_EVERY frames, stay tracked."""
+    rig = CameraRig.from_positions(
+        positions=list(settings.SIM_CAMERA_POSITIONS) + [(-36.0, -33.0, 1.5)],
+        target=settings.SIM_LOOK_AT, width=settings.SIM_IMAGE_WIDTH,
+        height=settings.SIM_IMAGE_HEIGHT, fov_deg=settings.SIM_FOV_DEG)
+    calibration = {cam.id: {"camera_matrix": cam.K, "dist_coeffs": cam.dist_coeffs,
+                            "extrinsic": cam.extrinsic_4x4()} for cam in rig.cameras}
+    fps, start, frames = 30.0, 10, 45
+    paths = np.stack([trajectory.parabola(p0=spec["p0"], v0=spec["v0"],
+                                          num_frames=start + frames,
+                                          duration=(start + frames - 1) / fps)[start:]
+                      for spec in settings.SIM_TRAJECTORIES])
+    tracker = MultiTargetTracker(calibration)
+    gray_old, searched = {}, {"full": 0, "roi": 0}
+    for i in range(frames):
+        timestamp = i / fps
+        points = tracker.predicted_positions(timestamp)
+        gated = len(points) and i % settings.ROI_FULL_FRAME_EVERY
+        searched["roi" if gated else "full"] += 1
+        detections = {}
+        for cam in rig.cameras:
+            gray = np.zeros((cam.height, cam.width), np.uint8)
+            pixels, valid = cam.project(paths[:, i])
+            for (u, v), ok in zip(pixels, valid):
+                if ok:
+                    cv.circle(gray, (int(round(u)), int(round(v))), 7, 255, -1)
+            if cam.id in gray_old:
+                rois = (detection_rois(points, calibration[cam.id], gray.shape)
+                        if gated else None)
+                detections[cam.id] = detect_motion(gray, gray_old[cam.id],
+                                                   calibration[cam.id], rois)[1]
+            gray_old[cam.id] = gray
+        if detections:
+            tracker.step(detections, timestamp)
+
+    targets = tracker.state_list()
+    assert len(targets) == len(paths) and all(target["cameras"] for target in targets)
+    for point in paths[:, -1]:
+        error = min(np.linalg.norm(np.asarray(target["position"]) - point) for target in targets)
+        assert error < 1.5, f"no target within 1.5 m of {point} (closest {error:.2f} m)"
+    assert searched["roi"] > searched["full"]
+    print(f"PASS: prediction-gated detection kept {len(targets)} targets "
+          f"({searched['roi']} gated frames, {searched['full']} full-frame searches).")
+
+
+def test_pyramid_levels():
+    """4K frame pair with objects 7-41 px wide, one at the frame's corner:
+    every level finds them all at the full-resolution centroids, and none is
+    slower than full resolution."""
+    camera = uhd_camera()
+    rng = np.random.default_rng(3)
+    old = rng.integers(0, 20, (2160, 3840), dtype=np.uint8)
+    new = old.copy()
+    for u, v, radius in [(1200.3, 700.7, 15), (1290.0, 760.0, 9), (3000.5, 1500.25, 20),
+                         (3835.0, 2155.0, 12), (100.0, 100.0, 3)]:
+        cv.circle(new, (int(u * 16), int(v * 16)), radius * 16, 255, -1, shift=4)
+    full_mask, _ = detect_motion(new, old, camera)
+    # Refined blobs are measured in pixels, as the components detector does
+    full = mask_centroids(full_mask, detector="components")
+    timings = detection_level_timings(new, old, camera, levels=(0, 1, 2, 3), repeats=5)
+    for level in (1, 2, 3):
+        mask, found = detect_motion(new, old, camera, level=level)
+        assert len(found) == len(full) == 5, (level, found)
+        assert np.allclose(found, full, atol=1e-9), (level, found, full)
+        assert np.array_equal(mask > 0, full_mask > 0), f"level {level} mask differs"
+        assert np.allclose(timings[level][1], found)
+        # A coarser level must never cost more than full resolution (10%
+        # allowed for timer noise)
+        assert timings[level][0] <= 1.1 * timings[0][0], \
+            f"level {level} is slower than level 0: {timings}"
+    # The coarse level honours BLOB_DETECTOR too
+    saved = settings.BLOB_DETECTOR
+    try:
+        settings.BLOB_DETECTOR = "components"
+        for level in (1, 2, 3):
+            mask, found = detect_motion(new, old, camera, level=level)
+            assert np.allclose(found, full, atol=1e-9), (level, found, full)
+            assert np.array_equal(mask > 0, full_mask > 0), f"level {level} mask differs"
+    finally:
+        settings.BLOB_DETECTOR = saved
+    saved = settings.DETECTION_PYRAMID_LEVEL
+    try:
+        settings.DETECTION_PYRAMID_LEVEL = {0: 2}
+        assert pyramid_level(0) == 2 and pyramid_level(1) == 0
+    finally:
+        settings.DETECTION_PYRAMID_LEVEL = saved
+    print("PASS: pyramid levels refine to the full-resolution centroids (4K: "
+          + ", ".join(f"level {level} {ms:.1f} ms" for level, (ms, _) in timings.items()) + ").")
+
+
+if __name__ == "__main__":
+    test_components_match_contours()
+    test_pyramid_blobs_share_no_pixels()
+    test_unknown_detector()
+    test_detection_rois()
+    test_roi_detection_matches_full_frame()
+    test_prediction_gated_tracking()
+    test_pyramid_levels()
@@ -8,6 +8,10 @@ try:
     import pixel_to_voxel.main
     import pixel_to_voxel.camera_calibration
     import pixel_to_voxel.settings
+    import pixel_to_voxel.occupancy
+    import pixel_to_voxel.pipeline
+    import pixel_to_voxel.shared_capture
+    import pixel_to_voxel.camera_node
     print("Imports successful")
 except ImportError as e:
     print(f"Import failed: {e}")
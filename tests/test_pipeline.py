@@ -0,0 +1,185 @@
+"""Staged-pipeline check (no cameras, no rendering).
+
+Pins down the two queue drop policies, then runs a source feeding a
+never-drop "track" stage and a slow drop-oldest "display" stage: the tracker
+must see every frame in capture order with its timestamp while the display
+stage skips to the latest, and each stage must report its throughput. A
+failing stage must surface from Pipeline.wait(). The load shedder must pick
+levels from measured stage costs against the frame deadline.
+
+Run as a plain script (matching the existing test convention):
+
+    python tests/test_pipeline.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.getcwd())
+
+from pixel_to_voxel.pipeline import BoundedQueue, LoadShedder, Pipeline
+
+
+def test_drop_policies():
+    latest = BoundedQueue(2, drop="oldest")
+    for item in range(5):
+        assert latest.put(item)
+    assert latest.dropped == 3 and [latest.get(), latest.get()] == [3, 4]
+
+    ordered = BoundedQueue(2, drop="block")
+    produced = threading.Thread(target=lambda: [ordered.put(i) for i in range(6)])
+    produced.start()
+    time.sleep(0.05)
+    assert len(ordered) == 2 and produced.is_alive(), "a full block queue must hold the producer"
+    received = [ordered.get(timeout=1.0) for _ in range(6)]
+    produced.join(1.0)
+    assert received == list(range(6)) and ordered.dropped == 0
+
+    ordered.close()
+    assert not ordered.put(99) and ordered.get(timeout=0.1) is None
+    # A closed queue refuses items without touching what it still holds
+    latest.put(5)
+    latest.put(6)
+    latest.close()
+    assert not latest.put(7) and latest.dropped == 3
+    assert [latest.get(), latest.get()] == [5, 6]
+    try:
+        BoundedQueue(1, drop="newest")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("an unknown drop policy must be rejected")
+    print("PASS: block queues keep every item in order, oldest-drop queues keep the latest.")
+
+
+def test_staged_flow():
+    frames = 60
+    counter = iter(range(frames))
+    tracked, displayed = [], []
+
+    def capture():
+        seq = next(counter, None)
+        return None if seq is None else {"seq": seq, "timestamp": seq / 30.0}
+
+    def track(packet):
+        tracked.append((packet["seq"], packet["timestamp"]))
+        return packet
+
+    def display(packet):
+        time.sleep(0.02)   # a slow JPEG encode must not hold up tracking
+        displayed.append(packet["seq"])
+
+    pipeline = Pipeline()
+    pipeline.add("capture", capture, period=0.002)
+    pipeline.add("track", track, 2, "block")
+    pipeline.add("display", display, 1, "oldest")
+    pipeline.start()
+    deadline = time.time() + 5.0
+    while len(tracked) < frames and time.time() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    stats = pipeline.stats()
+    pipeline.stop()
+
+    assert tracked == [(seq, seq / 30.0) for seq in range(frames)], "tracker lost or reordered frames"
+    assert displayed == sorted(set(displayed)) and len(displayed) < frames
+    assert stats["display"]["dropped"] > 0 and stats["track"]["dropped"] == 0
+    for name in ("capture", "track", "display"):
+        assert stats[name]["rate"] and stats[name]["busy_ms"] is not None, (name, stats[name])
+    assert stats["display"]["busy_ms"] >= 15.0
+    print(f"PASS: tracker saw all {frames} frames in order; display showed {len(displayed)}.")
+
+
+def test_stage_failure():
+    def capture():
+        return {}
+
+    def broken(packet):
+        raise RuntimeError("stage failed")
+
+    pipeline = Pipeline()
+    pipeline.add("capture", capture, period=0.005)
+    pipeline.add("broken", broken)
+    pipeline.start()
+    try:
+        pipeline.wait(poll=0.01)
+    except RuntimeError as exc:
+        assert "stage failed" in str(exc)
+    else:
+        raise AssertionError("a failing stage must stop the pipeline")
+    finally:
+        pipeline.stop()
+    print("PASS: a failing stage surfaces from Pipeline.wait().")
+
+
+def test_load_shedding():
+    """Levels follow the measured costs against the frame deadline, with
+    hysteresis on the way down; a backlog before tracking escalates at once."""
+    pipeline = Pipeline()
+    for name in ("capture", "detect", "track", "carve", "publish"):
+        pipeline.add(name, lambda item=None: item, 2, "block")
+    levels = [(1, 1, 80), (2, 1, 80), (2, 2, 70), (4, 4, 50)]
+    shedder = LoadShedder(1.0 / 30.0, levels, budget=1.0, hysteresis=0.8)
+
+    def costs(carve_ms, publish_ms=6.0):
+        for name, ms in (("capture", 2.0), ("detect", 5.0), ("track", 2.0),
+                         ("carve", carve_ms), ("publish", publish_ms)):
+            pipeline.stage(name).busy_s = ms / 1e3
+        return shedder.update(pipeline)
+
+    assert costs(carve_ms=10.0) == 0 and pipeline.stage("carve").stride == 1
+    # 9 ms of critical work leaves ~24 ms of the 33 ms frame for the rest
+    assert costs(carve_ms=30.0) == 1, "a carve over budget must be halved first"
+    assert pipeline.stage("carve").stride == 2 and pipeline.stage("publish").stride == 1
+    assert costs(carve_ms=80.0) == 3 and shedder.jpeg_quality == 50
+    assert pipeline.stage("carve").stride == 4 and pipeline.stage("publish").stride == 4
+    # Level 1 would now fit, but only barely (31 ms, 0.93 of the frame): hold
+    assert costs(carve_ms=32.0) == 3
+    assert costs(carve_ms=20.0) == 1, "a clear margin steps back down"
+    assert costs(carve_ms=5.0) == 0
+
+    for _ in range(2):
+        pipeline.stage("track").inbox.put({})
+    assert costs(carve_ms=5.0) == 1, "a full tracking queue must escalate"
+    assert shedder.state() == {"level": 1, "levels": 4, "carve_every": 2,
+                               "publish_every": 1, "jpeg_quality": 80,
+                               "load": round(shedder.load, 2)}
+    print("PASS: load shedding degrades carving and display first, with hysteresis.")
+
+
+def test_stage_stride():
+    """A strided stage works on every n-th item and hands the rest to skip()."""
+    counter = iter(range(12))
+    worked, skipped, passed = [], [], []
+
+    def work(seq):
+        worked.append(seq)
+        return seq
+
+    def skip(seq):
+        skipped.append(seq)
+        return -seq
+
+    pipeline = Pipeline()
+    pipeline.add("capture", lambda: next(counter, None), period=0.001)
+    pipeline.add("carve", work, 16, "block", skip=skip).stride = 3
+    pipeline.add("sink", passed.append, 16, "block")
+    pipeline.start()
+    deadline = time.time() + 2.0
+    while len(passed) < 12 and time.time() < deadline:
+        time.sleep(0.01)
+    pipeline.stop()
+    assert worked == [2, 5, 8, 11] and len(skipped) == 8
+    assert passed == [seq if seq in worked else -seq for seq in range(12)]
+    assert pipeline.stage("carve").processed == 4
+    print("PASS: strided stages forward skipped items through skip().")
+
+
+if __name__ == "__main__":
+    test_drop_policies()
+    test_staged_flow()
+    test_stage_failure()
+    test_load_shedding()
+    test_stage_stride()
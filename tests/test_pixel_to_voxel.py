@@ -14,6 +14,8 @@ Run as a plain script (matching the existing test convention):
 
 import os
 import sys
+import tempfile
+import threading
 
 import cv2 as cv
 import numpy as np
@@ -21,6 +23,7 @@ import numpy as np
 sys.path.append(os.getcwd())
 
 from pixel_to_voxel import settings
+from pixel_to_voxel import main as pipeline
 from pixel_to_voxel.main import pixel_to_voxel
 from pixel_to_voxel.simulator.rig import (Camera, CameraRig, intrinsic_matrix,
                                           look_at_extrinsic)
@@ -28,6 +31,9 @@ from pixel_to_voxel.simulator import trajectory
 
 SPHERE_RADIUS = settings.SIM_OBJECT_RADIUS  # match the simulated object
 
+# Only test_carve_table_disk_cache persists tables (to a temporary directory)
+settings.CARVE_TABLE_CACHE = False
+
 
 def silhouette_mask(cam, center_world, radius):
     """Binary mask with the projected silhouette of a sphere: a filled disc at
@@ -160,6 +166,529 @@ def test_partial_visibility():
     print("PASS: visibility-aware carving handles the divergent rig (edge zones + ghost veto).")
 
 
+def test_engines_match_dense():
+    """Every other carving engine must carve exactly the dense engine's voxels —
+    on clean silhouettes, on the divergent rig's edge zones and ghosts, and on
+    masks littered with single-pixel speckle (which defeats coarse pruning
+    the most)."""
+    rng = np.random.default_rng(0)
+    scenes = []
+    rig = divergent_rig()
+    for point in ([14.0, 10.0, 20.0], [-5.0, 10.0, 20.0], [0.0, 0.0, 25.0]):
+        scenes.append((rig, {cam.id: silhouette_mask(cam, point, SPHERE_RADIUS)
+                             for cam in rig.cameras}))
+    rig = CameraRig.from_positions(
+        positions=settings.SIM_CAMERA_POSITIONS, target=settings.SIM_LOOK_AT,
+        width=settings.SIM_IMAGE_WIDTH, height=settings.SIM_IMAGE_HEIGHT,
+        fov_deg=settings.SIM_FOV_DEG)
+    for point in trajectory.parabola(p0=settings.SIM_TRAJECTORY_P0,
+                                     v0=settings.SIM_TRAJECTORY_V0, num_frames=4,
+                                     duration=settings.SIM_TRAJECTORY_DURATION):
+        masks = {}
+        for cam in rig.cameras:
+            mask = silhouette_mask(cam, point, 3.0 * SPHERE_RADIUS)
+            mask[rng.random(mask.shape) < 0.002] = 255
+            masks[cam.id] = mask
+        scenes.append((rig, masks))
+
+    for rig, masks in scenes:
+        cameras = {cam.id: {"camera_matrix": cam.K, "extrinsic": cam.extrinsic_4x4()}
+                   for cam in rig.cameras}
+        dense = pixel_to_voxel(masks, cameras, engine="dense")
+        for engine in ("hierarchical", "inverted", "bricks"):
+            voxels = pixel_to_voxel(masks, cameras, engine=engine)
+            assert voxels.shape == dense.shape and np.array_equal(voxels, dense), \
+                f"{engine} carved {len(voxels)} voxels, dense {len(dense)}"
+    print("PASS: hierarchical, inverted and brick carving reproduce the dense occupied set.")
+
+
+def test_chunked_tables_and_indices():
+    """Carve tables built in small projection chunks carve the same voxels,
+    and carve_indices() + voxel_centers() agree with pixel_to_voxel()."""
+    rig = divergent_rig()
+    cameras = {cam.id: {"camera_matrix": cam.K, "extrinsic": cam.extrinsic_4x4()}
+               for cam in rig.cameras}
+    masks = {cam.id: silhouette_mask(cam, [-5.0, 10.0, 20.0], 3.0 * SPHERE_RADIUS)
+             for cam in rig.cameras}
+    pipeline._carve_cache["key"] = None
+    whole = pixel_to_voxel(masks, cameras, engine="dense")
+    saved_chunk = settings.CARVE_TABLE_CHUNK
+    settings.CARVE_TABLE_CHUNK = 12345
+    try:
+        pipeline._carve_cache["key"] = None
+        indices = pipeline.carve_indices(masks, cameras, engine="dense")
+    finally:
+        settings.CARVE_TABLE_CHUNK = saved_chunk
+        pipeline._carve_cache["key"] = None
+    assert len(whole) and np.array_equal(pipeline.voxel_centers(indices), whole)
+    assert np.all(np.diff(indices) > 0), "carve_indices() must be sorted and unique"
+    print("PASS: chunked carve tables and index-based carving agree.")
+
+
+def test_carve_table_disk_cache():
+    """Tables saved by one run are memory-mapped by the next (a fresh
+    in-memory cache stands in for a restart) and carve the same voxels."""
+    rig = divergent_rig()
+    cameras = {cam.id: {"camera_matrix": cam.K, "extrinsic": cam.extrinsic_4x4()}
+               for cam in rig.cameras}
+    point = [0.0, 0.0, 25.0]
+    masks = {cam.id: silhouette_mask(cam, point, SPHERE_RADIUS) for cam in rig.cameras}
+    saved_path = settings.CALIBRATION_DATA_PATH
+    with tempfile.TemporaryDirectory() as directory:
+        settings.CALIBRATION_DATA_PATH = directory + os.sep
+        settings.CARVE_TABLE_CACHE = True
+        try:
+            pipeline._carve_cache["key"] = None
+            built = pixel_to_voxel(masks, cameras, engine="dense")
+            assert len(os.listdir(directory)) == 1 + 2 * len(cameras), os.listdir(directory)
+
+            pipeline._carve_cache["key"] = None
+            loaded = pixel_to_voxel(masks, cameras, engine="dense")
+            assert isinstance(pipeline._carve_cache["visible_count"], np.memmap), \
+                "second start rebuilt the tables instead of mapping them"
+            assert np.array_equal(built, loaded) and len(loaded)
+
+            # A different calibration must not pick up the saved tables
+            moved = {port: dict(cam) for port, cam in cameras.items()}
+            moved[0]["extrinsic"] = cameras[0]["extrinsic"].copy()
+            moved[0]["extrinsic"][0, 3] += 1.0
+            pixel_to_voxel(masks, moved, engine="dense")
+            assert not isinstance(pipeline._carve_cache["visible_count"], np.memmap)
+            # ... and saving its tables prunes the superseded set
+            digests = {name.split("_")[1] for name in os.listdir(directory)}
+            assert len(digests) == 1 and len(os.listdir(directory)) == 1 + 2 * len(cameras), \
+                os.listdir(directory)
+        finally:
+            pipeline._carve_cache["key"] = None
+            settings.CALIBRATION_DATA_PATH = saved_path
+            settings.CARVE_TABLE_CACHE = False
+    print("PASS: carve tables persist to disk, memory-map on the next start and are "
+          "pruned after recalibrating.")
+
+
+def test_prepare_carving():
+    """Tables warmed up on a background thread from the image sizes alone are
+    the ones the first carve uses — nothing is rebuilt on the pipeline thread."""
+    rig = divergent_rig()
+    cameras = {cam.id: {"camera_matrix": cam.K, "extrinsic": cam.extrinsic_4x4()}
+               for cam in rig.cameras}
+    masks = {cam.id: silhouette_mask(cam, [0.0, 0.0, 25.0], SPHERE_RADIUS)
+             for cam in rig.cameras}
+    shapes = {cam.id: (cam.height, cam.width) for cam in rig.cameras}
+    expected = None
+    for engine in ("dense", "inverted", "hierarchical", "bricks"):
+        pipeline._carve_cache["key"] = None
+        pipeline._hierarchy_cache["key"] = None
+        warm_up = threading.Thread(target=pipeline.prepare_carving,
+                                   args=(shapes, cameras, engine))
+        warm_up.start()
+        warm_up.join()
+        built = (pipeline._carve_cache["visible_count"], pipeline._carve_cache["inverted"],
+                 pipeline._carve_cache["bricks"], pipeline._hierarchy_cache["footprints"])
+        voxels = pixel_to_voxel(masks, cameras, engine=engine)
+        after = (pipeline._carve_cache["visible_count"], pipeline._carve_cache["inverted"],
+                 pipeline._carve_cache["bricks"], pipeline._hierarchy_cache["footprints"])
+        assert all(a is b for a, b in zip(built, after)), f"{engine} rebuilt its tables"
+        expected = voxels if expected is None else expected
+        assert np.array_equal(voxels, expected) and len(voxels)
+    print("PASS: carving warms up off-thread from image sizes alone.")
+
+
+def test_target_patches():
+    """A fine patch centred on a target carves exactly what projecting every
+    patch voxel would, and on the sim rig its hull is about the object's size:
+    at least the sphere (a visual hull contains the object) and within the
+    two-view lens around it."""
+    rig = CameraRig.from_positions(
+        positions=settings.SIM_CAMERA_POSITIONS, target=settings.SIM_LOOK_AT,
+        width=settings.SIM_IMAGE_WIDTH, height=settings.SIM_IMAGE_HEIGHT,
+        fov_deg=settings.SIM_FOV_DEG)
+    cameras = {cam.id: {"camera_matrix": cam.K, "extrinsic": cam.extrinsic_4x4()}
+               for cam in rig.cameras}
+    point = np.asarray(trajectory.parabola(
+        p0=settings.SIM_TRAJECTORY_P0, v0=settings.SIM_TRAJECTORY_V0, num_frames=3,
+        duration=settings.SIM_TRAJECTORY_DURATION)[1])
+    masks = {cam.id: silhouette_mask(cam, point, SPHERE_RADIUS) for cam in rig.cameras}
+    # The tracker's estimate is off-centre by a few centimetres; target 8 is
+    # somewhere no mask supports
+    targets = [{"id": 7, "position": list(point + [0.12, -0.07, 0.03])},
+               {"id": 8, "position": list(point + [10.0, 0.0, 10.0])}]
+    patches = pipeline.carve_target_patches(masks, cameras, targets)
+    assert set(patches) == {7, 8}
+    assert patches[8] == {"volume": 0.0, "extent": [0.0, 0.0, 0.0]}, patches[8]
+
+    # Brute force over every voxel of target 7's patch
+    size = settings.TARGET_PATCH_VOXEL_SIZE
+    count = int(round(settings.TARGET_PATCH_EXTENT / size))
+    offsets = (np.arange(count) - (count - 1) / 2.0) * size
+    grid = np.meshgrid(*[c + offsets for c in targets[0]["position"]], indexing="ij")
+    points = np.stack(grid, axis=-1).reshape(-1, 3)
+    visible = np.zeros(len(points), np.int32)
+    support = np.zeros(len(points), np.int32)
+    for port, mask in masks.items():
+        indices, u, v = pipeline._project_to_pixels(points, cameras[port], mask.shape)
+        visible[indices] += 1
+        support[indices[mask[v, u] > 0]] += 1
+    occupied = points[(visible >= 2) & (support == visible)]
+    assert abs(patches[7]["volume"] - len(occupied) * size ** 3) < 1e-3, patches[7]
+    extent = np.ptp(occupied, axis=0) + size
+    assert np.allclose(patches[7]["extent"], extent, atol=0.011), (patches[7], extent)
+
+    sphere = 4.0 / 3.0 * np.pi * SPHERE_RADIUS ** 3
+    print(f"Patch hull: {patches[7]['volume']:.3f} m^3 (sphere {sphere:.3f} m^3), "
+          f"extent {patches[7]['extent']} m")
+    assert 0.8 * sphere < patches[7]["volume"] < 4.0 * sphere, patches[7]
+    assert all(1.6 * SPHERE_RADIUS < e < 6.0 * SPHERE_RADIUS for e in patches[7]["extent"])
+    print("PASS: target patches carve a fine hull of the object's size.")
+
+
+def test_footprint_engine():
+    """The footprint engine supports a voxel wherever any mask pixel falls in
+    its projected footprint: it equals an integral-image box-sum reference,
+    contains the dense hull, and still finds an object far thinner than a
+    voxel, whose silhouette slips between the dense engine's voxel centres."""
+    rig = CameraRig.from_positions(
+        positions=settings.SIM_CAMERA_POSITIONS, target=settings.SIM_LOOK_AT,
+        width=settings.SIM_IMAGE_WIDTH, height=settings.SIM_IMAGE_HEIGHT,
+        fov_deg=settings.SIM_FOV_DEG)
+    cameras = {cam.id: {"camera_matrix": cam.K, "extrinsic": cam.extrinsic_4x4()}
+               for cam in rig.cameras}
+    radius = 0.1 * settings.VOXEL_SIZE
+    dense_found = 0
+    # Mid-flight only: the arc's ends sit in the image corners
+    for point in trajectory.parabola(p0=settings.SIM_TRAJECTORY_P0,
+                                     v0=settings.SIM_TRAJECTORY_V0, num_frames=6,
+                                     duration=settings.SIM_TRAJECTORY_DURATION)[1:-1]:
+        masks = {cam.id: silhouette_mask(cam, point, radius) for cam in rig.cameras}
+        dense = pipeline.carve_indices(masks, cameras, engine="dense")
+        footprint = pipeline.carve_indices(masks, cameras, engine="footprint")
+        assert np.isin(dense, footprint).all(), "footprint hull must contain the dense one"
+        assert len(footprint), f"footprint carving missed the thin object at {point}"
+        spread = np.linalg.norm(pipeline.voxel_centers(footprint) - point, axis=1).max()
+        assert spread < 3.0 * settings.VOXEL_SIZE, spread
+        dense_found += bool(len(dense))
+
+        # Reference: box sums over each mask's integral image
+        tables = pipeline._carve_cache
+        support = np.zeros(len(tables["visible_count"]), np.uint8)
+        for port, mask in masks.items():
+            indices, pixels = tables["per_camera"][port]
+            height, width = mask.shape
+            K, extrinsic = cameras[port]["camera_matrix"], cameras[port]["extrinsic"]
+            depth = pipeline.voxel_centers(indices) @ extrinsic[2, :3] + extrinsic[2, 3]
+            half_u = np.rint(K[0, 0] * settings.VOXEL_SIZE / 2 / depth).astype(int)
+            half_v = np.rint(K[1, 1] * settings.VOXEL_SIZE / 2 / depth).astype(int)
+            v, u = np.divmod(pixels, width)
+            u0, u1 = np.maximum(u - half_u, 0), np.minimum(u + half_u, width - 1) + 1
+            v0, v1 = np.maximum(v - half_v, 0), np.minimum(v + half_v, height - 1) + 1
+            integral = cv.integral((mask > 0).view(np.uint8))
+            hit = (integral[v1, u1] - integral[v0, u1] - integral[v1, u0]
+                   + integral[v0, u0]) > 0
+            support[indices[hit]] += 1
+        visible = tables["visible_count"]
+        reference = np.flatnonzero((visible >= 2) & (support == visible))
+        assert np.array_equal(footprint, reference), "footprint carve != box-sum reference"
+    print(f"Thin object ({radius:.2f} m radius): dense found it in {dense_found}/4 frames, "
+          "footprint in 4/4")
+    print("PASS: footprint carving catches silhouettes between voxel centres.")
+
+
+def test_frustum_grid():
+    """The frustum grid puts each cell on its reference-camera ray at its bin
+    depth, needs far fewer cells than the box, and carves the object with
+    every table-based engine agreeing."""
+    rig = CameraRig.from_positions(
+        positions=settings.SIM_CAMERA_POSITIONS, target=settings.SIM_LOOK_AT,
+        width=settings.SIM_IMAGE_WIDTH, height=settings.SIM_IMAGE_HEIGHT,
+        fov_deg=settings.SIM_FOV_DEG)
+    cameras = {cam.id: {"camera_matrix": cam.K, "extrinsic": cam.extrinsic_4x4()}
+               for cam in rig.cameras}
+    box_cells = int(np.prod(pipeline.voxel_grid_shape()))
+    settings.VOXEL_GRID_TYPE = "frustum"
+    try:
+        shapes = {cam.id: (cam.height, cam.width) for cam in rig.cameras}
+        pipeline.prepare_carving(shapes, cameras, engine="dense")
+        shape = pipeline.voxel_grid_shape()
+        cells = int(np.prod(shape))
+        print(f"Frustum grid {shape}: {cells} cells vs {box_cells} in the box")
+        assert cells * 2 < box_cells, "frustum grid should need far fewer cells"
+        # Coverage is a share of the configured box: cells outside it do not count
+        in_box = pipeline._in_grid_box(pipeline.voxel_centers(np.arange(cells))).sum()
+        coverage = pipeline.carve_coverage()
+        assert in_box < cells and coverage["total"] == in_box, (in_box, coverage)
+        assert coverage["usable"] <= coverage["total"]
+
+        # Cell centres sit on their pixel block's centre ray, at the bin depth
+        reference = rig.cameras[0]
+        step = settings.FRUSTUM_PIXEL_BIN
+        probe = np.random.default_rng(0).integers(0, cells, 500)
+        col, row, depth_bin = np.unravel_index(probe, shape)
+        pixels, valid = reference.project(pipeline.voxel_centers(probe))
+        assert valid.all()
+        assert np.allclose(pixels[:, 0], np.minimum(col * step + step / 2 - 0.5,
+                                                    reference.width - 1), atol=1e-6)
+        assert np.allclose(pixels[:, 1], np.minimum(row * step + step / 2 - 0.5,
+                                                    reference.height - 1), atol=1e-6)
+        depth = pipeline.voxel_centers(probe) @ reference.R[2] + reference.t[2]
+        assert np.allclose(depth, pipeline._frustum["depths"][depth_bin])
+        # The dashboard's description of the layout reproduces the cell edges
+        info = pipeline.voxel_grid_info()
+        assert info["type"] == "frustum" and len(info["near"]) == len(info["far"]) == 4
+        edges = ((pipeline.voxel_centers(probe) @ info["axis"] + info["offset"])
+                 * info["edge_per_metre"])
+        assert np.allclose(edges, pipeline._voxel_edges(probe))
+
+        for point in trajectory.parabola(p0=settings.SIM_TRAJECTORY_P0,
+                                         v0=settings.SIM_TRAJECTORY_V0, num_frames=6,
+                                         duration=settings.SIM_TRAJECTORY_DURATION):
+            masks = {cam.id: silhouette_mask(cam, point, SPHERE_RADIUS) for cam in rig.cameras}
+            dense = pipeline.carve_indices(masks, cameras, engine="dense")
+            assert len(dense), f"frustum carve lost the object at {point}"
+            for engine in ("inverted", "bricks"):
+                assert np.array_equal(pipeline.carve_indices(masks, cameras, engine=engine),
+                                      dense), f"{engine} disagrees on the frustum grid"
+            footprint = pipeline.carve_indices(masks, cameras, engine="footprint")
+            assert np.isin(dense, footprint).all()
+            edge = pipeline._voxel_edges(dense).max()
+            centroid_err = np.linalg.norm(pipeline.voxel_centers(dense).mean(axis=0) - point)
+            assert centroid_err < 2.0 * edge, f"frustum centroid off by {centroid_err} m"
+        try:
+            pipeline.carve_indices(masks, cameras, engine="hierarchical")
+            raise AssertionError("hierarchical carving must refuse the frustum grid")
+        except ValueError:
+            pass
+        # main() checks the pair at startup, before any warm-up thread runs
+        for engine in ("dense", "inverted", "bricks", "footprint"):
+            pipeline.check_carve_settings(engine)
+        try:
+            pipeline.check_carve_settings("hierarchical")
+            raise AssertionError("the startup check must refuse hierarchical on the frustum grid")
+        except ValueError:
+            pass
+    finally:
+        settings.VOXEL_GRID_TYPE = "box"
+    assert int(np.prod(pipeline.voxel_grid_shape())) == box_cells
+    assert pipeline.voxel_grid_info()["type"] == "box"
+    print("PASS: the frustum grid carves the object with far fewer cells.")
+
+
+def test_two_camera_cropping():
+    """Carve tables keep only voxels seen by two or more cameras, and
+    carve_coverage() reports that share of the grid and its bounds."""
+    rig = divergent_rig()
+    cameras = {cam.id: {"camera_matrix": cam.K, "extrinsic": cam.extrinsic_4x4()}
+               for cam in rig.cameras}
+    shapes = {cam.id: (cam.height, cam.width) for cam in rig.cameras}
+    pipeline.prepare_carving(shapes, cameras, engine="dense")
+    visible = pipeline._carve_cache["visible_count"]
+    for port, (indices, pixels) in pipeline._carve_cache["per_camera"].items():
+        assert len(indices) == len(pixels) and (visible[indices] >= 2).all(), \
+            f"camera {port} kept single-view voxels"
+    usable = visible >= 2
+    assert sum(len(t[0]) for t in pipeline._carve_cache["per_camera"].values()) \
+        == int(visible[usable].sum()), "cropping dropped usable entries"
+
+    coverage = pipeline.carve_coverage()
+    assert coverage["total"] == len(visible) and coverage["usable"] == usable.sum()
+    assert abs(coverage["fraction"] - usable.mean()) < 1e-12
+    centers = pipeline.voxel_centers(np.flatnonzero(usable))
+    assert np.allclose(coverage["bounds"][0], centers.min(axis=0))
+    assert np.allclose(coverage["bounds"][1], centers.max(axis=0))
+    print(f"Divergent rig: {coverage['fraction']:.0%} of the grid is carvable; tables "
+          f"keep {visible[usable].sum() / visible.sum():.0%} of the projected entries")
+    print("PASS: carve tables are cropped to the two-camera coverage region.")
+
+
+def test_batch_carving():
+    """carve_indices_batch() over a (T, H, W) stack per camera gives exactly
+    the per-frame carve, across its 64-frame blocks and for bool masks."""
+    rng = np.random.default_rng(2)
+    rig = divergent_rig()
+    cameras = {cam.id: {"camera_matrix": cam.K, "extrinsic": cam.extrinsic_4x4()}
+               for cam in rig.cameras}
+    frames = 70
+    points = np.linspace([-12.0, 5.0, 15.0], [14.0, 10.0, 25.0], frames)
+    stacks = {}
+    for cam in rig.cameras:
+        stack = np.stack([silhouette_mask(cam, point, 2.0 * SPHERE_RADIUS) for point in points])
+        stack[rng.random(stack.shape) < 0.001] = 255
+        stack[frames // 2] = 0      # a frame where this camera sees nothing
+        stacks[cam.id] = stack
+    batch = pipeline.carve_indices_batch(stacks, cameras)
+    assert len(batch) == frames
+    for frame in range(frames):
+        expected = pipeline.carve_indices({port: stack[frame] for port, stack in stacks.items()},
+                                          cameras, engine="dense")
+        assert np.array_equal(batch[frame], expected), f"batch differs at frame {frame}"
+    assert sum(len(b) for b in batch), "the sequence carved nothing"
+    as_bool = pipeline.carve_indices_batch({port: stack > 0 for port, stack in stacks.items()},
+                                           cameras)
+    assert all(np.array_equal(a, b) for a, b in zip(as_bool, batch))
+    print("PASS: batch carving matches frame-by-frame carving.")
+
+
+def test_voxel_clusters():
+    """Sparse 26-connected labelling: corner-touching voxels join, voxels on
+    opposite edges of the grid never wrap into one cluster, and two carved
+    spheres become two clusters, each attributed to the target on it."""
+    shape = pipeline.voxel_grid_shape()
+    flat = lambda *ijk: np.ravel_multi_index(np.array(ijk).T, shape)
+    block = np.stack(np.meshgrid(*[np.arange(4, 7)] * 3, indexing="ij"), axis=-1).reshape(-1, 3)
+    groups = [
+        flat(*block),                                     # a solid 3x3x3 block
+        flat((10, 10, 10), (11, 11, 11), (12, 12, 10)),   # corner/edge contacts only
+        flat((0, 0, shape[2] - 1)),                       # end of one z-run ...
+        flat((0, 1, 0)),                                  # ... and start of the next
+        flat((shape[0] - 1, shape[1] - 1, shape[2] - 1)),
+    ]
+    indices = np.sort(np.concatenate(groups))
+    labels = pipeline.label_voxel_clusters(indices)
+    expected = np.concatenate([[g] * len(members) for g, members in enumerate(groups)])
+    expected = expected[np.argsort(np.concatenate(groups))]
+    assert len(set(zip(labels, expected))) == len(groups) == labels.max() + 1, \
+        f"clusters {labels} != {expected}"
+    assert len(pipeline.voxel_clusters(np.empty(0, dtype=np.int64))) == 0
+
+    rig = CameraRig.from_positions(
+        positions=settings.SIM_CAMERA_POSITIONS, target=settings.SIM_LOOK_AT,
+        width=settings.SIM_IMAGE_WIDTH, height=settings.SIM_IMAGE_HEIGHT,
+        fov_deg=settings.SIM_FOV_DEG)
+    cameras = {cam.id: {"camera_matrix": cam.K, "extrinsic": cam.extrinsic_4x4()}
+               for cam in rig.cameras}
+    spheres = [np.array([-8.0, 0.0, 20.0]), np.array([8.0, 2.0, 28.0])]
+    masks = {cam.id: np.maximum(*[silhouette_mask(cam, c, SPHERE_RADIUS) for c in spheres])
+             for cam in rig.cameras}
+    indices = pipeline.carve_indices(masks, cameras)
+    targets = [{"id": 5, "position": list(spheres[1] + 0.3)},
+               {"id": 9, "position": list(spheres[0] - 0.3)},
+               {"id": 11, "position": [0.0, 10.0, 45.0]}]
+    clusters = pipeline.voxel_clusters(indices, targets)
+    assert len(clusters) == 2, clusters
+    assert sum(c["count"] for c in clusters) == len(indices)
+    for cluster in clusters:
+        centroid = np.array(cluster["centroid"])
+        owner = min(range(2), key=lambda i: np.linalg.norm(centroid - spheres[i]))
+        assert np.linalg.norm(centroid - spheres[owner]) < 2.0 * settings.VOXEL_SIZE
+        assert cluster["target"] == (9, 5)[owner], cluster
+        assert np.all(np.array(cluster["min"]) <= centroid)
+        assert np.all(centroid <= np.array(cluster["max"]))
+        assert abs(cluster["volume"] - cluster["count"] * settings.VOXEL_SIZE ** 3) < 1e-3
+    print("PASS: carved voxels split into per-object clusters.")
+
+
+def test_distortion_aware_carving():
+    """Masks from raw (distorted) frames carve the object when the cameras
+    carry their dist_coeffs — every engine agreeing — and their centroids,
+    undistorted, are the ideal pinhole projections the tracker expects."""
+    from pixel_to_voxel.camera_extrinsics import undistort_centroids
+    rig = CameraRig.from_positions(
+        positions=settings.SIM_CAMERA_POSITIONS, target=settings.SIM_LOOK_AT,
+        width=settings.SIM_IMAGE_WIDTH, height=settings.SIM_IMAGE_HEIGHT,
+        fov_deg=settings.SIM_FOV_DEG)
+    dist = np.array([-0.25, 0.08, 0.001, -0.001, 0.0])
+    cameras = {cam.id: {"camera_matrix": cam.K, "extrinsic": cam.extrinsic_4x4(),
+                        "dist_coeffs": dist} for cam in rig.cameras}
+
+    def raw_mask(cam, point, radius):
+        """The sphere's disc where the distorting lens images its centre."""
+        mask = np.zeros((cam.height, cam.width), dtype=np.uint8)
+        extrinsic = cam.extrinsic_4x4()
+        centre = extrinsic[:3, :3] @ point + extrinsic[:3, 3]
+        uv = cv.projectPoints(centre.reshape(1, 1, 3), np.zeros(3), np.zeros(3),
+                              cam.K, dist)[0].reshape(2)
+        pixel_radius = max(int(round(cam.K[0, 0] * radius / centre[2])), 1)
+        cv.circle(mask, (int(round(uv[0])), int(round(uv[1]))), pixel_radius, 255, thickness=-1)
+        return mask, uv
+
+    for point in trajectory.parabola(p0=settings.SIM_TRAJECTORY_P0,
+                                     v0=settings.SIM_TRAJECTORY_V0, num_frames=6,
+                                     duration=settings.SIM_TRAJECTORY_DURATION)[1:-1]:
+        masks, centroids = {}, {}
+        for cam in rig.cameras:
+            masks[cam.id], centroids[cam.id] = raw_mask(cam, point, 3.0 * SPHERE_RADIUS)
+        dense = pipeline.carve_indices(masks, cameras, engine="dense")
+        assert len(dense), f"distorted masks carved nothing at {point}"
+        for engine in ("hierarchical", "inverted", "bricks"):
+            assert np.array_equal(pipeline.carve_indices(masks, cameras, engine=engine), dense), \
+                f"{engine} disagrees with dense under lens distortion"
+        centroid_err = np.linalg.norm(pipeline.voxel_centers(dense).mean(axis=0) - point)
+        assert centroid_err < 2.0 * settings.VOXEL_SIZE, centroid_err
+
+        for cam in rig.cameras:
+            ideal = undistort_centroids([tuple(centroids[cam.id])], cam.K, dist)[0]
+            pinhole = cam.project(point)[0][0]
+            assert np.allclose(ideal, pinhole, atol=1e-3), (ideal, pinhole)
+
+    # The hierarchy's cell boxes bound every voxel centre's pixel, even for
+    # a strongly distorting lens
+    axes = pipeline.voxel_grid_axes()
+    size = 8
+    cells = pipeline._top_cells(pipeline.voxel_grid_shape(), size)
+    cells = cells[np.random.default_rng(4).choice(len(cells), 300, replace=False)]
+    shapes = {cam.id: (cam.height, cam.width) for cam in rig.cameras}
+    footprints = pipeline._cell_footprints(cells, size, axes, shapes, cameras)
+    offsets = np.stack(np.meshgrid(*[np.arange(size)] * 3, indexing="ij"), axis=-1).reshape(-1, 3)
+    checked = 0
+    for port, (u0, u1, v0, v1, full, partial) in footprints.items():
+        for c in np.flatnonzero(full):
+            ijk = cells[c] * size + offsets
+            ijk = ijk[(ijk < [len(a) for a in axes]).all(axis=1)]
+            points = np.stack([axes[d][ijk[:, d]] for d in range(3)], axis=1)
+            _, u, v = pipeline._project_to_pixels(points, cameras[port], shapes[port])
+            assert len(u) == len(points), "a full cell must be seen voxel for voxel"
+            assert ((u >= u0[c]) & (u <= u1[c]) & (v >= v0[c]) & (v <= v1[c])).all()
+            checked += 1
+    assert checked, "no full cells to check"
+    print("PASS: distortion-aware tables carve raw-frame masks.")
+
+
+def test_undistort_maps():
+    """Cached remap maps undistort a frame like cv.undistort, persist beside
+    the intrinsics, and are skipped for a distortion-free lens."""
+    from pixel_to_voxel import camera_calibration
+    K = np.array([[550.0, 0.0, 320.0], [0.0, 550.0, 240.0], [0.0, 0.0, 1.0]])
+    dist = np.array([-0.25, 0.08, 0.001, -0.001, 0.0])
+    rng = np.random.default_rng(3)
+    frame = cv.GaussianBlur(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8), (9, 9), 0)
+
+    saved_path = settings.CALIBRATION_DATA_PATH
+    with tempfile.TemporaryDirectory() as directory:
+        settings.CALIBRATION_DATA_PATH = directory + os.sep
+        try:
+            assert camera_calibration.load_undistort_maps(0, K, np.zeros(5), frame.shape) is None
+            assert camera_calibration.undistort_frame(frame, None) is frame
+            maps = camera_calibration.load_undistort_maps(0, K, dist, frame.shape)
+            assert maps[0].dtype == np.int16 and maps[0].shape == (480, 640, 2)
+            assert os.path.exists(os.path.join(directory, "undistort_maps_0.npz"))
+            cached = camera_calibration.load_undistort_maps(0, K, dist, frame.shape)
+            assert all(np.array_equal(a, b) for a, b in zip(maps, cached))
+            # A different image size (or calibration) rebuilds instead of reusing
+            small = camera_calibration.load_undistort_maps(0, K, dist, (240, 320))
+            assert small[0].shape == (240, 320, 2)
+        finally:
+            settings.CALIBRATION_DATA_PATH = saved_path
+
+    remapped = camera_calibration.undistort_frame(frame, maps)
+    reference = cv.undistort(frame, K, dist)
+    # Fixed-point maps differ from the float path by a fraction of a level
+    inner = (slice(40, -40), slice(40, -40))
+    err = np.abs(remapped[inner].astype(int) - reference[inner].astype(int))
+    assert err.mean() < 1.0 and err.max() <= 8, (err.mean(), err.max())
+    print("PASS: cached remap maps match cv.undistort.")
+
+
 if __name__ == "__main__":
     main()
     test_partial_visibility()
+    test_engines_match_dense()
+    test_chunked_tables_and_indices()
+    test_carve_table_disk_cache()
+    test_prepare_carving()
+    test_target_patches()
+    test_footprint_engine()
+    test_frustum_grid()
+    test_two_camera_cropping()
+    test_batch_carving()
+    test_voxel_clusters()
+    test_distortion_aware_carving()
+    test_undistort_maps()